@@ -8,10 +8,14 @@ Demonstration of sample set creation from metadata and MS data files
 
 
 # Import msAI modules
+import msAI
 import msAI.msData as msData
 from msAI.samples import SampleSet
+from msAI.conversion import ConversionPipeline
+from msAI.features import FeatureMatrixBuilder
 from msAI.metadata import SampleMetadata
 
+import numpy as np
 import pandas as pd
 
 
@@ -63,6 +67,13 @@ ms_files
 # By default, contents of sub directories will be recursively included
 #   * Can also specify file type
 # less_ms_files = msData.MSfileSet(mzml_dir, data_type='mzML', recursive=False)
+#   * On network file systems, scan sub directories with multiple threads
+# archive_ms_files = msData.MSfileSet(mzml_dir, scan_workers=16)
+
+# Refresh a set with the files added, removed, or modified since it was scanned
+#   * A snapshot saved by save_snapshot() can be loaded and refreshed later, by another process
+#   * SampleSet.refresh() refreshes its MSfileSet, creating SampleRuns for added files only
+# ms_files.refresh()
 
 # Creating an MSfileSet does not import MS data
 #   * Rather, it provides an summary of what is available
@@ -73,6 +84,10 @@ ms_files
 # Import MS data from mzML file
 sample1_ms = msData.MZMLfile(sample1_mzml_path)
 
+# The native reader backend decodes mzML files directly into NumPy arrays, giving identical results faster
+#   * Compare the read times of both backends with examples/mzmlBackends.py
+# sample1_ms = msData.MZMLfile(sample1_mzml_path, backend='native')
+
 # Access MS metadata
 sample1_ms.run_id
 sample1_ms.run_date
@@ -106,6 +121,40 @@ sample1_ms.peaks.loc[303]
 # Get a single peak with spec_id and peak_number
 sample1_ms.peaks.loc[303, 100]
 
+# Extract ion chromatograms (XICs) from MS1 spectra
+#   * An m/z-sorted index of MS1 peaks is built on first use, then each extraction is a binary search
+#   * Tolerance in ppm or Da, with optional retention time ranges (one for all targets, or one per target)
+rt, intensity = sample1_ms.xic(445.12, tolerance=10.0, tolerance_unit='ppm')
+rt, intensities = sample1_ms.xics([445.12, 536.17, 610.19], tolerance=0.01, tolerance_unit='Da', rt_range=(2.0, 12.0))
+
+# TIC and base peak chromatograms (BPC)
+#   * Base peak m/z and intensity, and the m/z range of each spectrum, are spectrum values computed when imported
+rt, tic = sample1_ms.tic_chromatogram(ms_lvl=1)
+rt, base_peak_mz, base_peak_i = sample1_ms.base_peak_chromatogram(ms_lvl=1)
+
+# Find the MS2 spectra of precursor ions
+#   * Precursor m/z, charge, and isolation window are spectrum values, indexed by precursor m/z on first use
+sample1_ms.precursor_spectra(445.12, tolerance=10.0, tolerance_unit='ppm', rt_range=(2.0, 12.0))
+sample1_ms.match_precursors([445.12, 536.17, 610.19], tolerance=0.01, tolerance_unit='Da')
+
+# Read the TIC of an mzML file without decoding peaks
+#   * The stored TIC chromatogram is read directly if present, otherwise TIC values are read from spectrum headers
+rt, tic = msData.MZMLfile.read_tic(sample1_mzml_path)
+
+# Import MS data from mzML file in lazy mode
+#   * Only spectrum values are read when created
+#   * Peaks are decoded when a spectrum is accessed
+#   * Base peaks not recorded in the file are computed by base_peak_chromatogram(), for the spectra it returns
+#   * Accessing the full 'peaks' dataframe decodes all spectra
+sample1_lazy_ms = msData.MZMLfile(sample1_mzml_path, lazy=True)
+sample1_lazy_ms.spectra.loc[303]
+sample1_lazy_ms.spectrum_peaks(303)
+
+# Stream spectra in fixed size batches of NumPy arrays
+#   * A lazy MZMLfile holds only a single batch in memory
+for batch in sample1_lazy_ms.iter_batches(batch_size=100):
+    batch.ids, batch.rt, batch.ms_lvl, batch.offsets, batch.mz, batch.i
+
 
 # samples
 # --------------------------------------------------------------------------------
@@ -141,6 +190,11 @@ sample_set.df.loc["EP2421"].run
 
 # Initialize MS data
 sample_set.init_all_ms()
+# Read mzML files through the parse cache, so unchanged files are not parsed again
+#   * The cache is opt-in: enable it with msAI.set_parse_cache, then pass use_cache=True
+#   * Cached MS data is read as a memory-mapped MSAIRfile, rather than a MZMLfile
+# msAI.PARSE_CACHE_DIR, msAI.PARSE_CACHE_SIZE_MB = msAI.set_parse_cache(mode='enable')
+# sample_set.init_all_ms(use_cache=True)
 
 # Access MS data and metadata
 sample_set.df.loc["EP2421"].run.ms.run_date
@@ -162,17 +216,52 @@ ms1
 peaks = sample_set.df.loc["EP2421"].run.ms.peaks
 peaks.loc[ms1.index]
 
+# Alternatively, filter spectra and peaks as MS data is initialized
+#   * Rejected spectra are not decoded, reducing time and memory
+ms1_filter = msData.SpectrumFilter(ms_lvl=1, rt_range=(2.0, 12.0), mz_range=(115.0, 1000.0), min_i=1000.0)
+# sample_set.init_all_ms(spectrum_filter=ms1_filter)
+
+# Bound the memory used by MS data (in MB) for sets larger than memory
+#   * MS data is then initialized when a sample's 'ms' is first accessed
+#   * The least recently used samples are released once over budget, and are initialized again when accessed
+# sample_set.set_memory_budget(4000)
+
+# Extract the same target ions from all samples (in parallel with MP_SUPPORT)
+#   * Targets are a dataframe with an mz column, and optional tolerance, rt_min, and rt_max columns
+#   * Only the results are returned from worker processes, not the MS data of each sample
+targets = pd.DataFrame({'mz': [445.12, 536.17, 610.19], 'rt_min': [2.0, 2.0, None], 'rt_max': 12.0},
+                       index=['ion1', 'ion2', 'ion3'])
+# Area of each target's XIC (samples x targets)
+xic_areas = sample_set.xic_areas(targets, tolerance=10.0, tolerance_unit='ppm')
+# XICs on a common rt grid (samples x targets x rt)
+batch_xic = sample_set.extract_xics(targets, rt_grid=np.linspace(0.0, 20.0, 401))
+
+# Build a binned feature matrix (samples x features) as model input
+#   * Peaks of each sample's MS1 spectra are binned onto an m/z grid (and optionally an rt grid)
+#   * Samples are streamed through workers, so memory is bounded by the matrix, not the MS data of the set
+feature_builder = FeatureMatrixBuilder(mz_range=(100.0, 1000.0), mz_bin_width=0.5, normalize=True)
+feature_matrix = feature_builder.build(sample_set)
+# Compact sparse (CSR) form, written to a .npz file
+# feature_matrix = feature_builder.build(sample_set, sparse=True, file_path='features.npz')
+# Features joined to sample metadata
+feature_df = feature_matrix.to_df()
+
 
 # Saving / Loading
 # --------------------------------------------------------------------------------
 
-# Save initialized samples via by serializing and compressing
+# Save initialized samples as .msAIr files
 #   * Faster access later (do not need to parse mzML files)
-#   * Smaller storage size
+#   * Peaks are memory-mapped when loaded, so only data accessed is read from disk
 #   * Any calculations / manipulations are also saved
 
 # Save all samples in set as .msAIr files to a directory
 #   * Same filenames are used
+#   * Pass msAIr_version=1 for legacy files (serialized and compressed, smaller storage size)
+#   * Compression of legacy and .msAIm files is set by compression=Compression(codec, level, workers)
+#     or by Saver.default_compression (codecs: none, zlib, lzma, bz2)
+#   * Pass incremental=True to skip samples with a current .msAIr file (unchanged since saved),
+#     resuming an interrupted save and initializing MS data only for the samples saved
 sample_set.save_all_ms(msAIr_dir)
 
 # A hash value is added to metadata
@@ -181,6 +270,11 @@ sample_set.df['msAIr_hash']
 # Save SampleSet metadata as a .msAIm file to a directory
 sample_set.save_metadata(msAIm_dir, "sample_set1")
 
+# Alternatively, convert MS files to .msAIr files without initializing a SampleSet
+#   * Each run is parsed, encoded, hashed, and written by its own stage of workers, overlapping parsing and writing
+#   * Only a few runs are held in memory at a time, however many files are converted
+# msAIr_hashes = ConversionPipeline(hash_workers=2).convert(ms_files, msAIr_dir)
+
 
 # Reload previously saved msAIr data
 
@@ -0,0 +1,64 @@
+"""
+mzML backends
+
+Benchmark of the native mzML reader backend against the pymzml backend
+
+Usage: python examples/mzmlBackends.py [mzML directory] [repeats]
+
+"""
+
+
+# Import msAI modules
+import msAI.msData as msData
+
+import sys
+import time
+
+import pandas as pd
+
+
+# Set pandas to display all columns
+pd.set_option('display.max_columns', None)
+pd.set_option('display.width', None)
+
+# Path to the mzML files to read, and the number of times each file is read by each backend
+mzml_dir = sys.argv[1] if len(sys.argv) > 1 else "./examples/data/mzML"
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+backends = ('pymzml', 'native')
+
+
+# Read each file with each backend, keeping the fastest read time
+#   * Both backends must give identical spectra and peaks
+# --------------------------------------------------------------------------------
+
+ms_files = msData.MSfileSet(mzml_dir, data_type='mzML')
+
+read_times = {}
+
+for name, path in ms_files.df['path'].astype(str).items():
+    ms_file = {}
+
+    for backend in backends:
+        backend_times = []
+
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            ms_file[backend] = msData.MZMLfile(path, backend=backend)
+            backend_times.append(time.perf_counter() - start_time)
+
+        read_times[name, backend] = min(backend_times)
+
+    pd.testing.assert_frame_equal(ms_file['native'].spectra, ms_file['pymzml'].spectra, check_exact=True)
+    pd.testing.assert_frame_equal(ms_file['native'].peaks, ms_file['pymzml'].peaks, check_exact=True)
+
+
+# Read times (seconds) of each file, with the speedup of the native backend
+# --------------------------------------------------------------------------------
+
+read_time_df = pd.Series(read_times).unstack()[list(backends)]
+read_time_df = read_time_df.assign(file_size=ms_files.df['file_size'],
+                                   speedup=read_time_df['pymzml'] / read_time_df['native'])
+
+print(read_time_df)
+print(f"Total speedup: {read_time_df['pymzml'].sum() / read_time_df['native'].sum():.1f}x")
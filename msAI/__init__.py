@@ -9,14 +9,16 @@ Todo
 """
 
 
-from msAI.errors import RootError
-from msAI.miscUtils import EnvInfo
+from msAI.errors import RootError, MiscUtilsError
+from msAI.miscUtils import EnvInfo, Executor
 
 import os
 import logging
+import multiprocessing
+import tempfile
 from datetime import datetime
 from enum import Enum, auto
-from typing import Tuple, Union
+from typing import Optional, Tuple, Union
 
 # Package Name
 name = "msAI"
@@ -90,7 +92,8 @@ def set_logging(mode: LogMode) -> logging.Logger:
         log_console.setLevel(logging.INFO)
 
         # File handler to write over log file on each run
-        log_file = logging.FileHandler('./logs/msAI_log-dev', mode='w')
+        #   * Worker processes (started by spawn or forkserver) append to the log file of their run
+        log_file = logging.FileHandler('./logs/msAI_log-dev', mode='w' if multiprocessing.parent_process() is None else 'a')
         log_file.setLevel(logging.DEBUG)
 
     elif mode == LogMode.RELEASE:
@@ -136,14 +139,15 @@ def set_mp_support(mode: str = 'auto', workers: Union[str, int] = 'auto') -> Tup
     """Configures msAI multiprocessing.
 
     The package variable MP_SUPPORT is a boolean set to enable / disable multiprocessing in the msAI package.
-    This is necessary as certain operations will fail if the multiprocessing module uses the 'spawn' start method.
+    Work is distributed by the package `.Executor` (see `set_executor`).
     The start method default is determined by OS type.
 
     Args:
         mode: A string specifying the multiprocessing configuration.
 
             `auto`: Configures multiprocessing support automatically based on OS.
-            Multiprocessing will be enabled if the multiprocessing start method in use is 'fork'.
+            Multiprocessing will be enabled if the multiprocessing start method in use is supported
+            ('fork', 'forkserver', or 'spawn').
 
             `enable`: Manually enables multiprocessing.
             Errors may occur if multiprocessing is not fully supported by OS.
@@ -161,7 +165,7 @@ def set_mp_support(mode: str = 'auto', workers: Union[str, int] = 'auto') -> Tup
         RootError: For an invalid multiprocessing mode.
     """
 
-    if EnvInfo.mp_method() == 'fork':
+    if EnvInfo.mp_method() in Executor.kinds:
         os_mp_support = True
     else:
         os_mp_support = False
@@ -192,6 +196,136 @@ def set_mp_support(mode: str = 'auto', workers: Union[str, int] = 'auto') -> Tup
         raise RootError(f"Invalid multiprocessing mode: {mode}")
 
 
+def set_executor(kind: str = 'auto', workers: Union[str, int] = 'auto') -> Executor:
+    """Configures the msAI executor, distributing work on dataframes across workers.
+
+    The package variable EXECUTOR is the `.Executor` used by `.MultiTaskDF` when MP_SUPPORT is enabled.
+    Its workers are started on first use and reused by later operations.
+    Under the 'spawn' and 'forkserver' start methods, scripts using msAI must guard their entry point
+    with ``if __name__ == '__main__':``.
+
+    Args:
+        kind: A string specifying the type of workers.
+
+            `auto`: Uses worker processes, created by the multiprocessing start method in use.
+
+            `serial`, `thread`: Uses the calling process, or threads.
+
+            `fork`, `forkserver`, `spawn`: Uses worker processes, created by the named start method.
+
+        workers: The number of workers.
+
+            `auto`: Sets number of workers to CPU count.
+
+    Returns:
+        The `.Executor`.
+
+    Raises:
+        RootError: For an invalid executor kind, or a start method not supported by OS.
+    """
+
+    if kind == 'auto':
+        kind = EnvInfo.mp_method()
+
+    if workers == 'auto':
+        workers = os.cpu_count()
+
+    try:
+        executor = Executor(kind, workers)
+    except MiscUtilsError as err:
+        raise RootError(str(err)) from err
+
+    logger.info(f"Executor set to {executor}")
+    return executor
+
+
+def set_parse_cache(mode: str = 'disable',
+                    cache_dir: str = 'auto',
+                    max_size_mb: float = 10240) -> Tuple[Optional[str], float]:
+    """Configures the msAI on-disk cache of parsed mzML files.
+
+    The package variables PARSE_CACHE_DIR and PARSE_CACHE_SIZE_MB configure the `.ParseCache`
+    used by `.SampleRun.init_ms` when reading mzML files with ``use_cache=True``.
+    A PARSE_CACHE_DIR of ``None`` disables the cache, which is the default.
+
+    Args:
+        mode: A string specifying the parse cache configuration.
+
+            `enable`: Enables the parse cache.
+
+            `disable`: Disables the parse cache.
+
+        cache_dir: The directory of the parse cache.
+
+            `auto`: Sets the directory to msAI/parse within the user cache directory
+            (XDG_CACHE_HOME, or ~/.cache).
+
+        max_size_mb: The maximum total size in MB of the parse cache.
+
+    Returns:
+        A Tuple specifying PARSE_CACHE_DIR and PARSE_CACHE_SIZE_MB.
+
+    Raises:
+        RootError: For an invalid parse cache mode.
+    """
+
+    if cache_dir == 'auto':
+        user_cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        cache_dir = os.path.join(user_cache_dir, 'msAI', 'parse')
+
+    if mode == 'enable':
+        logger.info(f"Parse cache enabled in {cache_dir}, up to {max_size_mb} MB")
+        return cache_dir, max_size_mb
+
+    elif mode == 'disable':
+        logger.info("Parse cache disabled")
+        return None, max_size_mb
+
+    else:
+        raise RootError(f"Invalid parse cache mode: {mode}")
+
+
+def set_ms_transport(mode: str = 'enable', transport_dir: str = 'auto') -> Optional[str]:
+    """Configures the transport of MS data initialized by worker processes.
+
+    The package variable MS_TRANSPORT_DIR is the directory of temporary msAIr files,
+    through which worker processes share initialized MS data (see `.MSAIRhandle`), rather than pickling it.
+    A MS_TRANSPORT_DIR of ``None`` disables the transport.
+
+    Args:
+        mode: A string specifying the transport configuration.
+
+            `enable`: Enables the transport.
+
+            `disable`: Disables the transport, pickling MS data.
+
+        transport_dir: The directory of temporary msAIr files.
+
+            `auto`: Sets the directory to /dev/shm (shared memory) if available,
+            or the temporary directory of the OS.
+
+    Returns:
+        The MS_TRANSPORT_DIR.
+
+    Raises:
+        RootError: For an invalid transport mode.
+    """
+
+    if transport_dir == 'auto':
+        transport_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+    if mode == 'enable':
+        logger.info(f"MS data transport enabled in {transport_dir}")
+        return transport_dir
+
+    elif mode == 'disable':
+        logger.info("MS data transport disabled")
+        return None
+
+    else:
+        raise RootError(f"Invalid MS data transport mode: {mode}")
+
+
 # Set logging mode
 logger = set_logging(LogMode.DEV)
 # logger = set_logging(LogMode.RELEASE)
@@ -204,5 +338,17 @@ logger.info("msAI Starting")
 MP_SUPPORT, WORKER_COUNT = set_mp_support(mode='auto', workers='auto')
 # MP_SUPPORT, WORKER_COUNT = set_mp_support(mode='disable')
 
+# Set executor, reused by all multiprocessing operations
+EXECUTOR = set_executor(kind='auto', workers=WORKER_COUNT)
+# EXECUTOR = set_executor(kind='forkserver', workers=WORKER_COUNT)
+
+# Set parse cache
+PARSE_CACHE_DIR, PARSE_CACHE_SIZE_MB = set_parse_cache(mode='disable')
+# PARSE_CACHE_DIR, PARSE_CACHE_SIZE_MB = set_parse_cache(mode='enable', cache_dir='auto')
+
+# Set transport of MS data from worker processes
+MS_TRANSPORT_DIR = set_ms_transport(mode='enable', transport_dir='auto')
+# MS_TRANSPORT_DIR = set_ms_transport(mode='disable')
+
 # Log environment info
 logger.debug(f"Run Environment:\n{EnvInfo.all()}")
@@ -0,0 +1,184 @@
+"""msAI module for converting MS files to columnar msAIr files through a pipeline.
+
+Features
+    * Streaming the files of a `.MSfileSet` through parse, encode, hash, and write stages, connected by bounded queues
+    * Setting the number of workers of each stage, with runs converted whole by process workers
+    * Releasing the MS data of each run once written, so memory is bounded by the pipeline rather than the set size
+
+"""
+
+
+import msAI
+import msAI.msData as msData
+import msAI.msAIrFormat as msAIrFormat
+from msAI.miscUtils import Pipeline, PipelineStage, Saver
+from msAI.miscDecos import log_timer
+from msAI.samples import SampleRun
+from msAI.types import DF
+
+import os
+import logging
+from functools import partial
+from typing import Optional, Tuple
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+"""Module logger."""
+
+
+def _parse(spectrum_filter: Optional[msData.SpectrumFilter],
+           mzml_backend: str,
+           use_cache: bool,
+           run_file: Tuple[str, str]) -> Tuple[str, msData.MSfile]:
+    """Initializes the MS data of a (name, file path) pair, as a `.SampleRun` would."""
+
+    name, file_path = run_file
+
+    run = SampleRun(file_path)
+    run.init_ms(spectrum_filter, mzml_backend, use_cache)
+
+    return name, run.ms
+
+
+class ConversionPipeline:
+    """Converts the MS files of a `.MSfileSet` to columnar msAIr files, streaming each run through a pipeline.
+
+    Each run flows through four stages (see `.Pipeline`), each with its own workers:
+
+        | **parse:**  MS data is initialized from the MS file, by the workers of `msAI.EXECUTOR`
+        | **encode:**  MS data is encoded as the blocks of a msAIr file (see `.MSAIRfile.encode`)
+        | **hash:**  blocks are hashed, creating the header of the msAIr file (see `.msAIrFormat.hash_blocks`)
+        | **write:**  the msAIr file is written to a temporary file and renamed, then the run's MS data is released
+
+    Parsing is CPU-bound, while hashing (by hashlib, releasing the GIL) and writing overlap with it in threads.
+    With process workers, each run instead goes through all stages in its worker, which returns only the content hash,
+    so MS data is never pickled back to the calling process (the pipeline then has a single **convert** stage).
+    Queues between stages are bounded, so only a few runs are held in memory at any time, whatever the set size.
+    Files are fed to the pipeline largest first, so a large file started last does not hold up the end of the pipeline.
+
+    Written msAIr files are named by the run (the index of the MSfileSet), as by `.SampleSet.save_all_ms`.
+    """
+
+    def __init__(self,
+                 parse_workers: Optional[int] = None,
+                 encode_workers: int = 1,
+                 hash_workers: int = 1,
+                 write_workers: int = 1,
+                 queue_size: int = 1,
+                 spectrum_filter: Optional[msData.SpectrumFilter] = None,
+                 mzml_backend: str = 'pymzml',
+                 use_cache: bool = False):
+        """Initializes an instance of ConversionPipeline class.
+
+        Args:
+            parse_workers: The number of runs parsed at a time, defaults to the workers of `msAI.EXECUTOR`.
+            encode_workers: The number of runs encoded at a time.
+            hash_workers: The number of runs hashed at a time.
+            write_workers: The number of runs written at a time.
+            queue_size: The maximum number of runs waiting before each stage.
+            spectrum_filter: An optional `.SpectrumFilter` to convert only a subset of the MS data.
+            mzml_backend: (`pymzml`, `native`) The reader backend used to read .mzML files.
+            use_cache: A boolean indicating if .mzML files are read through the parse cache, if enabled.
+        """
+
+        self.parse_workers = parse_workers
+        self.encode_workers = encode_workers
+        self.hash_workers = hash_workers
+        self.write_workers = write_workers
+        self.queue_size = queue_size
+        self.spectrum_filter = spectrum_filter
+        self.mzml_backend = mzml_backend
+        self.use_cache = use_cache
+
+    def pipeline(self, dir_path: str) -> Pipeline:
+        """Get the pipeline converting (name, file path) pairs to msAIr files in a directory."""
+
+        executor = msAI.EXECUTOR
+        parse_workers = self.parse_workers or (1 if executor.is_serial else executor.workers)
+        parse = partial(_parse, self.spectrum_filter, self.mzml_backend, self.use_cache)
+
+        if not executor.is_serial and executor.kind != 'thread':
+            convert = partial(self._convert, parse, dir_path)
+            return Pipeline(PipelineStage('convert', partial(executor.apply, convert), parse_workers),
+                            queue_size=self.queue_size)
+
+        return Pipeline(PipelineStage('parse', partial(executor.apply, parse), parse_workers),
+                        PipelineStage('encode', self._encode, self.encode_workers),
+                        PipelineStage('hash', self._hash, self.hash_workers),
+                        PipelineStage('write', partial(self._write, dir_path), self.write_workers),
+                        queue_size=self.queue_size)
+
+    @staticmethod
+    def _encode(run_ms: Tuple[str, msData.MSfile]) -> Tuple[str, msAIrFormat.EncodedFile]:
+        """Encodes the MS data of a run."""
+
+        name, ms_file = run_ms
+
+        return name, msData.MSAIRfile.encode(ms_file)
+
+    @staticmethod
+    def _hash(run_encoded: Tuple[str, msAIrFormat.EncodedFile]) -> Tuple[str, msAIrFormat.EncodedFile]:
+        """Hashes the encoded MS data of a run."""
+
+        name, encoded = run_encoded
+
+        return name, msAIrFormat.hash_blocks(encoded)
+
+    @staticmethod
+    def _write(dir_path: str, run_encoded: Tuple[str, msAIrFormat.EncodedFile]) -> str:
+        """Writes the encoded MS data of a run as a msAIr file, returning its content hash."""
+
+        name, encoded = run_encoded
+        full_filename = os.path.join(dir_path, name + '.msAIr')
+
+        # Write to a temporary file and rename, so an interrupted conversion never leaves a partial .msAIr file
+        with Saver.replacing(full_filename) as temp_path:
+            msAIr_hash = msAIrFormat.write_encoded(temp_path, encoded)
+
+        return msAIr_hash
+
+    @staticmethod
+    def _convert(parse: partial, dir_path: str, run_file: Tuple[str, str]) -> str:
+        """Converts a (name, file path) pair through all stages, returning the content hash of its msAIr file."""
+
+        run_encoded = ConversionPipeline._encode(parse(run_file))
+
+        return ConversionPipeline._write(dir_path, ConversionPipeline._hash(run_encoded))
+
+    @log_timer
+    def convert(self,
+                ms_file_set: msData.MSfileSet,
+                dir_path: str) -> DF:
+        """Converts all MS files of a MSfileSet to msAIr files in a directory.
+
+        Runs which fail to convert are logged and skipped, without stopping the conversion of others.
+        The work of each stage is recorded in `.Pipeline.last_stage_busy`.
+
+        Args:
+            ms_file_set: The MS files to convert.
+            dir_path: A string representation of the path to the directory of msAIr files, created if needed.
+
+        Returns:
+            A dataframe with the content hash of each msAIr file written (``None`` for failed runs),
+            indexed as the MSfileSet.
+        """
+
+        os.makedirs(dir_path, exist_ok=True)
+
+        file_df = ms_file_set.df.sort_values('file_size', ascending=False, kind='stable')
+        run_files = zip(file_df.index, file_df['path'].astype(str))
+
+        msAIr_hashes = {}
+
+        for result in self.pipeline(dir_path).run(run_files):
+            name, file_path = result.item
+
+            if result.error is not None:
+                logger.error(f"Unable to convert {file_path} to msAIr: {result.error!r}")
+
+            msAIr_hashes[name] = result.value
+
+        return pd.DataFrame({'msAIr_hash': pd.Series(msAIr_hashes, dtype=object)},
+                            index=ms_file_set.df.index)
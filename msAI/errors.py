@@ -146,3 +146,42 @@ class MSfileSetInitError(MSdataError):
         """
 
         self.message = message
+
+
+class MZMLreaderError(MSdataError):
+    """Exceptions raised for errors in reading mzML files."""
+
+    def __init__(self, message: str):
+        """Initializes an instance of MZMLreaderError.
+
+        Args:
+            message: Explanation of the cause of this error.
+        """
+
+        self.message = message
+
+
+class MSAIRformatError(MSdataError):
+    """Exceptions raised for errors in reading msAIr files."""
+
+    def __init__(self, message: str):
+        """Initializes an instance of MSAIRformatError.
+
+        Args:
+            message: Explanation of the cause of this error.
+        """
+
+        self.message = message
+
+
+class FeatureMatrixError(msAIerror):
+    """Exceptions raised for errors in the features module."""
+
+    def __init__(self, message: str):
+        """Initializes an instance of FeatureMatrixError.
+
+        Args:
+            message: Explanation of the cause of this error.
+        """
+
+        self.message = message
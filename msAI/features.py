@@ -0,0 +1,372 @@
+"""msAI module for building binned feature matrices from the MS data of a sample set, as input to AI models.
+
+Features
+    * Binning the peaks of each run onto an m/z grid (and optionally an rt grid) by vectorized histogramming
+    * Streaming runs through worker processes, holding only the nonzero bins of a few runs at a time
+    * Dense float32 matrices (optionally written to a memory-mapped .npy file), or compact sparse (CSR) matrices
+    * Joining feature matrices to the metadata columns of a `.SampleSet`
+
+"""
+
+
+import msAI
+from msAI.miscUtils import Pipeline, PipelineStage
+from msAI.miscDecos import log_timer
+from msAI.errors import FeatureMatrixError
+from msAI.types import DF
+
+import math
+import logging
+from functools import partial
+from typing import ClassVar, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+"""Module logger."""
+
+
+class CSRMatrix(NamedTuple):
+    """A sparse matrix in compressed sparse row (CSR) form, with the arrays of ``scipy.sparse.csr_matrix``.
+
+    The nonzero values of row n are ``data[indptr[n]:indptr[n + 1]]``,
+    in the columns ``indices[indptr[n]:indptr[n + 1]]``.
+    Create a scipy matrix with ``scipy.sparse.csr_matrix((data, indices, indptr), shape=shape)``.
+    """
+
+    data: np.ndarray
+    """The nonzero values of all rows."""
+
+    indices: np.ndarray
+    """The column of each nonzero value."""
+
+    indptr: np.ndarray
+    """Start positions of each row's values in `data` and `indices`, followed by the number of nonzero values."""
+
+    shape: Tuple[int, int]
+    """The number of rows and columns."""
+
+    def to_dense(self) -> np.ndarray:
+        """Get the matrix as a dense array."""
+
+        dense = np.zeros(self.shape, dtype=self.data.dtype)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        dense[rows, self.indices] = self.data
+
+        return dense
+
+    def save(self, file_path: str):
+        """Saves the arrays of the matrix to a .npz file."""
+
+        np.savez(file_path, data=self.data, indices=self.indices, indptr=self.indptr, shape=np.asarray(self.shape))
+
+    @staticmethod
+    def load(file_path: str) -> 'CSRMatrix':
+        """Loads a matrix saved by `save`."""
+
+        with np.load(file_path) as arrays:
+            return CSRMatrix(arrays['data'], arrays['indices'], arrays['indptr'], tuple(arrays['shape'].tolist()))
+
+
+class FeatureMatrix(NamedTuple):
+    """A samples x features matrix built from the MS data of a `.SampleSet`, with the metadata of each sample."""
+
+    samples: pd.Index
+    """The samples (rows), as indexed in the SampleSet."""
+
+    features: pd.Index
+    """The features (columns), as the m/z interval (and rt interval) of each bin."""
+
+    values: Union[np.ndarray, CSRMatrix]
+    """The value of each feature in each sample, as a dense float32 array or a `CSRMatrix`."""
+
+    metadata: DF
+    """The metadata columns of the SampleSet (without file and run columns), indexed by sample."""
+
+    failed: pd.Index
+    """The samples whose MS data could not be read, with no feature values."""
+
+    def to_df(self) -> DF:
+        """Get a dataframe of the metadata and (dense) feature values of each sample.
+
+        With rt bins, the feature columns are labelled by (rt interval, m/z interval) tuples,
+        as metadata columns have a single level.
+        """
+
+        values = self.values.to_dense() if isinstance(self.values, CSRMatrix) else np.asarray(self.values)
+        feature_df = pd.DataFrame(values, index=self.samples, columns=self.features.to_flat_index())
+
+        return self.metadata.join(feature_df)
+
+
+def _bin_run(builder: 'FeatureMatrixBuilder',
+             positioned_run: tuple) -> Tuple[np.ndarray, np.ndarray]:
+    """Bins the peaks of a (position, `.SampleRun`) pair, as a worker function of `FeatureMatrixBuilder`."""
+
+    position, run = positioned_run
+
+    return builder.bin_run(run)
+
+
+class FeatureMatrixBuilder:
+    """Builds a samples x features matrix from a `.SampleSet`, by binning the peaks of each run onto a grid.
+
+    Peaks are binned onto equal width m/z bins, and optionally equal width rt bins
+    (with features ordered by rt bin, then m/z bin). Bins are half-open, ``[min, max)``.
+    The intensities of the peaks in each bin are combined by `agg`, across all spectra of MS level `ms_lvl`.
+
+    Each run is binned by streaming its spectra in batches (see `.SampleRun.iter_batches`),
+    so MS data not in memory is never fully initialized. With `MP_SUPPORT`, runs are binned by the workers
+    of `msAI.EXECUTOR`, each returning only the nonzero bins of its run. Runs flow through a `.Pipeline`,
+    so only a few runs are held at a time, and memory is bounded by the feature matrix rather than the set size.
+    """
+
+    aggs: ClassVar[Tuple[str, ...]] = ('sum', 'max')
+    """How intensities of the peaks in a bin are combined."""
+
+    def __init__(self,
+                 mz_range: Tuple[float, float] = (50.0, 1000.0),
+                 mz_bin_width: float = 1.0,
+                 rt_range: Optional[Tuple[float, float]] = None,
+                 rt_bin_width: Optional[float] = None,
+                 ms_lvl: Optional[int] = 1,
+                 agg: str = 'sum',
+                 normalize: bool = False,
+                 workers: Optional[int] = None,
+                 batch_size: int = 1000):
+        """Initializes an instance of FeatureMatrixBuilder class.
+
+        Args:
+            mz_range: The m/z range (min, max) of the bins.
+            mz_bin_width: The m/z width of each bin.
+            rt_range: An optional retention time range (min, max) of the bins.
+                Defaults to no rt bins, combining peaks across all retention times.
+            rt_bin_width: The retention time width of each bin, defaults to a single bin over `rt_range`.
+            ms_lvl: The MS level of spectra binned, or ``None`` for all spectra.
+            agg: (`sum`, `max`) How intensities of the peaks in a bin are combined.
+            normalize: A boolean indicating if the features of each sample are scaled to sum to 1.
+            workers: The number of runs binned at a time, defaults to the workers of `msAI.EXECUTOR`.
+            batch_size: The number of spectra binned at a time.
+
+        Raises:
+            FeatureMatrixError: For an invalid grid or aggregation.
+        """
+
+        if agg not in self.aggs:
+            raise FeatureMatrixError(f"Invalid feature aggregation: {agg}")
+
+        self.mz_edges = self._edges(mz_range, mz_bin_width, 'm/z')
+        self.rt_edges = None if rt_range is None else \
+            self._edges(rt_range, rt_bin_width or rt_range[1] - rt_range[0], 'rt')
+
+        self.ms_lvl = ms_lvl
+        self.agg = agg
+        self.normalize = normalize
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def __repr__(self):
+        return f"FeatureMatrixBuilder({self.feature_count} features)"
+
+    @staticmethod
+    def _edges(value_range: Tuple[float, float],
+               bin_width: float,
+               name: str) -> np.ndarray:
+        """Get the edges of equal width bins over a range, with the last bin ending at or beyond the range."""
+
+        range_min, range_max = value_range
+
+        if not bin_width > 0 or not range_max > range_min:
+            raise FeatureMatrixError(f"Invalid {name} bins: {value_range}, width {bin_width}")
+
+        bin_count = math.ceil((range_max - range_min) / bin_width)
+
+        return range_min + bin_width * np.arange(bin_count + 1)
+
+    @property
+    def mz_bin_count(self) -> int:
+        """Get the number of m/z bins."""
+
+        return len(self.mz_edges) - 1
+
+    @property
+    def rt_bin_count(self) -> int:
+        """Get the number of rt bins (1 without rt bins)."""
+
+        return 1 if self.rt_edges is None else len(self.rt_edges) - 1
+
+    @property
+    def feature_count(self) -> int:
+        """Get the number of features."""
+
+        return self.mz_bin_count * self.rt_bin_count
+
+    @property
+    def features(self) -> pd.Index:
+        """Get the features, as an index of m/z intervals (or of rt and m/z intervals, with rt bins)."""
+
+        mz_bins = pd.IntervalIndex.from_breaks(self.mz_edges, closed='left', name='mz')
+
+        if self.rt_edges is None:
+            return mz_bins
+
+        rt_bins = pd.IntervalIndex.from_breaks(self.rt_edges, closed='left', name='rt')
+
+        return pd.MultiIndex.from_product([rt_bins, mz_bins])
+
+    @staticmethod
+    def _bin_numbers(values: np.ndarray,
+                     edges: np.ndarray) -> np.ndarray:
+        """Get the bin number of each value, for equal width bins (-1 outside of the bins)."""
+
+        bin_numbers = np.floor((values - edges[0]) / (edges[1] - edges[0])).astype(np.int64)
+        bin_numbers[(bin_numbers < 0) | (bin_numbers >= len(edges) - 1)] = -1
+
+        return bin_numbers
+
+    def bin_batch(self,
+                  batch,
+                  totals: np.ndarray):
+        """Bins the peaks of a batch of spectra, combining their intensities into the totals of each feature.
+
+        Args:
+            batch: The spectra, as a `.SpectrumBatch`.
+            totals: The value of each feature, updated in place.
+        """
+
+        peak_counts = np.diff(batch.offsets)
+        spectrum_bins = np.zeros(len(peak_counts), dtype=np.int64)
+
+        if self.rt_edges is not None:
+            spectrum_bins = self._bin_numbers(np.asarray(batch.rt, dtype=np.float64), self.rt_edges)
+
+        if self.ms_lvl is not None:
+            spectrum_bins[np.asarray(batch.ms_lvl) != self.ms_lvl] = -1
+
+        peak_spectrum_bins = np.repeat(spectrum_bins, peak_counts)
+        mz_bins = self._bin_numbers(np.asarray(batch.mz, dtype=np.float64), self.mz_edges)
+
+        in_bins = (peak_spectrum_bins >= 0) & (mz_bins >= 0)
+        features = peak_spectrum_bins[in_bins] * self.mz_bin_count + mz_bins[in_bins]
+        intensities = np.asarray(batch.i, dtype=np.float64)[in_bins]
+
+        if self.agg == 'sum':
+            totals += np.bincount(features, weights=intensities, minlength=len(totals))
+        else:
+            np.maximum.at(totals, features, intensities)
+
+    def bin_run(self, run) -> Tuple[np.ndarray, np.ndarray]:
+        """Bins the peaks of a `.SampleRun`, streaming its spectra in batches.
+
+        Args:
+            run: The SampleRun binned.
+
+        Returns:
+            A tuple of arrays of the feature number and (float32) value of each nonzero feature.
+        """
+
+        run._open_shared_ms()
+
+        totals = np.zeros(self.feature_count)
+
+        for batch in run.iter_batches(self.batch_size):
+            self.bin_batch(batch, totals)
+
+        if self.normalize:
+            total = totals.sum()
+            if total > 0:
+                totals /= total
+
+        features = np.flatnonzero(totals)
+
+        return features.astype(np.int32), totals[features].astype(np.float32)
+
+    def pipeline(self) -> Pipeline:
+        """Get the pipeline binning (position, `.SampleRun`) pairs."""
+
+        bin_run = partial(_bin_run, self)
+
+        if msAI.MP_SUPPORT:
+            executor = msAI.EXECUTOR
+            workers = self.workers or (1 if executor.is_serial else executor.workers)
+            stage = PipelineStage('bin', partial(executor.apply, bin_run), workers)
+        else:
+            stage = PipelineStage('bin', bin_run, 1)
+
+        return Pipeline(stage)
+
+    @log_timer
+    def build(self,
+              sample_set,
+              sparse: bool = False,
+              file_path: Optional[str] = None) -> FeatureMatrix:
+        """Builds the feature matrix of all samples in a SampleSet.
+
+        Runs are binned largest first, and their features stored as they are done.
+        Runs which fail to be read are logged, recorded in `FeatureMatrix.failed`, and have no feature values.
+
+        Args:
+            sample_set: The `.SampleSet` of samples.
+            sparse: A boolean indicating if the feature matrix is built as a `CSRMatrix`, rather than a dense array.
+            file_path: An optional path of a file the feature matrix is written to.
+                A dense matrix is written to a .npy file as each run is binned, and returned memory-mapped,
+                so it is never held in memory. A sparse matrix is saved to a .npz file (see `CSRMatrix.save`).
+
+        Returns:
+            The feature matrix, as a `FeatureMatrix`.
+        """
+
+        sample_df = sample_set.df
+        shape = (len(sample_df), self.feature_count)
+
+        if sparse:
+            sample_features = [None] * len(sample_df)
+        elif file_path is not None:
+            values = np.lib.format.open_memmap(file_path, mode='w+', dtype=np.float32, shape=shape)
+        else:
+            values = np.zeros(shape, dtype=np.float32)
+
+        # Runs are passed without MS data read from msAIr files, which workers map from the same file
+        positions = np.argsort(-sample_df['file_size'].to_numpy(), kind='stable')
+        positioned_runs = ((position, sample_df['run'].iat[position]._shared_copy()) for position in positions)
+
+        failed = []
+
+        for result in self.pipeline().run(positioned_runs):
+            position, run = result.item
+
+            if result.error is not None:
+                logger.error(f"Unable to bin peaks of {run.file_path}: {result.error!r}")
+                failed.append(position)
+                continue
+
+            features, feature_values = result.value
+
+            if sparse:
+                sample_features[position] = result.value
+            else:
+                values[position, features] = feature_values
+
+        if sparse:
+            empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+            sample_features = [empty if row is None else row for row in sample_features]
+
+            indptr = np.zeros(len(sample_features) + 1, dtype=np.int64)
+            np.cumsum([len(features) for features, _ in sample_features], out=indptr[1:])
+
+            values = CSRMatrix(np.concatenate([row_values for _, row_values in sample_features] or [empty[1]]),
+                               np.concatenate([features for features, _ in sample_features] or [empty[0]]),
+                               indptr,
+                               shape)
+
+            if file_path is not None:
+                values.save(file_path)
+
+        elif file_path is not None:
+            values.flush()
+
+        metadata = sample_df.drop(columns=['file_type', 'file_size', 'path', 'run'])
+
+        return FeatureMatrix(sample_df.index, self.features, values, metadata, sample_df.index[sorted(failed)])
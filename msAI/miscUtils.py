@@ -11,17 +11,29 @@ import msAI
 from msAI.errors import MiscUtilsError
 from msAI.types import DF
 
+import atexit
 import logging
 import sys
 import os
 import platform
-import itertools
-from typing import Iterable, Optional, Tuple
+from typing import Callable, ClassVar, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 import hashlib
 import pickle
 import bz2
+import io
+import json
+import lzma
+import queue
+import secrets
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import multiprocessing
-from multiprocessing import Pool
+import multiprocessing.pool
 from functools import partial
 import pathlib
 
@@ -56,24 +68,100 @@ class FileGrabber:
              An iterator of path objects to all files found.
         """
 
-        dir_path = pathlib.Path(directory)
-        path_type = FileGrabber.path_type(directory)
-        ext_list = list(set(extensions))
+        return (pathlib.Path(entry.path)
+                for entry in FileGrabber.scan_extensions(directory, *extensions, recursive=recursive))
+
+    @staticmethod
+    def scan_extensions(directory: str,
+                        *extensions: str,
+                        recursive: bool = True,
+                        workers: int = 1) -> List[os.DirEntry]:
+        """Scans a directory for all files matching the passed extensions, in a single traversal.
+
+        Files are returned as `os.DirEntry` objects, sorted by path, with their stat already cached,
+        so ``entry.stat().st_size`` does not access the file system again.
+        Subdirectories will be recursively searched by default, without following symbolic links to directories.
+        Subdirectories may be scanned by multiple threads, which is faster on high latency (network) file systems.
+
+        Args:
+            directory: A string representation of the path to the directory.
+                Path can be relative or absolute.
+            extensions: One or more file extensions specified as strings without leading (.).
+            recursive: A boolean indicating if files in subdirectories are included.
+                Defaults to `True`.
+            workers: The number of threads scanning subdirectories. Defaults to 1 (no threads).
+
+        Returns:
+             A list of directory entries of all files found.
+        """
 
         # While Windows paths are case insensitive, Posix paths are case sensitive.
         # Thus the set of casefolded extensions will be used on Windows systems.
-        if path_type == 'windows':
-            ext_list = list(set(map(str.casefold, ext_list)))
+        casefold = FileGrabber.path_type(directory) == 'windows'
+
+        ext_set = frozenset('.' + ext for ext in extensions)
+        if casefold:
+            ext_set = frozenset(map(str.casefold, ext_set))
+
+        scan_dir = partial(FileGrabber._scan_dir, ext_set=ext_set, casefold=casefold)
+
+        found_files = []
+        dir_paths = [str(pathlib.Path(directory))]
 
-        # Add glob pattern to extensions
-        ext_list = list(map("".join, zip(*[(["*."] * len(ext_list))] + [ext_list])))
+        if workers <= 1:
+            while dir_paths:
+                files, subdir_paths = scan_dir(dir_paths.pop())
+                found_files.extend(files)
+
+                if recursive:
+                    dir_paths.extend(subdir_paths)
 
-        if recursive:
-            glob_func = dir_path.rglob
         else:
-            glob_func = dir_path.glob
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = {executor.submit(scan_dir, dir_path) for dir_path in dir_paths}
+
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        files, subdir_paths = future.result()
+                        found_files.extend(files)
+
+                        if recursive:
+                            pending.update(executor.submit(scan_dir, subdir_path) for subdir_path in subdir_paths)
+
+        return sorted(found_files, key=lambda entry: entry.path)
 
-        return itertools.chain.from_iterable(glob_func(pattern) for pattern in ext_list)
+    @staticmethod
+    def _scan_dir(dir_path: str,
+                  ext_set: FrozenSet[str],
+                  casefold: bool) -> Tuple[List[os.DirEntry], List[str]]:
+        """Scans a single directory for files matching a set of extensions (with leading .).
+
+        Returns:
+            A tuple of the directory entries of the files matched (with their stat cached),
+            and the paths of subdirectories.
+        """
+
+        files = []
+        subdir_paths = []
+
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdir_paths.append(entry.path)
+                    continue
+
+                file_ext = os.path.splitext(entry.name)[1]
+                if casefold:
+                    file_ext = file_ext.casefold()
+
+                if file_ext in ext_set and entry.is_file():
+                    # Cache the stat of the file, while scanning in parallel
+                    entry.stat()
+                    files.append(entry)
+
+        return files, subdir_paths
 
     @staticmethod
     def path_type(directory: str = '.') -> str:
@@ -162,32 +250,458 @@ class Sizer:
         print(f"fileSizeMB: {file_size_mb:.4f}")
 
 
+class ArrayBuffer:
+    """A growable NumPy array used to accumulate values of an unknown total length.
+
+    Capacity is doubled whenever it is exceeded, making appends amortized O(1).
+    This avoids holding and concatenating a large number of small arrays or dataframes.
+    The dtype is set by the first values added (unless specified), and is upcast if later values require it.
+    """
+
+    def __init__(self,
+                 dtype=None,
+                 capacity: int = 1024):
+        """Initializes an instance of ArrayBuffer class.
+
+        Args:
+            dtype: The NumPy dtype of the buffer.
+                By default, the dtype of the first values added is used.
+            capacity: The number of elements to initially allocate.
+        """
+
+        self._dtype = None if dtype is None else np.dtype(dtype)
+        self._capacity = max(int(capacity), 1)
+        self._data = None if dtype is None else np.empty(self._capacity, dtype=self._dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, size: int, dtype):
+        """Ensures the buffer can hold `size` elements of `dtype`, growing and upcasting as needed."""
+
+        if self._data is None:
+            self._dtype = np.dtype(dtype)
+            self._capacity = max(self._capacity, size)
+            self._data = np.empty(self._capacity, dtype=self._dtype)
+            return
+
+        new_dtype = np.result_type(self._dtype, dtype)
+
+        if size > self._capacity or new_dtype != self._dtype:
+            while self._capacity < size:
+                self._capacity *= 2
+
+            new_data = np.empty(self._capacity, dtype=new_dtype)
+            new_data[:self._size] = self._data[:self._size]
+            self._data = new_data
+            self._dtype = new_dtype
+
+    def append(self, value):
+        """Adds a single scalar value to the end of the buffer."""
+
+        self._reserve(self._size + 1, np.asarray(value).dtype)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values: np.ndarray):
+        """Adds an array of values to the end of the buffer."""
+
+        values = np.asarray(values)
+        end = self._size + values.size
+
+        self._reserve(end, values.dtype)
+        self._data[self._size:end] = values
+        self._size = end
+
+    def to_array(self) -> np.ndarray:
+        """Get the buffer contents as an array trimmed to the number of values added.
+
+        Returns:
+            An array of all values added, copied only if unused capacity must be released.
+        """
+
+        if self._data is None:
+            return np.empty(0, dtype=np.float64 if self._dtype is None else self._dtype)
+
+        if self._size == self._capacity:
+            return self._data
+
+        return self._data[:self._size].copy()
+
+
+def _compress_none(data: bytes, level: Optional[int]) -> bytes:
+    return data
+
+
+def _decompress_none(data: bytes) -> bytes:
+    return data
+
+
+def _compress_zlib(data: bytes, level: int) -> bytes:
+    return zlib.compress(data, level)
+
+
+def _compress_lzma(data: bytes, level: int) -> bytes:
+    return lzma.compress(data, preset=level)
+
+
+def _compress_bz2(data: bytes, level: int) -> bytes:
+    return bz2.compress(data, level)
+
+
+class Codec(NamedTuple):
+    """Functions to compress / decompress blocks of data with a compression library."""
+
+    compress: Callable[[bytes, Optional[int]], bytes]
+    """Compresses data at a compression level."""
+
+    decompress: Callable[[bytes], bytes]
+    """Decompresses data."""
+
+    default_level: Optional[int]
+    """Compression level used if none is given."""
+
+
+CODECS = {'none': Codec(_compress_none, _decompress_none, None),
+          'zlib': Codec(_compress_zlib, zlib.decompress, 6),
+          'lzma': Codec(_compress_lzma, lzma.decompress, 6),
+          'bz2': Codec(_compress_bz2, bz2.decompress, 9)}
+"""Codecs available to compress saved objects, by name."""
+
+
+class Compression(NamedTuple):
+    """Settings for compressing objects saved by `Saver`.
+
+    Data is compressed in independent blocks.
+    With more than 1 worker, blocks are compressed in parallel by a thread pool
+    (compression libraries release the GIL while compressing).
+    """
+
+    codec: str = 'bz2'
+    """The name of the codec, from `CODECS` (none, zlib, lzma, bz2)."""
+
+    level: Optional[int] = None
+    """The compression level, or ``None`` for the codec's default level."""
+
+    workers: int = 1
+    """The number of threads compressing blocks in parallel."""
+
+    block_size: int = 2 ** 22
+    """The size in bytes of uncompressed data in each block."""
+
+    @property
+    def codec_level(self) -> Optional[int]:
+        """Get the compression level used by the codec."""
+
+        return CODECS[self.codec].default_level if self.level is None else self.level
+
+
+_SAVER_MAGIC = b'\x89msAIz\r\n'
+"""Bytes identifying a file saved by `Saver` with a header (legacy files are bzip2 streams)."""
+
+_SAVER_PREAMBLE = struct.Struct('<8sI')
+_BLOCK_LENGTH = struct.Struct('<Q')
+
+
+class CompressedBlockWriter:
+    """File-like object compressing all data written to it into a file, as a sequence of independent blocks.
+
+    Each block is written as its compressed length followed by its compressed data,
+    and a block length of 0 marks the end of the data.
+    A bounded number of blocks are compressed in parallel, so memory use does not grow with the data written.
+    """
+
+    def __init__(self,
+                 file,
+                 compression: Compression):
+        """Initializes an instance of CompressedBlockWriter class.
+
+        Args:
+            file: A binary file object to write compressed blocks to.
+            compression: The compression settings.
+        """
+
+        self._file = file
+        self._block_size = compression.block_size
+        self._compress = partial(CODECS[compression.codec].compress, level=compression.codec_level)
+
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._max_pending = 2 * compression.workers
+        self._executor = ThreadPoolExecutor(compression.workers) if compression.workers > 1 else None
+
+    def write(self, data) -> int:
+        self._buffer += data
+
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+
+        return len(data)
+
+    def _submit(self, block: bytes):
+        """Compresses a block, in a worker thread if available, and writes completed blocks in order."""
+
+        if self._executor is None:
+            self._write_block(self._compress(block))
+            return
+
+        self._pending.append(self._executor.submit(self._compress, block))
+
+        while len(self._pending) > self._max_pending:
+            self._write_block(self._pending.popleft().result())
+
+    def _write_block(self, compressed_block: bytes):
+        self._file.write(_BLOCK_LENGTH.pack(len(compressed_block)))
+        self._file.write(compressed_block)
+
+    def close(self):
+        """Compresses any remaining data and writes the end of the blocks."""
+
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+
+        while self._pending:
+            self._write_block(self._pending.popleft().result())
+
+        self._file.write(_BLOCK_LENGTH.pack(0))
+
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._executor is not None:
+            # Blocks not yet compressed are cancelled, rather than compressed and discarded
+            while self._pending:
+                self._pending.popleft().cancel()
+
+            self._executor.shutdown()
+
+
+class CompressedBlockReader(io.RawIOBase):
+    """Raw binary stream of the data in a file written by `CompressedBlockWriter`.
+
+    With more than 1 worker, the following blocks are decompressed in parallel while the current block is read.
+    """
+
+    def __init__(self,
+                 file,
+                 codec: str,
+                 workers: int = 1):
+        """Initializes an instance of CompressedBlockReader class.
+
+        Args:
+            file: A binary file object positioned at the start of the compressed blocks.
+            codec: The name of the codec the blocks were compressed with.
+            workers: The number of threads decompressing blocks in parallel.
+        """
+
+        super().__init__()
+
+        self._file = file
+        self._decompress = CODECS[codec].decompress
+        self._workers = workers
+
+        self._blocks = self._decompressed_blocks()
+        self._block = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def _compressed_blocks(self) -> Iterator[bytes]:
+        """Reads compressed blocks until the end of the blocks.
+
+        Raises:
+            MiscUtilsError: If the file ends before the end of the blocks.
+        """
+
+        while True:
+            block_length = self._file.read(_BLOCK_LENGTH.size)
+
+            if len(block_length) < _BLOCK_LENGTH.size:
+                raise MiscUtilsError(f"Unexpected end of compressed file: {self._file.name}")
+
+            block_length, = _BLOCK_LENGTH.unpack(block_length)
+            if block_length == 0:
+                return
+
+            compressed_block = self._file.read(block_length)
+            if len(compressed_block) < block_length:
+                raise MiscUtilsError(f"Unexpected end of compressed file: {self._file.name}")
+
+            yield compressed_block
+
+    def _decompressed_blocks(self) -> Iterator[bytes]:
+        """Decompresses blocks in order, in worker threads if available."""
+
+        if self._workers <= 1:
+            yield from map(self._decompress, self._compressed_blocks())
+            return
+
+        with ThreadPoolExecutor(self._workers) as executor:
+            pending = deque()
+
+            for compressed_block in self._compressed_blocks():
+                pending.append(executor.submit(self._decompress, compressed_block))
+
+                if len(pending) > 2 * self._workers:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def readinto(self, buffer) -> int:
+        while not self._block:
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+
+            self._block = memoryview(block)
+
+        read_size = min(len(buffer), len(self._block))
+        buffer[:read_size] = self._block[:read_size]
+        self._block = self._block[read_size:]
+
+        return read_size
+
+
+class HashingFile(io.RawIOBase):
+    """Raw binary stream calculating the sha256 hash of all bytes read from, or written to, a file.
+
+    Hashing is done in the same pass as the file I/O, so a file does not need to be re-read to calculate its hash.
+    """
+
+    def __init__(self, file):
+        """Initializes an instance of HashingFile class.
+
+        Args:
+            file: A binary file object, positioned at its start.
+        """
+
+        super().__init__()
+
+        self._file = file
+        self._hash = hashlib.sha256()
+
+    @property
+    def name(self):
+        return self._file.name
+
+    def readable(self) -> bool:
+        return self._file.readable()
+
+    def writable(self) -> bool:
+        return self._file.writable()
+
+    def readinto(self, buffer) -> int:
+        read_size = self._file.readinto(buffer)
+        self._hash.update(memoryview(buffer)[:read_size])
+        return read_size
+
+    def write(self, data) -> int:
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self) -> str:
+        """Get the hexadecimal digest of the hash of all bytes read or written."""
+
+        return self._hash.hexdigest()
+
+
 class Saver:
     """Functions to save / load, serialize, and compress files and objects."""
 
+    default_compression: ClassVar[Compression] = Compression()
+    """Compression settings used when saving objects without specifying any.
+
+    Set this to choose between speed and size for a deployment, such as ``Compression('zlib', 1, workers=4)``.
+    """
+
     @staticmethod
     def save_obj(obj: object,
-                 file: str) -> str:
+                 file: str,
+                 compression: Optional[Compression] = None) -> str:
         """Saves a python object to the path / filename given.
 
-        Data is serialized with pickle and compressed via bzip2.
-        A sha256 hash is also calculated.
+        Data is serialized with pickle and compressed in blocks by the codec given in `compression`.
+        The codec is recorded in the file header, so files are loaded without specifying it.
+        A sha256 hash is also calculated, as the file is written.
 
         Args:
             obj: The python object to save.
             file: A string representation of the path to the file to save.
                 Path can be relative or absolute.
+            compression: The compression settings, defaults to `default_compression`.
 
         Returns:
             A sha256 hash as a string.
+
+        Raises:
+            MiscUtilsError: For an unknown codec.
         """
 
+        if compression is None:
+            compression = Saver.default_compression
+
+        if compression.codec not in CODECS:
+            raise MiscUtilsError(f"Unknown compression codec: {compression.codec}")
+
+        header = json.dumps({'codec': compression.codec,
+                             'level': compression.codec_level,
+                             'block_size': compression.block_size,
+                             'pickle_protocol': 4}).encode('utf-8')
+
         file_path = pathlib.Path(file)
-        with bz2.open(file_path, "wb") as save_file:
-            # pickle.dump(obj, save_file, pickle.HIGHEST_PROTOCOL)
-            pickle.dump(obj, save_file, 4)
+        with open(file_path, "wb") as save_file:
+            hashing_file = HashingFile(save_file)
+            hashing_file.write(_SAVER_PREAMBLE.pack(_SAVER_MAGIC, len(header)))
+            hashing_file.write(header)
+
+            with CompressedBlockWriter(hashing_file, compression) as block_writer:
+                # pickle.dump(obj, block_writer, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(obj, block_writer, 4)
+
+        return hashing_file.hexdigest()
+
+    @staticmethod
+    @contextmanager
+    def replacing(file: str) -> Iterator[str]:
+        """Context manager giving a temporary path to write a file to, which replaces the file once written.
+
+        The temporary file is created in the same directory and renamed over `file` when the context exits,
+        so an interrupted write never leaves a partial file, and is removed if an exception is raised.
+        It is created with the permissions of any new file (0666 masked by the process umask),
+        rather than the owner only permissions of `tempfile.mkstemp`.
 
-        return Saver.get_hash(file)
+        Args:
+            file: A string representation of the path to the file written.
+
+        Returns:
+            A context manager, giving the path to the temporary file.
+        """
+
+        dir_path, filename = os.path.split(os.path.abspath(file))
+        temp_path = os.path.join(dir_path, f".{filename}.{secrets.token_hex(8)}.tmp")
+
+        os.close(os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+
+        try:
+            yield temp_path
+            os.replace(temp_path, file)
+
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
 
     @staticmethod
     def get_hash(file: str) -> str:
@@ -240,65 +754,329 @@ class Saver:
 
     @staticmethod
     def load_obj(file: str,
-                 test_hash: Optional[str] = None) -> Tuple[object, Optional[bool]]:
+                 test_hash: Optional[str] = None,
+                 workers: Optional[int] = None) -> Tuple[object, Optional[bool]]:
         """Loads a previously saved object.
 
         The file will be tested against a sha256 hash, if provided.
-        Data is decompressed via bzip2 and deserialized with pickle.
+        The hash is calculated as the file is read, so the file is only read once.
+        Data is decompressed by the codec recorded in the file header and deserialized with pickle.
+        Legacy files without a header are decompressed via bzip2.
 
         Args:
             file: A string representation of the path to the file to load the object from.
                 Path can be relative or absolute.
             test_hash: A sha256 hash as a string to test against.
+            workers: The number of threads decompressing blocks in parallel,
+                defaults to the workers of `default_compression`.
 
         Returns:
             A tuple of the object and an optional boolean indicating if the hash of the saved file was verified.
         """
 
-        if test_hash is not None:
-            if Saver.verify_hash(file, test_hash):
-                hash_verified = True
+        if workers is None:
+            workers = Saver.default_compression.workers
+
+        # The size of each read from the file
+        block_size = 65536
+
+        file_path = pathlib.Path(file)
+        with open(file_path, "rb", buffering=0) as raw_file:
+            hashing_file = HashingFile(raw_file)
+            load_file = io.BufferedReader(hashing_file, block_size)
+
+            if load_file.peek(_SAVER_PREAMBLE.size).startswith(_SAVER_MAGIC):
+                magic, header_length = _SAVER_PREAMBLE.unpack(load_file.read(_SAVER_PREAMBLE.size))
+                header = json.loads(load_file.read(header_length).decode('utf-8'))
+
+                if header['codec'] not in CODECS:
+                    raise MiscUtilsError(f"Unknown compression codec {header['codec']}: {file}")
+
+                block_reader = CompressedBlockReader(load_file, header['codec'], workers)
+                obj = pickle.load(io.BufferedReader(block_reader, header['block_size']))
+
             else:
-                hash_verified = False
+                with bz2.open(load_file, "rb") as bz2_file:
+                    obj = pickle.load(bz2_file)
+
+            # Any bytes not needed by pickle are read to complete the hash
+            if test_hash is not None:
+                while load_file.read(block_size):
+                    pass
+
+        if test_hash is not None:
+            hash_verified = hashing_file.hexdigest() == test_hash
         else:
             hash_verified = None
 
-        file_path = pathlib.Path(file)
-        with bz2.open(file_path, "rb") as file:
-            obj = pickle.load(file)
-
         return obj, hash_verified
 
 
+def _apply_configured(package_config: dict, func: Callable, item):
+    """Applies a function to an item in a worker process, after setting the msAI package configuration."""
+
+    for name, value in package_config.items():
+        setattr(msAI, name, value)
+
+    return func(item)
+
+
+class Executor:
+    """A reusable pool of workers, applying a function to each item of an iterable.
+
+    Workers are the calling process (serial), threads, or processes created by a multiprocessing start method
+    (fork, forkserver, or spawn). The pool is started on first use and reused by later calls until `shutdown`,
+    so its startup cost is paid once.
+
+    Functions and items given to process workers are pickled, so functions must be importable
+    (module functions or static methods, optionally within a `functools.partial`), not lambdas or closures.
+    The msAI package configuration (see `config_names`) of the calling process is sent with each call,
+    as worker processes started by spawn or forkserver import msAI with its default configuration.
+    Within a worker process (which may not create processes), process executors apply functions serially.
+    """
+
+    kinds: ClassVar[Tuple[str, ...]] = ('serial', 'thread', 'fork', 'forkserver', 'spawn')
+    """The kinds of executors, by worker type or start method."""
+
+    config_names: ClassVar[Tuple[str, ...]] = ('MP_SUPPORT', 'WORKER_COUNT', 'PARSE_CACHE_DIR', 'PARSE_CACHE_SIZE_MB',
+                                               'MS_TRANSPORT_DIR')
+    """The msAI package variables set in worker processes, as in the calling process."""
+
+    _pool_lock: ClassVar[threading.Lock] = threading.Lock()
+    """Lock starting pools, as executors may be used from several threads."""
+
+    def __init__(self,
+                 kind: str = 'serial',
+                 workers: Optional[int] = None):
+        """Initializes an instance of Executor class.
+
+        Args:
+            kind: (`serial`, `thread`, `fork`, `forkserver`, `spawn`) The type of workers,
+                where process workers are named by their start method.
+            workers: The number of workers, defaults to CPU count (and 1 for a serial executor).
+
+        Raises:
+            MiscUtilsError: For an invalid kind, or a start method not supported by the OS.
+        """
+
+        if kind not in self.kinds:
+            raise MiscUtilsError(f"Invalid executor kind: {kind}")
+
+        if kind not in ('serial', 'thread') and kind not in multiprocessing.get_all_start_methods():
+            raise MiscUtilsError(f"Start method not supported by OS: {kind}")
+
+        self.kind = kind
+        self.workers = 1 if kind == 'serial' else (workers or os.cpu_count())
+        self._pool = None
+        self._shutdown_at_exit = False
+
+    def __repr__(self):
+        return f"Executor({self.kind!r}, {self.workers})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    @property
+    def is_serial(self) -> bool:
+        """Get a boolean indicating if functions are applied serially, in the calling process."""
+
+        if self.kind == 'serial':
+            return True
+
+        # Worker processes are daemons, which may not create processes
+        return self.kind != 'thread' and multiprocessing.current_process().daemon
+
+    def _get_pool(self) -> multiprocessing.pool.Pool:
+        """Get the pool of workers, starting it on first use."""
+
+        with self._pool_lock:
+            if self._pool is None:
+                if self.kind == 'thread':
+                    self._pool = multiprocessing.pool.ThreadPool(self.workers)
+                else:
+                    self._pool = multiprocessing.get_context(self.kind).Pool(self.workers)
+
+                logger.info(f"Started {self.workers} {self.kind} workers")
+
+                # Stop workers before interpreter shutdown, rather than when the pool is garbage collected
+                #   * Registered once, as the pool may be restarted after shutdown
+                if not self._shutdown_at_exit:
+                    atexit.register(self.shutdown)
+                    self._shutdown_at_exit = True
+
+        return self._pool
+
+    def map(self,
+            func: Callable,
+            items: Iterable,
+            chunksize: int = 1) -> List:
+        """Applies a function to each item, returning results in the order of items.
+
+        Args:
+            func: The function to apply.
+            items: The items to apply `func` to.
+            chunksize: The number of items sent to a worker at a time.
+
+        Returns:
+            A list of results.
+        """
+
+        if self.is_serial:
+            return [func(item) for item in items]
+
+        return self._get_pool().map(self._configured(func), items, chunksize)
+
+    def imap_unordered(self,
+                       func: Callable,
+                       items: Iterable,
+                       chunksize: int = 1) -> Iterator:
+        """Applies a function to each item, yielding results as they are done, in any order.
+
+        Items are sent to workers as workers become free, so long running items do not hold up others.
+
+        Args:
+            func: The function to apply.
+            items: The items to apply `func` to.
+            chunksize: The number of items sent to a worker at a time.
+
+        Returns:
+            An iterator of results.
+        """
+
+        if self.is_serial:
+            return map(func, items)
+
+        return self._get_pool().imap_unordered(self._configured(func), items, chunksize)
+
+    def apply(self,
+              func: Callable,
+              item):
+        """Applies a function to a single item by a worker, waiting for its result.
+
+        Calls may be made from several threads at once (such as the stages of a `Pipeline`),
+        so that work done in threads can be sent to process workers.
+
+        Args:
+            func: The function to apply.
+            item: The item to apply `func` to.
+
+        Returns:
+            The result.
+        """
+
+        if self.is_serial:
+            return func(item)
+
+        return self._get_pool().apply(self._configured(func), (item,))
+
+    def _configured(self, func: Callable) -> Callable:
+        """Wraps a function to be applied by workers with the package configuration of the calling process."""
+
+        if self.kind == 'thread':
+            return func
+
+        package_config = {name: getattr(msAI, name) for name in self.config_names}
+        return partial(_apply_configured, package_config, func)
+
+    def shutdown(self):
+        """Stops the workers, after pending work is done. The pool is started again if used later."""
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
 class MultiTaskDF:
     """Functions to parallelize work on dataframes through multiprocessing."""
 
+    last_worker_busy: ClassVar[Optional[DF]] = None
+    """The work of each worker in the last parallel call, to assess load balance.
+
+    Dataframe structure
+        | **Index:**  worker (process or thread name)
+        | **Columns:**  tasks,  rows,  busy_time (seconds)
+    """
+
     @staticmethod
     def _partition_by_rows(df_in: DF,
-                           subset_func) -> DF:
-        """Partitions a dataframe into subsets across rows and assigns a worker to each to apply a function.
+                           subset_func,
+                           cost: Optional[str] = None,
+                           task_rows: Optional[int] = None) -> DF:
+        """Partitions a dataframe into small subsets across rows, which are dynamically assigned to workers.
 
-        Creates a process pool with a number of workers equal to cpu count (by default),
-        and splits the dataframe `df_in` into a number of subsets equal to number of workers.
-        Each worker applies the `subset_func` to a dataframe subset in parallel.
+        Subsets are applied by the workers of `.EXECUTOR`, the package `Executor` (created once, and reused by each call).
+        Each free worker takes the next subset from a queue, and applies the `subset_func` to it,
+        so workers are kept busy until all subsets are done.
+        With a `cost` column (such as file size), rows are queued in order of decreasing cost,
+        so the longest running rows are started first, rather than left to the end.
 
         Args:
             df_in: The input dataframe.
             subset_func: A partial object containing the function to apply to each dataframe subset.
                 This is received as a partial object, and its call input is completed with
                 a dataframe subset after the dataframe is split.
+            cost: The name of a column estimating the relative run time of each row.
+            task_rows: The number of rows in each subset.
+                Defaults to 1 with a `cost` column, or to a quarter of an even split across workers.
 
-        Returns: A dataframe formed by concating all subset results.
+        Returns: A dataframe formed by concating all subset results, in the order of `df_in`.
         """
 
-        worker_count = msAI.WORKER_COUNT
-        df_part = np.array_split(df_in, worker_count)
-        pool = Pool(worker_count)
+        executor = msAI.EXECUTOR
+        row_count = df_in.shape[0]
+
+        if cost is None:
+            order = np.arange(row_count)
+        else:
+            costs = np.nan_to_num(pd.to_numeric(df_in[cost], errors='coerce').to_numpy(dtype=float))
+            order = np.argsort(-costs, kind='stable')
 
-        with pool:
-            df_out = pd.concat(pool.map(subset_func, df_part), sort=False)
+        if task_rows is None:
+            task_rows = 1 if cost is not None else max(1, -(-row_count // (executor.workers * 4)))
 
-        return df_out
+        tasks = [(task_number, df_in.iloc[order[start:start + task_rows]])
+                 for task_number, start in enumerate(range(0, row_count, task_rows))]
+        if len(tasks) == 0:
+            tasks = [(0, df_in)]
+
+        results = sorted(executor.imap_unordered(partial(MultiTaskDF._run_timed, subset_func), tasks),
+                         key=lambda result: result[0])
+
+        worker_busy = pd.DataFrame([result[2:] for result in results], columns=['worker', 'rows', 'busy_time'])
+        MultiTaskDF.last_worker_busy = worker_busy.groupby('worker').agg(tasks=('rows', 'size'),
+                                                                         rows=('rows', 'sum'),
+                                                                         busy_time=('busy_time', 'sum'))
+        logger.debug(f"Worker busy time:\n{MultiTaskDF.last_worker_busy.to_string()}")
+
+        df_out = pd.concat([result[1] for result in results], sort=False)
+
+        return df_out.iloc[np.argsort(order, kind='stable')] if row_count > 0 else df_out
+
+    @staticmethod
+    def _run_timed(subset_func, task: Tuple[int, DF]) -> Tuple[int, DF, str, int, float]:
+        """Applies a function to a numbered dataframe subset, timing the worker.
+
+        Returns:
+            A tuple of the task number, the resulting dataframe subset,
+            the name of the worker, the number of rows, and the busy time in seconds.
+        """
+
+        task_number, df_subset = task
+
+        start_time = time.perf_counter()
+        df_out = subset_func(df_subset)
+        busy_time = time.perf_counter() - start_time
+
+        if multiprocessing.current_process().daemon:
+            worker = multiprocessing.current_process().name
+        else:
+            worker = threading.current_thread().name
+
+        return task_number, df_out, worker, df_subset.shape[0], busy_time
 
     @staticmethod
     def _run_on_subset_rows(func,
@@ -320,19 +1098,229 @@ class MultiTaskDF:
 
     @staticmethod
     def parallelize_on_rows(df: DF,
-                            func) -> DF:
+                            func,
+                            cost: Optional[str] = None,
+                            task_rows: Optional[int] = None) -> DF:
         """Applies a function to rows in a dataframe in parallel.
 
+        Rows are dynamically scheduled across workers, longest first with a `cost` column (see `_partition_by_rows`).
+        The work of each worker is recorded in `last_worker_busy`.
+
         Args:
             df: The input dataframe.
             func: The function to apply to each row in the `df`.
                 This function must be a static method and return the row, reflecting the results.
                 Additional arguments can be passed with a partial object by the caller.
+            cost: The name of a column estimating the relative run time of each row, such as `file_size`.
+            task_rows: The number of rows sent to a worker at a time.
 
         Returns: A new dataframe reflecting the changes from the applied `func`.
         """
 
-        return MultiTaskDF._partition_by_rows(df, partial(MultiTaskDF._run_on_subset_rows, func))
+        return MultiTaskDF._partition_by_rows(df, partial(MultiTaskDF._run_on_subset_rows, func), cost, task_rows)
+
+
+class PipelineStage(NamedTuple):
+    """A stage of a `Pipeline`, applying a function to each item by its own worker threads."""
+
+    name: str
+    """The name of the stage."""
+
+    func: Callable
+    """The function applied to each item, returning the item passed to the next stage."""
+
+    workers: int = 1
+    """The number of worker threads of the stage."""
+
+
+class PipelineResult(NamedTuple):
+    """The result of an item passed through all stages of a `Pipeline`."""
+
+    item: object
+    """The item given to the pipeline."""
+
+    value: object
+    """The result of the last stage, or ``None`` if a stage raised an exception."""
+
+    error: Optional[Exception]
+    """The exception raised by a stage function, if any."""
+
+
+_PIPELINE_DONE = object()
+"""Marks the end of items in a pipeline queue."""
+
+
+class Pipeline:
+    """Streams items through a sequence of stages, connected by bounded queues.
+
+    Each stage has its own worker threads, passing results to the next stage as they are done,
+    so stages work on different items at the same time (such as parsing one file while writing another).
+    Queues between stages hold at most `queue_size` items, so a slow stage holds up the stages before it.
+    The number of items in the pipeline is bounded by its worker counts and queue sizes, not by the number of items.
+
+    Stage functions run in threads, so CPU-bound work holding the GIL should be sent to process workers
+    by the stage function (see `Executor.apply`).
+    An exception raised by a stage function ends the processing of its item only, which is returned with the error.
+    """
+
+    last_stage_busy: ClassVar[Optional[DF]] = None
+    """The work of each stage in the last pipeline run, to find the stage limiting throughput.
+
+    Dataframe structure
+        | **Index:**  stage
+        | **Columns:**  workers,  items,  busy_time (seconds, summed across workers)
+    """
+
+    def __init__(self,
+                 *stages: PipelineStage,
+                 queue_size: int = 1):
+        """Initializes an instance of Pipeline class.
+
+        Args:
+            stages: The stages of the pipeline, in order.
+            queue_size: The maximum number of items waiting before each stage.
+
+        Raises:
+            MiscUtilsError: For a pipeline without stages, or a stage without workers.
+        """
+
+        if not stages:
+            raise MiscUtilsError("A pipeline needs at least one stage")
+
+        for stage in stages:
+            if stage.workers < 1:
+                raise MiscUtilsError(f"Pipeline stage {stage.name} needs at least one worker")
+
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def __repr__(self):
+        return f"Pipeline({', '.join(f'{stage.name}[{stage.workers}]' for stage in self.stages)})"
+
+    def run(self, items: Iterable) -> Iterator[PipelineResult]:
+        """Passes each item through all stages, yielding results as they are done, in any order.
+
+        Items are read from `items` only as the first stage has room for them.
+        Closing the iterator early stops all workers.
+        The work of each stage is recorded in `last_stage_busy`.
+
+        Args:
+            items: The items passed to the first stage.
+
+        Returns:
+            An iterator of `PipelineResult`, one for each item.
+        """
+
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        stop = threading.Event()
+        lock = threading.Lock()
+        running = [stage.workers for stage in self.stages]
+        stage_busy = [[0, 0.0] for _ in self.stages]
+        feed_errors = []
+
+        def put(stage_queue, value) -> bool:
+            """Puts a value in a queue, waiting for room unless the pipeline is stopped."""
+
+            while not stop.is_set():
+                try:
+                    stage_queue.put(value, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+
+            return False
+
+        def get(stage_queue):
+            """Gets a value from a queue, or the end of items if the pipeline is stopped."""
+
+            while not stop.is_set():
+                try:
+                    return stage_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+            return _PIPELINE_DONE
+
+        def end(stage_number: int):
+            """Marks the end of items after a stage, for each worker of the next stage."""
+
+            next_workers = self.stages[stage_number + 1].workers if stage_number + 1 < len(self.stages) else 1
+
+            for _ in range(next_workers):
+                put(queues[stage_number + 1], _PIPELINE_DONE)
+
+        def feed():
+            try:
+                for item in items:
+                    if not put(queues[0], PipelineResult(item, item, None)):
+                        return
+            except Exception as err:
+                feed_errors.append(err)
+
+            for _ in range(self.stages[0].workers):
+                put(queues[0], _PIPELINE_DONE)
+
+        def work(stage_number: int, stage: PipelineStage):
+            while True:
+                result = get(queues[stage_number])
+                if result is _PIPELINE_DONE:
+                    break
+
+                if result.error is None:
+                    start_time = time.perf_counter()
+
+                    try:
+                        result = result._replace(value=stage.func(result.value))
+                    except Exception as err:
+                        result = result._replace(value=None, error=err)
+
+                    with lock:
+                        stage_busy[stage_number][0] += 1
+                        stage_busy[stage_number][1] += time.perf_counter() - start_time
+
+                if not put(queues[stage_number + 1], result):
+                    break
+
+                # Release the item before waiting for the next
+                del result
+
+            with lock:
+                running[stage_number] -= 1
+                last_worker = running[stage_number] == 0
+
+            if last_worker:
+                end(stage_number)
+
+        threads = [threading.Thread(target=feed, name='pipeline-feed', daemon=True)]
+        for stage_number, stage in enumerate(self.stages):
+            threads.extend(threading.Thread(target=work, args=(stage_number, stage),
+                                            name=f"pipeline-{stage.name}-{worker}", daemon=True)
+                           for worker in range(stage.workers))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                result = queues[-1].get()
+                if result is _PIPELINE_DONE:
+                    break
+
+                yield result
+
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            Pipeline.last_stage_busy = pd.DataFrame(
+                [(stage.name, stage.workers, items_done, busy_time)
+                 for stage, (items_done, busy_time) in zip(self.stages, stage_busy)],
+                columns=['stage', 'workers', 'items', 'busy_time']).set_index('stage')
+            logger.debug(f"Pipeline stage busy time:\n{Pipeline.last_stage_busy.to_string()}")
+
+        if feed_errors:
+            raise feed_errors[0]
 
 
 class EnvInfo:
@@ -387,8 +1375,8 @@ class EnvInfo:
             | POSIX = 'fork'
             | Windows = 'spawn'
 
-        Use this function to test and switch to single processing if necessary.
-        Certain functions will fail under the spawn start method.
+        Use this function to select the kind of `Executor`.
+        Functions applied by msAI workers are importable, so any start method may be used.
         """
 
         return multiprocessing.get_start_method()
@@ -0,0 +1,454 @@
+"""msAI module for reading and writing the columnar msAIr file format.
+
+A msAIr file (format version 2) holds MS data as raw NumPy arrays (blocks), preceded by a small header.
+Blocks are aligned within the file, so they can be memory-mapped and used without copying or decompressing.
+Legacy msAIr files (format version 1) are compressed pickles, and are read by `.Saver`.
+
+Rows of blocks may be grouped into chunks (such as consecutive spectra and their peaks),
+each described in the header by index values (such as their retention time range) and a sha256 hash.
+Blocks not divided into chunks have their own sha256 hash in the header.
+The content hash of a msAIr file is the sha256 hash of its header (not of the whole file, as by ``sha256sum``),
+so any subset of chunks can be verified without reading the rest of the file.
+Verifying all chunks (see `verify`) also checks that alignment padding is zero and no bytes follow the last block,
+so every byte of the file is verified.
+
+File layout
+    | **Preamble:**  magic bytes (8),  format version (uint32),  header length (uint32)
+    | **Header:**  UTF-8 JSON of run information, a description of each block, and the chunk index
+    | **Blocks:**  raw little-endian arrays, each starting at a multiple of `ALIGNMENT` bytes
+
+Features
+    * Writing named NumPy arrays (and object arrays, such as strings) with run information
+    * Encoding, hashing, and writing as separate steps, for pipelined writing
+    * Reading the header alone, without reading any blocks
+    * Memory-mapping blocks with zero copies
+    * Indexing chunks of rows, and verifying the hashes of selected chunks only
+    * Detecting the format version of a msAIr file
+
+"""
+
+
+from msAI.errors import MSAIRformatError
+
+import json
+import struct
+import hashlib
+import logging
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+"""Module logger."""
+
+
+MAGIC = b'\x89msAIr\r\n'
+"""Bytes identifying a columnar msAIr file."""
+
+FORMAT_VERSION = 2
+"""The columnar msAIr format version written."""
+
+LEGACY_VERSION = 1
+"""The format version of legacy (compressed pickle) msAIr files."""
+
+ALIGNMENT = 64
+"""Byte alignment of the header end and each block."""
+
+_PREAMBLE = struct.Struct('<8sII')
+
+
+def _aligned(position: int) -> int:
+    """Get the first aligned position at or after a position."""
+
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def _as_block(array: np.ndarray) -> Tuple[np.ndarray, str]:
+    """Get an array as stored in a block, and the block's encoding.
+
+    Numeric arrays are stored raw (little-endian),
+    while object arrays (such as strings) are stored as UTF-8 JSON.
+    """
+
+    array = np.asarray(array)
+
+    if array.dtype.hasobject:
+        encoded = json.dumps(array.tolist()).encode('utf-8')
+        return np.frombuffer(encoded, dtype=np.uint8), 'json'
+
+    return np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<')), 'raw'
+
+
+def _row_bytes(block_spec: Dict) -> int:
+    """Get the number of bytes in each row of a raw block."""
+
+    return np.dtype(block_spec['dtype']).itemsize * int(np.prod(block_spec['shape'][1:], dtype=np.int64))
+
+
+def _chunk_hash(blocks: Dict[str, np.ndarray],
+                block_specs: Dict[str, Dict],
+                chunk_rows: Dict[str, List[int]]) -> str:
+    """Calculates the sha256 hash of the rows of each block in a chunk, in block order.
+
+    Args:
+        blocks: The raw (uint8) bytes of each block, by block name.
+        block_specs: The description of each block in the header.
+        chunk_rows: The (start, stop) rows of each block in the chunk.
+    """
+
+    chunk_hash = hashlib.sha256()
+
+    for name, (start, stop) in chunk_rows.items():
+        row_bytes = _row_bytes(block_specs[name])
+        chunk_hash.update(blocks[name][start * row_bytes:stop * row_bytes])
+
+    return chunk_hash.hexdigest()
+
+
+class EncodedFile(NamedTuple):
+    """The contents of a msAIr file, encoded as blocks but not yet written.
+
+    Encoding, hashing, and writing are separate steps (see `encode`, `hash_blocks`, and `write_encoded`),
+    so each may be done by a different stage of a pipeline.
+    """
+
+    info: Dict
+    """Run information, which must be JSON serializable."""
+
+    block_specs: Dict[str, Dict]
+    """The description of each block in the header, by block name."""
+
+    blocks: Dict[str, Tuple[int, np.ndarray]]
+    """The (offset, block) of each block by block name, where blocks are raw little-endian or uint8 JSON arrays."""
+
+    chunks: List[Dict]
+    """The index of chunks, with their sha256 hash once hashed."""
+
+    header: Optional[bytes] = None
+    """The header, once hashed."""
+
+
+def encode(info: Dict,
+           arrays: Dict[str, np.ndarray],
+           chunks: Optional[List[Dict]] = None) -> EncodedFile:
+    """Encodes arrays and run information as the blocks of a msAIr file, without hashing them.
+
+    Args:
+        info: Run information, which must be JSON serializable.
+        arrays: The arrays to store, by block name.
+        chunks: An optional index of chunks. Each chunk is a dictionary of JSON serializable index values,
+            and `rows`: a dictionary of the (start, stop) rows of each raw block in the chunk.
+
+    Returns:
+        The encoded file, to be hashed by `hash_blocks`.
+    """
+
+    if chunks is None:
+        chunks = []
+
+    blocks = {}
+    block_specs = {}
+    position = 0
+
+    for name, array in arrays.items():
+        block, encoding = _as_block(array)
+        position = _aligned(position)
+
+        blocks[name] = (position, block)
+        block_specs[name] = {'offset': position,
+                             'nbytes': block.nbytes,
+                             'dtype': block.dtype.str if encoding == 'raw' else None,
+                             'shape': list(np.shape(array)),
+                             'encoding': encoding}
+
+        position += block.nbytes
+
+    return EncodedFile(info, block_specs, blocks, chunks)
+
+
+def hash_blocks(encoded: EncodedFile) -> EncodedFile:
+    """Hashes the chunks and unchunked blocks of an encoded msAIr file, creating its header.
+
+    Args:
+        encoded: The encoded file, as returned by `encode`.
+
+    Returns:
+        The encoded file with hashed chunks and its header, to be written by `write_encoded`.
+    """
+
+    block_bytes = {name: memoryview(block).cast('B') for name, (offset, block) in encoded.blocks.items()}
+    block_specs = {name: dict(block_spec) for name, block_spec in encoded.block_specs.items()}
+    chunk_index = [{**chunk, 'sha256': _chunk_hash(block_bytes, block_specs, chunk['rows'])}
+                   for chunk in encoded.chunks]
+
+    chunked_names = {name for chunk in encoded.chunks for name in chunk['rows']}
+    for name, block_spec in block_specs.items():
+        if name not in chunked_names:
+            block_spec['sha256'] = hashlib.sha256(block_bytes[name]).hexdigest()
+
+    header = json.dumps({'info': encoded.info, 'blocks': block_specs, 'chunks': chunk_index}).encode('utf-8')
+
+    return encoded._replace(block_specs=block_specs, chunks=chunk_index, header=header)
+
+
+def write_encoded(file_path: str, encoded: EncodedFile) -> str:
+    """Writes an encoded msAIr file, hashing it first if not yet hashed.
+
+    Args:
+        file_path: A string representation of the path to the file to write.
+            Path can be relative or absolute.
+        encoded: The encoded file, as returned by `encode` or `hash_blocks`.
+
+    Returns:
+        The content hash of the file (the sha256 hash of its header) as a string.
+    """
+
+    if encoded.header is None:
+        encoded = hash_blocks(encoded)
+
+    data_start = _aligned(_PREAMBLE.size + len(encoded.header))
+
+    with open(file_path, 'wb') as file:
+        for data in _file_contents(encoded.header, data_start, encoded.blocks.values()):
+            file.write(data)
+
+    return hashlib.sha256(encoded.header).hexdigest()
+
+
+def write(file_path: str,
+          info: Dict,
+          arrays: Dict[str, np.ndarray],
+          chunks: Optional[List[Dict]] = None) -> str:
+    """Writes arrays and run information as a msAIr file.
+
+    Args:
+        file_path: A string representation of the path to the file to write.
+            Path can be relative or absolute.
+        info: Run information, which must be JSON serializable.
+        arrays: The arrays to store, by block name.
+        chunks: An optional index of chunks. Each chunk is a dictionary of JSON serializable index values,
+            and `rows`: a dictionary of the (start, stop) rows of each raw block in the chunk.
+
+    Returns:
+        The content hash of the file (the sha256 hash of its header) as a string.
+    """
+
+    return write_encoded(file_path, hash_blocks(encode(info, arrays, chunks)))
+
+
+def _file_contents(header: bytes, data_start: int, blocks) -> Iterator[bytes]:
+    """Yields the bytes of a msAIr file in order, from its header and (offset, block) pairs."""
+
+    yield _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header))
+    yield header
+
+    position = _PREAMBLE.size + len(header)
+
+    for offset, block in blocks:
+        yield bytes(data_start + offset - position)
+        yield memoryview(block).cast('B')
+
+        position = data_start + offset + block.nbytes
+
+
+def read_version(file_path: str) -> int:
+    """Get the format version of a msAIr file.
+
+    Args:
+        file_path: A string representation of the path to the msAIr file.
+
+    Returns:
+        The format version, where files without the msAIr magic bytes are `LEGACY_VERSION`.
+    """
+
+    with open(file_path, 'rb') as file:
+        preamble = file.read(_PREAMBLE.size)
+
+    if len(preamble) < _PREAMBLE.size or not preamble.startswith(MAGIC):
+        return LEGACY_VERSION
+
+    return _PREAMBLE.unpack(preamble)[1]
+
+
+def _read_header(file) -> Tuple[Dict, int, str]:
+    """Reads the header of an open msAIr file.
+
+    Returns:
+        A tuple of the header, the position in the file where blocks start, and the sha256 hash of the header.
+
+    Raises:
+        MSAIRformatError: If the file is not a supported columnar msAIr file.
+    """
+
+    preamble = file.read(_PREAMBLE.size)
+
+    if len(preamble) < _PREAMBLE.size:
+        raise MSAIRformatError(f"File is too short to be a msAIr file: {file.name}")
+
+    magic, version, header_length = _PREAMBLE.unpack(preamble)
+
+    if magic != MAGIC:
+        raise MSAIRformatError(f"Not a columnar msAIr file: {file.name}")
+
+    if version != FORMAT_VERSION:
+        raise MSAIRformatError(f"Unsupported msAIr format version {version}: {file.name}")
+
+    header_bytes = file.read(header_length)
+    header = json.loads(header_bytes.decode('utf-8'))
+
+    return header, _aligned(_PREAMBLE.size + header_length), hashlib.sha256(header_bytes).hexdigest()
+
+
+def read_info(file_path: str) -> Dict:
+    """Reads the run information of a msAIr file, without reading any blocks.
+
+    Args:
+        file_path: A string representation of the path to the msAIr file.
+            Path can be relative or absolute.
+
+    Returns:
+        The run information, as written.
+
+    Raises:
+        MSAIRformatError: If the file is not a supported columnar msAIr file.
+    """
+
+    with open(file_path, 'rb') as file:
+        header, data_start, header_hash = _read_header(file)
+
+    return header['info']
+
+
+def _map_blocks(file_path: str) -> Tuple[Dict, Dict[str, np.ndarray], str]:
+    """Memory-maps the raw bytes of each block of a msAIr file.
+
+    Returns:
+        A tuple of the header, the uint8 array of each block by block name, and the sha256 hash of the header.
+
+    Raises:
+        MSAIRformatError: If the file is not a supported columnar msAIr file, or is truncated.
+    """
+
+    with open(file_path, 'rb') as file:
+        header, data_start, header_hash = _read_header(file)
+        file_size = file.seek(0, 2)
+
+    file_map = np.memmap(file_path, dtype=np.uint8, mode='r')
+    blocks = {}
+
+    for name, spec in header['blocks'].items():
+        start = data_start + spec['offset']
+
+        if start + spec['nbytes'] > file_size:
+            raise MSAIRformatError(f"Truncated msAIr file, block {name} is incomplete: {file_path}")
+
+        blocks[name] = file_map[start:start + spec['nbytes']]
+
+    return header, blocks, header_hash
+
+
+def _padding_verified(file_path: str) -> bool:
+    """Checks that the alignment padding of a msAIr file is zero, and that no bytes follow its last block."""
+
+    with open(file_path, 'rb') as file:
+        header, data_start, header_hash = _read_header(file)
+        position = file.tell()
+
+    file_map = np.memmap(file_path, dtype=np.uint8, mode='r')
+
+    for spec in sorted(header['blocks'].values(), key=lambda spec: spec['offset']):
+        start = data_start + spec['offset']
+
+        if start < position or file_map[position:start].any():
+            return False
+
+        position = start + spec['nbytes']
+
+    return position == file_map.size
+
+
+def read(file_path: str) -> Tuple[Dict, Dict[str, np.ndarray], List[Dict]]:
+    """Reads a msAIr file, memory-mapping its blocks.
+
+    Raw blocks are returned as read-only `np.memmap` arrays, so data is only read from disk when accessed.
+    JSON blocks (such as strings) are decoded into object arrays.
+
+    Args:
+        file_path: A string representation of the path to the msAIr file.
+            Path can be relative or absolute.
+
+    Returns:
+        A tuple of the run information, the arrays by block name, and the chunk index.
+
+    Raises:
+        MSAIRformatError: If the file is not a supported columnar msAIr file, or is truncated.
+    """
+
+    header, blocks, header_hash = _map_blocks(file_path)
+    arrays = {}
+
+    for name, spec in header['blocks'].items():
+        block = blocks[name]
+
+        if spec['encoding'] == 'json':
+            values = json.loads(block.tobytes().decode('utf-8'))
+
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            arrays[name] = array
+
+        elif spec['nbytes'] == 0:
+            arrays[name] = np.empty(spec['shape'], dtype=spec['dtype'])
+
+        else:
+            arrays[name] = block.view(spec['dtype']).reshape(spec['shape'])
+
+    return header['info'], arrays, header['chunks']
+
+
+def verify(file_path: str,
+           content_hash: str,
+           chunk_numbers: Optional[Iterable[int]] = None) -> bool:
+    """Verifies a msAIr file, or a subset of its chunks, against the content hash of the file.
+
+    The header is verified against `content_hash`, then the blocks not divided into chunks,
+    and each chunk given, are verified against their hashes in the header.
+    Verifying all chunks also checks that the padding before each block is zero, and that no bytes follow the last block.
+    Only the data verified is read from the file.
+
+    Args:
+        file_path: A string representation of the path to the msAIr file.
+            Path can be relative or absolute.
+        content_hash: The content hash of the file (the sha256 hash of its header) as a string, as returned by `write`.
+        chunk_numbers: The positions in the chunk index of the chunks to verify, defaults to all chunks
+            (verifying every byte of the file).
+
+    Returns:
+        A boolean indicating if the hash values are verified.
+
+    Raises:
+        MSAIRformatError: If the file is not a supported columnar msAIr file, or is truncated.
+    """
+
+    header, blocks, header_hash = _map_blocks(file_path)
+
+    if header_hash != content_hash:
+        return False
+
+    for name, spec in header['blocks'].items():
+        if 'sha256' in spec and hashlib.sha256(blocks[name]).hexdigest() != spec['sha256']:
+            return False
+
+    chunks = header['chunks']
+    if chunk_numbers is None:
+        if not _padding_verified(file_path):
+            return False
+
+        chunk_numbers = range(len(chunks))
+
+    for n in chunk_numbers:
+        if _chunk_hash(blocks, header['blocks'], chunks[n]['rows']) != chunks[n]['sha256']:
+            return False
+
+    return True
@@ -4,7 +4,14 @@
 Features
     * Extraction of data from MS files (mzML, TBD...)
     * Creation of in-memory data structures for spectra / peaks values
-    * Building a set of MS data files
+    * Lazy, random access to the spectra of mzML files
+    * Memory-mapped access to the MS data of columnar msAIr files
+    * Sharing MS data between processes through memory-mapped msAIr files
+    * Building a set of MS data files, optionally scanning run information from file headers
+    * Refreshing a set of MS data files with the changes since its last scan
+    * Extracting ion chromatograms (XICs) of many target ions through an m/z-sorted index of MS1 peaks
+    * TIC and base peak chromatograms, from stored chromatograms or spectrum headers without decoding peaks
+    * Finding the MSn spectra of precursor ions through a precursor m/z-sorted index
 
 Todo
     * Change MSfile to dataclass
@@ -15,15 +22,23 @@ Todo
 """
 
 
+import msAI
 import msAI.miscUtils as miscUtils
-from msAI.errors import MSfileSetInitError
+import msAI.mzmlReader as mzmlReader
+import msAI.msAIrFormat as msAIrFormat
+from msAI.errors import MSdataError, MSfileSetInitError
 from msAI.miscDecos import log_timer
 from msAI.types import DF
 
 import os
+import mmap
+import atexit
 import logging
-from typing import ClassVar, List
+import tempfile
+from collections import OrderedDict
+from typing import ClassVar, Collection, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 import pymzml
 
@@ -32,203 +47,1847 @@ logger = logging.getLogger(__name__)
 """Module logger."""
 
 
+class PeakStore:
+    """Compact ragged (CSR-style) store of the peaks from all spectra in an MS file.
+
+    Peak values from all spectra are held in flat m/z and intensity arrays.
+    A per spectrum offsets array marks where each spectrum's peaks begin and end,
+    so the peaks of any spectrum can be sliced in O(1) without copying.
+    Retention times are not repeated per peak, and are only kept in `MSfile.spectra`.
+    """
+
+    spec_ids: np.ndarray
+    """The spectrum IDs, in the order their peaks are stored."""
+
+    offsets: np.ndarray
+    """Start positions of each spectrum's peaks in the flat arrays, followed by the total peak count."""
+
+    mz: np.ndarray
+    """The m/z values of all peaks."""
+
+    i: np.ndarray
+    """The intensity values of all peaks."""
+
+    def __init__(self,
+                 spec_ids: np.ndarray,
+                 offsets: np.ndarray,
+                 mz: np.ndarray,
+                 i: np.ndarray):
+        """Initializes an instance of PeakStore class.
+
+        Args:
+            spec_ids: The spectrum IDs, in the order their peaks are stored.
+            offsets: Start positions of each spectrum's peaks in `mz` and `i`,
+                followed by the total peak count (length is one more than `spec_ids`).
+            mz: The m/z values of all peaks.
+            i: The intensity values of all peaks.
+        """
+
+        self.spec_ids = np.asarray(spec_ids)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.mz = mz
+        self.i = i
+
+        self._positions = None
+
+    @classmethod
+    def from_peak_counts(cls,
+                         spec_ids: np.ndarray,
+                         peak_counts: np.ndarray,
+                         mz: np.ndarray,
+                         i: np.ndarray) -> 'PeakStore':
+        """Creates a PeakStore from the number of peaks in each spectrum.
+
+        Args:
+            spec_ids: The spectrum IDs, in the order their peaks are stored.
+            peak_counts: The number of peaks in each spectrum.
+            mz: The m/z values of all peaks.
+            i: The intensity values of all peaks.
+
+        Returns:
+            A new PeakStore.
+        """
+
+        offsets = np.zeros(len(peak_counts) + 1, dtype=np.int64)
+        np.cumsum(peak_counts, out=offsets[1:])
+
+        return cls(spec_ids, offsets, mz, i)
+
+    @classmethod
+    def from_df(cls, peaks: DF, spec_ids: Optional[np.ndarray] = None) -> 'PeakStore':
+        """Creates a PeakStore from a peaks dataframe, structured as `MSfile.peaks`.
+
+        Args:
+            peaks: A dataframe of peaks.
+            spec_ids: The IDs of all spectra, in the order stored (such as the index of `MSfile.spectra`),
+                so spectra without peaks are included. Defaults to the spectra with peaks.
+
+        Returns:
+            A new PeakStore.
+
+        Raises:
+            MSdataError: If peaks are not stored in the order of `spec_ids`.
+        """
+
+        peak_counts = peaks.groupby(level='spec_id', sort=False).size()
+
+        if spec_ids is None:
+            return cls.from_peak_counts(peak_counts.index.to_numpy(), peak_counts.to_numpy(),
+                                        peaks['mz'].to_numpy(), peaks['i'].to_numpy())
+
+        spec_ids = np.asarray(spec_ids)
+        peak_counts = peak_counts.reindex(spec_ids, fill_value=0).to_numpy()
+
+        if not np.array_equal(peaks.index.get_level_values('spec_id').to_numpy(), np.repeat(spec_ids, peak_counts)):
+            raise MSdataError("Peaks are not stored in the order of spectra")
+
+        return cls.from_peak_counts(spec_ids, peak_counts, peaks['mz'].to_numpy(), peaks['i'].to_numpy())
+
+    def __len__(self):
+        return self.spec_ids.size
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_positions'] = None
+        return state
+
+    @property
+    def peak_count(self) -> int:
+        """Get the total number of peaks in the store."""
+
+        return int(self.offsets[-1])
+
+    @property
+    def peak_counts(self) -> np.ndarray:
+        """Get the number of peaks in each spectrum."""
+
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        """Get the memory size of the stored arrays in bytes."""
+
+        return self.spec_ids.nbytes + self.offsets.nbytes + self.mz.nbytes + self.i.nbytes
+
+    def spectrum_summary(self) -> Dict[str, np.ndarray]:
+        """Get the base peak and m/z range of each spectrum, computed over all peaks at once.
+
+        The base peak is the first peak of a spectrum with its maximum intensity.
+        Values of spectra without peaks are NaN.
+
+        Returns:
+            A dictionary of arrays (base_peak_mz, base_peak_i, mz_min, mz_max), in the order spectra are stored.
+        """
+
+        peak_counts = self.peak_counts
+        has_peaks = peak_counts > 0
+        starts = self.offsets[:-1][has_peaks]
+
+        summary = {name: np.full(len(self), np.nan) for name in ('base_peak_mz', 'base_peak_i', 'mz_min', 'mz_max')}
+
+        if len(starts) == 0:
+            return summary
+
+        max_i = np.maximum.reduceat(self.i, starts)
+
+        # Rows of peaks at their spectrum's maximum intensity, then the first of each spectrum
+        max_rows = np.flatnonzero(self.i == np.repeat(max_i, peak_counts[has_peaks]))
+        max_spectra = np.repeat(np.arange(len(self)), peak_counts)[max_rows]
+        first_max = np.ones(len(max_rows), dtype=bool)
+        first_max[1:] = max_spectra[1:] != max_spectra[:-1]
+
+        summary['base_peak_mz'][max_spectra[first_max]] = self.mz[max_rows[first_max]]
+        summary['base_peak_i'][has_peaks] = max_i
+        summary['mz_min'][has_peaks] = np.minimum.reduceat(self.mz, starts)
+        summary['mz_max'][has_peaks] = np.maximum.reduceat(self.mz, starts)
+
+        return summary
+
+    def position(self, spec_id) -> int:
+        """Get the storage position of a spectrum.
+
+        Raises:
+            KeyError: If the spectrum ID is not in the store.
+        """
+
+        if self._positions is None:
+            self._positions = {spec_id: n for n, spec_id in enumerate(self.spec_ids.tolist())}
+
+        return self._positions[spec_id]
+
+    def spectrum(self, spec_id) -> Tuple[np.ndarray, np.ndarray]:
+        """Get views of the m/z and intensity values of a single spectrum's peaks.
+
+        Args:
+            spec_id: The ID of the spectrum.
+
+        Returns:
+            A tuple of m/z and intensity arrays.
+
+        Raises:
+            KeyError: If the spectrum ID is not in the store.
+        """
+
+        n = self.position(spec_id)
+        start, stop = self.offsets[n], self.offsets[n + 1]
+
+        return self.mz[start:stop], self.i[start:stop]
+
+    def to_df(self, rt: np.ndarray) -> DF:
+        """Converts the store into a peaks dataframe, structured as `MSfile.peaks`.
+
+        Args:
+            rt: The retention time of each spectrum, in the order spectra are stored.
+
+        Returns:
+            A dataframe of all peaks.
+        """
+
+        peak_counts = self.peak_counts
+
+        # Peak numbers restart from 0 for each spectrum
+        peak_numbers = np.arange(self.peak_count, dtype=np.int64) - np.repeat(self.offsets[:-1], peak_counts)
+
+        peak_index = pd.MultiIndex.from_arrays([np.repeat(pd.Index(self.spec_ids), peak_counts), peak_numbers],
+                                               names=['spec_id', 'peak_number'])
+
+        return pd.DataFrame({'rt': np.repeat(np.asarray(rt), peak_counts),
+                             'mz': self.mz,
+                             'i': self.i},
+                            index=peak_index)
+
+
+class SpectrumBatch(NamedTuple):
+    """A batch of consecutive spectra from a MS file, held as NumPy arrays.
+
+    Peaks of the spectrum at position n are ``mz[offsets[n]:offsets[n + 1]]`` and ``i[offsets[n]:offsets[n + 1]]``.
+    """
+
+    ids: np.ndarray
+    """The spectrum IDs."""
+
+    rt: np.ndarray
+    """The retention time of each spectrum."""
+
+    ms_lvl: np.ndarray
+    """The MS level of each spectrum."""
+
+    offsets: np.ndarray
+    """Start positions of each spectrum's peaks in `mz` and `i`, followed by the batch peak count."""
+
+    mz: np.ndarray
+    """The m/z values of all peaks in the batch."""
+
+    i: np.ndarray
+    """The intensity values of all peaks in the batch."""
+
+
+class SpectraBuffer:
+    """Accumulates the values of spectra read from a MS file into NumPy buffers.
+
+    Used to build the spectra dataframe and `PeakStore` of a MS file, or `SpectrumBatch` instances,
+    from the same per spectrum values.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """Initializes an instance of SpectraBuffer class.
+
+        Args:
+            capacity: The number of spectra to initially allocate.
+        """
+
+        self._spec_ids = []
+        self._filters = []
+        self._rt = miscUtils.ArrayBuffer(np.float64, capacity)
+        self._peak_counts = miscUtils.ArrayBuffer(np.int64, capacity)
+        self._tic = miscUtils.ArrayBuffer(np.float64, capacity)
+        self._ms_lvl = miscUtils.ArrayBuffer(np.int64, capacity)
+        self._precursor_mz = miscUtils.ArrayBuffer(np.float64, capacity)
+        self._precursor_charge = miscUtils.ArrayBuffer(np.int64, capacity)
+        self._isolation_mz_min = miscUtils.ArrayBuffer(np.float64, capacity)
+        self._isolation_mz_max = miscUtils.ArrayBuffer(np.float64, capacity)
+        self._mz = miscUtils.ArrayBuffer()
+        self._i = miscUtils.ArrayBuffer()
+
+    def __len__(self):
+        return len(self._spec_ids)
+
+    def add(self, spec_id, rt, tic, ms_lvl, spec_filter, precursor, mz_values, i_values):
+        """Adds the values of a single spectrum.
+
+        The precursor values are as returned by `.mzmlReader.precursor_values`.
+        """
+
+        precursor_mz, precursor_charge, isolation_mz_min, isolation_mz_max = precursor
+
+        self._spec_ids.append(spec_id)
+        self._filters.append(spec_filter)
+        self._rt.append(rt)
+        self._peak_counts.append(len(mz_values))
+        self._tic.append(np.nan if tic is None else tic)
+        self._ms_lvl.append(ms_lvl)
+        self._precursor_mz.append(precursor_mz)
+        self._precursor_charge.append(precursor_charge)
+        self._isolation_mz_min.append(isolation_mz_min)
+        self._isolation_mz_max.append(isolation_mz_max)
+
+        # Empty arrays are skipped so their default dtype does not upcast the buffers
+        if len(mz_values) > 0:
+            self._mz.extend(mz_values)
+            self._i.extend(i_values)
+
+    def _peak_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the peak counts, m/z values (rounded to 5 decimals), and intensity values."""
+
+        mz_values = self._mz.to_array()
+        np.round(mz_values, 5, out=mz_values)
+
+        return self._peak_counts.to_array(), mz_values, self._i.to_array()
+
+    def spectra_df(self, peak_store: Optional['PeakStore'] = None) -> DF:
+        """Creates a spectra dataframe, structured as `MSfile.spectra`.
+
+        Args:
+            peak_store: The peak store of the spectra (see `peak_store`),
+                from which the base peak and m/z range of each spectrum are added.
+        """
+
+        spectra_values = {'rt': self._rt.to_array(),
+                          'peak_count': self._peak_counts.to_array(),
+                          'tic': self._tic.to_array(),
+                          'ms_lvl': self._ms_lvl.to_array(),
+                          'filters': self._filters,
+                          'precursor_mz': self._precursor_mz.to_array(),
+                          'precursor_charge': self._precursor_charge.to_array(),
+                          'isolation_mz_min': self._isolation_mz_min.to_array(),
+                          'isolation_mz_max': self._isolation_mz_max.to_array()}
+
+        if peak_store is not None:
+            spectra_values.update(peak_store.spectrum_summary())
+
+        return pd.DataFrame(spectra_values, index=pd.Index(self._spec_ids))
+
+    def peak_store(self) -> PeakStore:
+        """Creates a `PeakStore` of all peaks."""
+
+        peak_counts, mz_values, i_values = self._peak_arrays()
+
+        return PeakStore.from_peak_counts(np.asarray(self._spec_ids), peak_counts, mz_values, i_values)
+
+    def batch(self) -> SpectrumBatch:
+        """Creates a `SpectrumBatch` of all spectra."""
+
+        peak_counts, mz_values, i_values = self._peak_arrays()
+
+        offsets = np.zeros(len(peak_counts) + 1, dtype=np.int64)
+        np.cumsum(peak_counts, out=offsets[1:])
+
+        return SpectrumBatch(ids=np.asarray(self._spec_ids),
+                             rt=self._rt.to_array(),
+                             ms_lvl=self._ms_lvl.to_array(),
+                             offsets=offsets,
+                             mz=mz_values,
+                             i=i_values)
+
+
+class SpectrumFilter(NamedTuple):
+    """Filters applied to spectra and peaks as MS data is read.
+
+    Spectra are rejected by MS level and retention time, before their peaks are decoded.
+    Peaks of accepted spectra are rejected by m/z and intensity.
+    Ranges are inclusive, and a filter value of ``None`` accepts all values.
+    """
+
+    ms_lvl: Union[int, Collection[int], None] = None
+    """The MS level(s) of spectra to accept."""
+
+    rt_range: Optional[Tuple[float, float]] = None
+    """The (min, max) retention time in minutes of spectra to accept."""
+
+    mz_range: Optional[Tuple[float, float]] = None
+    """The (min, max) m/z of peaks to accept."""
+
+    min_i: Optional[float] = None
+    """The minimum intensity of peaks to accept."""
+
+    @property
+    def filters_peaks(self) -> bool:
+        """Get a boolean indicating if any peak filters are set."""
+
+        return self.mz_range is not None or self.min_i is not None
+
+    def _ms_lvls(self) -> np.ndarray:
+        """Get the accepted MS levels as an array."""
+
+        return np.atleast_1d(np.asarray(self.ms_lvl))
+
+    def accepts(self, ms_lvl, rt) -> bool:
+        """Tests if a spectrum with the given MS level and retention time is accepted."""
+
+        if self.ms_lvl is not None and ms_lvl not in self._ms_lvls():
+            return False
+
+        if self.rt_range is not None and not (self.rt_range[0] <= rt <= self.rt_range[1]):
+            return False
+
+        return True
+
+    def accepts_range(self, ms_lvls: Collection[int], rt_min: float, rt_max: float) -> bool:
+        """Tests if any spectrum in a group, with the given MS levels and retention time range, may be accepted."""
+
+        if self.ms_lvl is not None and not np.isin(ms_lvls, self._ms_lvls()).any():
+            return False
+
+        if self.rt_range is not None and (rt_max < self.rt_range[0] or rt_min > self.rt_range[1]):
+            return False
+
+        return True
+
+    def spectrum_mask(self, ms_lvl: np.ndarray, rt: np.ndarray) -> np.ndarray:
+        """Get a boolean mask of the accepted spectra, given arrays of their MS levels and retention times."""
+
+        mask = np.ones(len(rt), dtype=bool)
+
+        if self.ms_lvl is not None:
+            mask &= np.isin(ms_lvl, self._ms_lvls())
+
+        if self.rt_range is not None:
+            mask &= (rt >= self.rt_range[0]) & (rt <= self.rt_range[1])
+
+        return mask
+
+    def peak_mask(self, mz_values: np.ndarray, i_values: np.ndarray) -> np.ndarray:
+        """Get a boolean mask of the accepted peaks, given arrays of their m/z and intensity values."""
+
+        mask = np.ones(len(mz_values), dtype=bool)
+
+        if self.mz_range is not None:
+            mask &= (mz_values >= self.mz_range[0]) & (mz_values <= self.mz_range[1])
+
+        if self.min_i is not None:
+            mask &= i_values >= self.min_i
+
+        return mask
+
+
+class XICindex:
+    """An m/z-sorted index of the peaks of all MS1 spectra in an MS file, for extracting ion chromatograms (XICs).
+
+    Each peak is stored with the position of its spectrum (among MS1 spectra),
+    so the peaks of any m/z window are found by binary search, rather than by scanning all peaks.
+    The index is built once, by sorting all MS1 peaks, after which each extraction costs
+    two binary searches per target ion, plus the number of peaks extracted.
+    """
+
+    tolerance_units: ClassVar[Tuple[str, ...]] = ('ppm', 'Da')
+    """The units of m/z tolerance."""
+
+    rt: np.ndarray
+    """The retention time of each MS1 spectrum, in the order spectra are stored."""
+
+    spec_ids: np.ndarray
+    """The ID of each MS1 spectrum, in the order spectra are stored."""
+
+    mz: np.ndarray
+    """The m/z values of all MS1 peaks, sorted."""
+
+    i: np.ndarray
+    """The intensity values of all MS1 peaks, in m/z order."""
+
+    spectrum_positions: np.ndarray
+    """The position (in `rt` and `spec_ids`) of the spectrum of each peak, in m/z order."""
+
+    def __init__(self,
+                 peak_store: PeakStore,
+                 rt: np.ndarray,
+                 ms_lvl: np.ndarray):
+        """Initializes an instance of XICindex class, sorting the MS1 peaks of a peak store.
+
+        Args:
+            peak_store: The peaks of all spectra.
+            rt: The retention time of each spectrum, in the order spectra are stored.
+            ms_lvl: The MS level of each spectrum, in the order spectra are stored.
+        """
+
+        ms1_positions = np.flatnonzero(ms_lvl == 1)
+        peak_counts = peak_store.peak_counts[ms1_positions]
+
+        self.rt = np.asarray(rt)[ms1_positions]
+        self.spec_ids = peak_store.spec_ids[ms1_positions]
+
+        # Rows of MS1 peaks in the peak store, and the position of their spectrum among MS1 spectra
+        peak_rows = _ranges_rows(peak_store.offsets[ms1_positions], peak_counts)
+        spectrum_positions = np.repeat(np.arange(len(ms1_positions), dtype=np.int32), peak_counts)
+
+        mz = peak_store.mz[peak_rows]
+        order = np.argsort(mz, kind='stable')
+
+        self.mz = mz[order]
+        self.i = peak_store.i[peak_rows][order]
+        self.spectrum_positions = spectrum_positions[order]
+
+    def __repr__(self):
+        return f"XICindex({len(self.rt)} spectra, {len(self.mz)} peaks)"
+
+    @property
+    def nbytes(self) -> int:
+        """Get the memory size of the index arrays in bytes."""
+
+        return sum(array.nbytes for array in (self.rt, self.spec_ids, self.mz, self.i, self.spectrum_positions))
+
+    @classmethod
+    def mz_windows(cls,
+                   mz,
+                   tolerance=10.0,
+                   tolerance_unit: str = 'ppm') -> Tuple[np.ndarray, np.ndarray]:
+        """Get the m/z windows of target ions.
+
+        Args:
+            mz: The m/z value of each target ion.
+            tolerance: The m/z tolerance of each target ion (or of all), on either side of its m/z.
+            tolerance_unit: (`ppm`, `Da`) The unit of `tolerance`.
+
+        Returns:
+            A tuple of arrays of the minimum and maximum m/z of each window.
+
+        Raises:
+            MSdataError: For an invalid tolerance unit.
+        """
+
+        if tolerance_unit not in cls.tolerance_units:
+            raise MSdataError(f"Invalid m/z tolerance unit: {tolerance_unit}")
+
+        mz = np.atleast_1d(np.asarray(mz, dtype=np.float64))
+        mz_delta = np.asarray(tolerance, dtype=np.float64)
+
+        if tolerance_unit == 'ppm':
+            mz_delta = mz * mz_delta * 0.000001
+
+        return mz - mz_delta, mz + mz_delta
+
+    def extract(self,
+                mz,
+                tolerance=10.0,
+                tolerance_unit: str = 'ppm',
+                rt_range=None,
+                agg: str = 'sum') -> np.ndarray:
+        """Extracts the ion chromatograms of target ions.
+
+        Args:
+            mz: The m/z value of each target ion (or of a single target ion).
+            tolerance: The m/z tolerance of each target ion (or of all), on either side of its m/z.
+            tolerance_unit: (`ppm`, `Da`) The unit of `tolerance`.
+            rt_range: An optional retention time range (min, max) of all target ions,
+                or an array of the ranges of each target ion (shape: targets x 2), outside of which intensity is 0.
+            agg: (`sum`, `max`) How intensities of peaks in a target's m/z window are combined within each spectrum.
+
+        Returns:
+            An array of intensities (shape: targets x MS1 spectra), in the order of `rt`.
+
+        Raises:
+            MSdataError: For an invalid tolerance unit or aggregation.
+        """
+
+        if agg not in ('sum', 'max'):
+            raise MSdataError(f"Invalid XIC aggregation: {agg}")
+
+        mz_min, mz_max = self.mz_windows(mz, tolerance, tolerance_unit)
+        target_count, spectrum_count = len(mz_min), len(self.rt)
+
+        starts = np.searchsorted(self.mz, mz_min, side='left')
+        peak_counts = np.maximum(np.searchsorted(self.mz, mz_max, side='right') - starts, 0)
+
+        targets = np.repeat(np.arange(target_count), peak_counts)
+        peak_rows = _ranges_rows(starts, peak_counts)
+        spectrum_positions = self.spectrum_positions[peak_rows]
+
+        if rt_range is not None:
+            rt_range = np.broadcast_to(np.asarray(rt_range, dtype=np.float64), (target_count, 2))
+            peak_rt = self.rt[spectrum_positions]
+
+            in_range = (peak_rt >= rt_range[targets, 0]) & (peak_rt <= rt_range[targets, 1])
+            targets, peak_rows, spectrum_positions = targets[in_range], peak_rows[in_range], spectrum_positions[in_range]
+
+        cells = targets * spectrum_count + spectrum_positions
+
+        if agg == 'sum':
+            intensities = np.bincount(cells, weights=self.i[peak_rows], minlength=target_count * spectrum_count)
+        else:
+            intensities = np.zeros(target_count * spectrum_count)
+            np.maximum.at(intensities, cells, self.i[peak_rows])
+
+        return intensities.reshape(target_count, spectrum_count)
+
+
+class PrecursorIndex:
+    """A precursor m/z-sorted index of the MSn spectra in an MS file, for finding the spectra of precursor ions.
+
+    Only spectra with a recorded precursor m/z (MS level 2 or more) are indexed.
+    The spectra of a precursor m/z window are found by binary search, rather than by scanning all spectra,
+    so finding the MS2 spectra of many precursors costs two binary searches per precursor, plus the spectra found.
+    """
+
+    precursor_mz: np.ndarray
+    """The precursor m/z values of all indexed spectra, sorted."""
+
+    rt: np.ndarray
+    """The retention time of each indexed spectrum, in precursor m/z order."""
+
+    spectrum_positions: np.ndarray
+    """The position of each indexed spectrum in the spectra dataframe, in precursor m/z order."""
+
+    def __init__(self,
+                 precursor_mz: np.ndarray,
+                 rt: np.ndarray,
+                 ms_lvl: np.ndarray):
+        """Initializes an instance of PrecursorIndex class, sorting spectra by precursor m/z.
+
+        Args:
+            precursor_mz: The precursor m/z of each spectrum (NaN if none), in the order spectra are stored.
+            rt: The retention time of each spectrum, in the order spectra are stored.
+            ms_lvl: The MS level of each spectrum, in the order spectra are stored.
+        """
+
+        precursor_mz = np.asarray(precursor_mz, dtype=np.float64)
+
+        positions = np.flatnonzero((np.asarray(ms_lvl) > 1) & ~np.isnan(precursor_mz))
+        order = np.argsort(precursor_mz[positions], kind='stable')
+
+        self.spectrum_positions = positions[order]
+        self.precursor_mz = precursor_mz[self.spectrum_positions]
+        self.rt = np.asarray(rt, dtype=np.float64)[self.spectrum_positions]
+
+    def __repr__(self):
+        return f"PrecursorIndex({len(self.precursor_mz)} spectra)"
+
+    def __len__(self):
+        return len(self.precursor_mz)
+
+    @property
+    def nbytes(self) -> int:
+        """Get the memory size of the index arrays in bytes."""
+
+        return sum(array.nbytes for array in (self.precursor_mz, self.rt, self.spectrum_positions))
+
+    def search(self,
+               mz,
+               tolerance=10.0,
+               tolerance_unit: str = 'ppm',
+               rt_range=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the spectra of precursor ions.
+
+        Args:
+            mz: The m/z value of each precursor ion (or of a single precursor ion).
+            tolerance: The m/z tolerance of each precursor ion (or of all), on either side of its m/z.
+            tolerance_unit: (`ppm`, `Da`) The unit of `tolerance`.
+            rt_range: An optional retention time range (min, max) of all precursor ions,
+                or an array of the ranges of each precursor ion (shape: precursors x 2).
+
+        Returns:
+            A tuple of arrays of the precursor ion number (in the order of `mz`) and spectrum position
+            (in the spectra dataframe) of each spectrum found, ordered by precursor ion then spectrum position.
+
+        Raises:
+            MSdataError: For an invalid tolerance unit.
+        """
+
+        mz_min, mz_max = XICindex.mz_windows(mz, tolerance, tolerance_unit)
+
+        starts = np.searchsorted(self.precursor_mz, mz_min, side='left')
+        counts = np.maximum(np.searchsorted(self.precursor_mz, mz_max, side='right') - starts, 0)
+
+        precursors = np.repeat(np.arange(len(mz_min)), counts)
+        rows = _ranges_rows(starts, counts)
+
+        if rt_range is not None:
+            rt_range = np.broadcast_to(np.asarray(rt_range, dtype=np.float64), (len(mz_min), 2))
+            rt = self.rt[rows]
+
+            in_range = (rt >= rt_range[precursors, 0]) & (rt <= rt_range[precursors, 1])
+            precursors, rows = precursors[in_range], rows[in_range]
+
+        spectrum_positions = self.spectrum_positions[rows]
+        order = np.lexsort((spectrum_positions, precursors))
+
+        return precursors[order], spectrum_positions[order]
+
+
+def _ranges_rows(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Get the rows of consecutive ranges, each given by its start row and row count, concatenated."""
+
+    range_starts = np.cumsum(counts) - counts
+
+    return np.arange(counts.sum(), dtype=np.int64) + np.repeat(starts - range_starts, counts)
+
+
+def _is_memory_mapped(array: np.ndarray) -> bool:
+    """Tests if an array (or the array it is a view of) is memory-mapped."""
+
+    while isinstance(array, np.ndarray):
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+
+    return isinstance(array, mmap.mmap)
+
+
 class MSfile:
     """Interface class for accessing data from a MS file stored in various file types.
 
-    Subclass implementations provide support for the various file types
-    and override the init method to set values.
-    The `peaks` and `spectra` properties hold data structured in dataframes.
-    """
+    Subclass implementations provide support for the various file types
+    and override the init method to set values.
+    The `peaks` and `spectra` properties hold data structured in dataframes.
+    Subclasses may instead hold peaks in a compact `PeakStore`,
+    from which the `peaks` dataframe is created when first accessed.
+    """
+
+    _run_id: str
+    _run_date: str
+    _ms_file_version: str
+
+    _spectrum_count: int
+    _peak_count: int
+    _tic_sum: float
+
+    _peaks: DF
+    _spectra: DF
+
+    _peak_store: PeakStore = None
+    _spectrum_filter: SpectrumFilter = None
+    _xic_index: XICindex = None
+    _precursor_index: PrecursorIndex = None
+
+    def __init__(self):
+        """Initializes an instance of MSfile class.
+
+        No need to call this superclass initialization,
+        as subclasses provide values for all attributes initialized here.
+        """
+
+        self._run_id = None
+        self._run_date = None
+        self._ms_file_version = None
+
+        self._spectrum_count = None
+        self._peak_count = None
+        self._tic_sum = None
+
+        self._peaks = pd.DataFrame()
+        self._spectra = pd.DataFrame()
+
+        self._peak_store = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # A peaks dataframe created from a peak store is not saved, as it can be recreated
+        if self._peak_store is not None:
+            state['_peaks'] = None
+
+        # XIC and precursor indexes are rebuilt when needed
+        state['_xic_index'] = None
+        state['_precursor_index'] = None
+
+        return state
+
+    @property
+    def run_id(self):
+        """Get the sample's run ID as specified from its MS data file."""
+
+        return self._run_id
+
+    @property
+    def run_date(self):
+        """Get the date the sample was run as specified from its MS data file."""
+
+        return self._run_date
+
+    @property
+    def ms_file_version(self):
+        """Get the data format version in which the sample was originally saved as specified from its ms file.
+
+        Note: Currently, this is equivalent to mzML version number.
+        """
+
+        return self._ms_file_version
+
+    @property
+    def source_file_type(self) -> str:
+        """Get the type of MS file (such as `MZMLfile`) the MS data was read from, before any conversion."""
+
+        return self.__class__.__name__
+
+    @property
+    def spectrum_count(self):
+        """Get the number of MS spectra from a sample run.
+
+        This value is calculated from the number of spectra imported, rather than from MS file metadata.
+        """
+
+        return self._spectrum_count
+
+    @property
+    def peak_count(self):
+        """Get the total number of MS peaks from all MS spectra in sample run."""
+
+        return self._peak_count
+
+    @property
+    def tic_sum(self):
+        """
+        Get the total ion current sum of all spectra in sample run
+        """
+
+        return self._tic_sum
+
+    @property
+    def spectrum_filter(self):
+        """Get the `SpectrumFilter` applied to the MS data, if any."""
+
+        return self._spectrum_filter
+
+    @property
+    def peaks(self):
+        """Get a dataframe of all peaks in a MS file.
+
+        Dataframe structure
+            | **First Index Level:**  spec_id
+            | **Second Index Level:**  peak_number
+            | **Columns:**  rt,  mz,  i
+
+        For MS files with a `peak_store`, this dataframe is created on first access.
+        """
+
+        if self._peaks is None:
+            self._peaks = self.peak_store.to_df(self._spectra['rt'].to_numpy())
+
+        return self._peaks
+
+    @property
+    def peak_store(self):
+        """Get the compact store of all peaks in a MS file, if available.
+
+        See `PeakStore` for details.
+        """
+
+        if self._peak_store is None and self._peaks is None:
+            self._load_peak_store()
+
+        return self._peak_store
+
+    @property
+    def spectra(self):
+        """Get a dataframe of all spectra in an MS file.
+
+        Dataframe structure
+            | **Index:**  spec_id
+            | **Columns:**  rt,  peak_count,  tic,  ms_lvl,  filters,
+              precursor_mz,  precursor_charge,  isolation_mz_min,  isolation_mz_max,
+              base_peak_mz,  base_peak_i,  mz_min,  mz_max
+
+        Precursor columns are NaN (and a charge of 0) for spectra without a precursor, such as MS1 spectra.
+        Base peak and m/z range columns are computed from the peaks of each spectrum as they are read.
+        Both may be missing from MS data saved by earlier versions.
+        """
+
+        return self._spectra
+
+    def tic_chromatogram(self, ms_lvl: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the total ion current (TIC) chromatogram, from the TIC of each spectrum, without accessing peaks.
+
+        Args:
+            ms_lvl: An optional MS level of the spectra included, defaults to all spectra.
+
+        Returns:
+            A tuple of the retention time and TIC of each spectrum.
+        """
+
+        spectra = self._spectra if ms_lvl is None else self._spectra[self._spectra['ms_lvl'] == ms_lvl]
+
+        return spectra['rt'].to_numpy(), spectra['tic'].to_numpy()
+
+    def base_peak_chromatogram(self, ms_lvl: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the base peak chromatogram (BPC), from the base peak of each spectrum.
+
+        Peaks are only accessed for MS data without base peak columns (such as saved by earlier versions),
+        and for the spectra included whose base peak is not recorded (NaN, such as in a lazy `MZMLfile`).
+        These base peaks are computed from the peaks of each spectrum, and recorded in `spectra`.
+
+        Args:
+            ms_lvl: An optional MS level of the spectra included, defaults to all spectra.
+
+        Returns:
+            A tuple of the retention time, base peak m/z, and base peak intensity of each spectrum.
+        """
+
+        spectrum_mask = np.ones(len(self._spectra), dtype=bool) if ms_lvl is None \
+            else self._spectra['ms_lvl'].to_numpy() == ms_lvl
+
+        if 'base_peak_i' in self._spectra:
+            unrecorded = spectrum_mask & self._spectra['base_peak_i'].isna().to_numpy() \
+                & (self._spectra['peak_count'].to_numpy() > 0)
+
+            if unrecorded.any():
+                self._record_base_peaks(self._spectra.index[unrecorded])
+
+            base_peak_mz = self._spectra['base_peak_mz'].to_numpy()
+            base_peak_i = self._spectra['base_peak_i'].to_numpy()
+        else:
+            peak_store = self.peak_store
+            if peak_store is None:
+                peak_store = PeakStore.from_df(self._peaks, self._spectra.index)
+
+            summary = peak_store.spectrum_summary()
+            base_peak_mz, base_peak_i = summary['base_peak_mz'], summary['base_peak_i']
+
+        return self._spectra['rt'].to_numpy()[spectrum_mask], base_peak_mz[spectrum_mask], base_peak_i[spectrum_mask]
+
+    def _record_base_peaks(self, spec_ids):
+        """Computes the base peak of each spectrum given from its peaks, recording it in `spectra`.
+
+        The base peak is the first peak of a spectrum with its maximum intensity, as in `PeakStore.spectrum_summary`.
+        """
+
+        base_peaks = np.empty((len(spec_ids), 2))
+
+        for n, spec_id in enumerate(spec_ids):
+            mz_values, i_values = self._spectrum_arrays(spec_id)
+            max_position = np.argmax(i_values)
+            base_peaks[n] = mz_values[max_position], i_values[max_position]
+
+        self._spectra.loc[spec_ids, ['base_peak_mz', 'base_peak_i']] = base_peaks
+
+    def memory_mb(self) -> float:
+        """Measures the memory size of the MS data in MBs.
+
+        The spectra and peaks dataframes, and the arrays of the peak store, XIC index, and precursor index are measured.
+        Memory-mapped arrays (such as from a msAIr file) are not counted,
+        as they are backed by their file rather than held in memory.
+
+        Returns:
+            The memory size of the MS data in MBs.
+        """
+
+        data_bytes = 0
+
+        for df in (self._spectra, self._peaks):
+            if df is not None:
+                data_bytes += df.memory_usage(index=True, deep=True).sum()
+
+        if self._peak_store is not None:
+            for array in (self._peak_store.spec_ids, self._peak_store.offsets, self._peak_store.mz, self._peak_store.i):
+                if not _is_memory_mapped(array):
+                    data_bytes += array.nbytes
+
+        if self._xic_index is not None:
+            data_bytes += self._xic_index.nbytes
+
+        if self._precursor_index is not None:
+            data_bytes += self._precursor_index.nbytes
+
+        return data_bytes * 0.000001
+
+    def _set_summary_values(self):
+        """Sets the spectrum count, TIC sum, and peak count from the spectra dataframe."""
+
+        self._spectrum_count = self._spectra.index.size
+        self._tic_sum = self._spectra['tic'].sum()                   # Total ion current sum of all spectra
+        self._peak_count = int(self._spectra['peak_count'].sum())    # Total number of MS peaks from all spectra
+
+    def apply_filter(self, spectrum_filter: SpectrumFilter):
+        """Removes the spectra and peaks rejected by a filter from the MS data.
+
+        This applies the same filtering to MS data already in memory (such as from a msAIr file),
+        as is applied to mzML files as they are read.
+
+        Args:
+            spectrum_filter: The filter to apply.
+        """
+
+        peak_store = self.peak_store
+        if peak_store is None:
+            peak_store = PeakStore.from_df(self._peaks, self._spectra.index)
+
+        spectrum_mask = spectrum_filter.spectrum_mask(self._spectra['ms_lvl'].to_numpy(),
+                                                      self._spectra['rt'].to_numpy())
+
+        # Position of the spectrum each peak belongs to
+        peak_positions = np.repeat(np.arange(len(peak_store)), peak_store.peak_counts)
+
+        peak_mask = spectrum_mask[peak_positions]
+        if spectrum_filter.filters_peaks:
+            peak_mask &= spectrum_filter.peak_mask(peak_store.mz, peak_store.i)
+
+        peak_counts = np.bincount(peak_positions[peak_mask], minlength=len(peak_store))[spectrum_mask]
+
+        self._peak_store = PeakStore.from_peak_counts(peak_store.spec_ids[spectrum_mask], peak_counts,
+                                                      peak_store.mz[peak_mask], peak_store.i[peak_mask])
+        self._peaks = None
+
+        self._spectra = self._spectra[spectrum_mask].copy()
+        self._spectra['peak_count'] = peak_counts
+
+        if spectrum_filter.filters_peaks and 'base_peak_i' in self._spectra:
+            self._spectra = self._spectra.assign(**self._peak_store.spectrum_summary())
+
+        self._spectrum_filter = spectrum_filter
+        self._xic_index = None
+        self._precursor_index = None
+        self._set_summary_values()
+
+    @property
+    def xic_index(self) -> XICindex:
+        """Get the m/z-sorted index of all MS1 peaks, built on first access.
+
+        See `XICindex` for details.
+        """
+
+        if self._xic_index is None:
+            peak_store = self.peak_store
+            if peak_store is None:
+                peak_store = PeakStore.from_df(self._peaks, self._spectra.index)
+
+            self._xic_index = XICindex(peak_store, self._spectra['rt'].to_numpy(), self._spectra['ms_lvl'].to_numpy())
+
+        return self._xic_index
+
+    def xic(self,
+            mz: float,
+            tolerance: float = 10.0,
+            tolerance_unit: str = 'ppm',
+            rt_range: Optional[Tuple[float, float]] = None,
+            agg: str = 'sum') -> Tuple[np.ndarray, np.ndarray]:
+        """Extracts the ion chromatogram (XIC) of a target ion from all MS1 spectra.
+
+        Peaks are found through the `xic_index`, so many XICs can be extracted without scanning all peaks.
+
+        Args:
+            mz: The m/z value of the target ion.
+            tolerance: The m/z tolerance, on either side of `mz`.
+            tolerance_unit: (`ppm`, `Da`) The unit of `tolerance`.
+            rt_range: An optional retention time range (min, max), outside of which intensity is 0.
+            agg: (`sum`, `max`) How intensities of peaks in the m/z window are combined within each spectrum.
+
+        Returns:
+            A tuple of the retention time and intensity of each MS1 spectrum.
+        """
+
+        xic_index = self.xic_index
+
+        return xic_index.rt, xic_index.extract(mz, tolerance, tolerance_unit, rt_range, agg)[0]
+
+    def xics(self,
+             mz,
+             tolerance=10.0,
+             tolerance_unit: str = 'ppm',
+             rt_range=None,
+             agg: str = 'sum') -> Tuple[np.ndarray, np.ndarray]:
+        """Extracts the ion chromatograms (XICs) of many target ions from all MS1 spectra.
+
+        Args:
+            mz: The m/z value of each target ion.
+            tolerance: The m/z tolerance of each target ion (or of all), on either side of its m/z.
+            tolerance_unit: (`ppm`, `Da`) The unit of `tolerance`.
+            rt_range: An optional retention time range (min, max) of all target ions,
+                or an array of the ranges of each target ion (shape: targets x 2), outside of which intensity is 0.
+            agg: (`sum`, `max`) How intensities of peaks in a target's m/z window are combined within each spectrum.
+
+        Returns:
+            A tuple of the retention time of each MS1 spectrum,
+            and an array of intensities (shape: targets x MS1 spectra).
+        """
+
+        xic_index = self.xic_index
+
+        return xic_index.rt, xic_index.extract(mz, tolerance, tolerance_unit, rt_range, agg)
+
+    @property
+    def precursor_index(self) -> PrecursorIndex:
+        """Get the precursor m/z-sorted index of all MSn spectra, built on first access.
+
+        See `PrecursorIndex` for details.
+
+        Raises:
+            MSdataError: For MS data without precursor values (such as saved by earlier versions).
+        """
+
+        if self._precursor_index is None:
+            if 'precursor_mz' not in self._spectra:
+                raise MSdataError(f"MS data of {self.run_id} has no precursor values, it must be imported again")
+
+            self._precursor_index = PrecursorIndex(self._spectra['precursor_mz'].to_numpy(),
+                                                   self._spectra['rt'].to_numpy(),
+                                                   self._spectra['ms_lvl'].to_numpy())
+
+        return self._precursor_index
+
+    def precursor_spectra(self,
+                          mz: float,
+                          tolerance: float = 10.0,
+                          tolerance_unit: str = 'ppm',
+                          rt_range: Optional[Tuple[float, float]] = None) -> DF:
+        """Get the MSn spectra of a precursor ion.
+
+        Spectra are found through the `precursor_index`, without scanning all spectra.
+
+        Args:
+            mz: The m/z value of the precursor ion.
+            tolerance: The m/z tolerance, on either side of `mz`.
+            tolerance_unit: (`ppm`, `Da`) The unit of `tolerance`.
+            rt_range: An optional retention time range (min, max) of the spectra.
+
+        Returns:
+            A dataframe of the spectra found, structured as `spectra`.
+        """
+
+        _, spectrum_positions = self.precursor_index.search(mz, tolerance, tolerance_unit, rt_range)
+
+        return self._spectra.iloc[spectrum_positions]
+
+    def match_precursors(self,
+                         mz,
+                         tolerance=10.0,
+                         tolerance_unit: str = 'ppm',
+                         rt_range=None) -> DF:
+        """Get the MSn spectra of many precursor ions.
+
+        Args:
+            mz: The m/z value of each precursor ion.
+            tolerance: The m/z tolerance of each precursor ion (or of all), on either side of its m/z.
+            tolerance_unit: (`ppm`, `Da`) The unit of `tolerance`.
+            rt_range: An optional retention time range (min, max) of all precursor ions,
+                or an array of the ranges of each precursor ion (shape: precursors x 2).
+
+        Returns:
+            A dataframe of the spectra found, structured as `spectra`, with a column of the precursor ion number
+            (in the order of `mz`) matched by each spectrum. A spectrum matched by several precursor ions is repeated.
+        """
+
+        precursors, spectrum_positions = self.precursor_index.search(mz, tolerance, tolerance_unit, rt_range)
+
+        return self._spectra.iloc[spectrum_positions].assign(precursor=precursors)
+
+    def spectrum_peaks(self, spec_id) -> DF:
+        """Get a dataframe of the peaks in a single spectrum.
+
+        This is equivalent to ``peaks.loc[spec_id]``, but does not require the `peaks` dataframe to be created.
+
+        Args:
+            spec_id: The ID of the spectrum.
+
+        Returns:
+            A dataframe with an index of peak_number and columns of rt, mz, i.
+        """
+
+        mz_values, i_values = self._spectrum_arrays(spec_id)
+        peak_index = pd.RangeIndex(len(mz_values), name='peak_number')
+
+        return pd.DataFrame({'rt': self._spectra.at[spec_id, 'rt'],
+                             'mz': mz_values,
+                             'i': i_values},
+                            index=peak_index)
+
+    def _spectrum_arrays(self, spec_id) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the m/z and intensity arrays of a single spectrum.
+
+        Subclasses reading peaks on demand override this method.
+        """
+
+        if self._peak_store is not None:
+            return self._peak_store.spectrum(spec_id)
+
+        spectrum_peaks = self._peaks.loc[spec_id]
+        return spectrum_peaks['mz'].to_numpy(), spectrum_peaks['i'].to_numpy()
+
+    def _load_peak_store(self):
+        """Loads all peaks into the peak store.
+
+        Subclasses reading peaks on demand override this method.
+        """
+
+        raise MSdataError(f"Peaks not available from {self.__class__.__name__}")
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[SpectrumBatch]:
+        """Iterates over all spectra in fixed size batches of NumPy arrays.
+
+        Peak arrays of each batch are views of the `peak_store`, so no peak data is copied.
+        Subclasses able to read spectra incrementally override this method to stream them from file.
+
+        Args:
+            batch_size: The number of spectra in each batch (the last batch may be smaller).
+
+        Yields:
+            A `SpectrumBatch` for each group of consecutive spectra.
+        """
+
+        peak_store = self.peak_store
+        if peak_store is None:
+            peak_store = PeakStore.from_df(self._peaks, self._spectra.index)
+
+        rt = self._spectra['rt'].to_numpy()
+        ms_lvl = self._spectra['ms_lvl'].to_numpy()
+
+        for start in range(0, len(peak_store), batch_size):
+            stop = min(start + batch_size, len(peak_store))
+            offsets = peak_store.offsets[start:stop + 1]
+
+            yield SpectrumBatch(ids=peak_store.spec_ids[start:stop],
+                                rt=rt[start:stop],
+                                ms_lvl=ms_lvl[start:stop],
+                                offsets=offsets - offsets[0],
+                                mz=peak_store.mz[offsets[0]:offsets[-1]],
+                                i=peak_store.i[offsets[0]:offsets[-1]])
+
+
+class MZMLfile(MSfile):
+    """Class to access MS data stored in an mzML file."""
+
+    backends: ClassVar[List[str]] = ['pymzml', 'native']
+    """Reader backends available to read mzML files."""
+
+    _lazy: bool = False
+    _backend: str = 'pymzml'
+
+    def __init__(self,
+                 mzml_file_path: str,
+                 lazy: bool = False,
+                 cache_size: int = 256,
+                 spectrum_filter: Optional[SpectrumFilter] = None,
+                 backend: str = 'pymzml'):
+        """Initializes an instance of MZMLfile class.
+
+        By default, all spectra are read when initialized.
+        In lazy mode, only spectrum values are read from the mzML offset index and spectrum headers,
+        and peaks are decoded when a spectrum is first accessed with `spectrum_peaks`.
+        A bounded LRU cache holds the most recently decoded spectra.
+        Accessing the `peaks` dataframe or `peak_store` of a lazy MZMLfile decodes all spectra.
+
+        A `SpectrumFilter` may be given to read only a subset of the MS data.
+        Rejected spectra are skipped before their peaks are decoded.
+        The `peak_count` of a spectrum reflects the peaks accepted, while its `tic` is as recorded in the mzML file.
+
+        Spectra are read by pymzml by default.
+        The `native` backend parses the mzML file incrementally and decodes binary data arrays
+        directly into NumPy arrays, giving identical results faster (see `.NativeReader`).
+        MS-Numpress compressed files are only supported by pymzml.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML data file.
+                Path can be relative or absolute.
+            lazy: A boolean indicating if peaks are decoded on demand.
+                Defaults to ``False``.
+            cache_size: The maximum number of decoded spectra held by a lazy MZMLfile.
+            spectrum_filter: Filters spectra and peaks as they are read.
+                Peak filters (m/z range, min intensity) are not supported in lazy mode.
+            backend: (`pymzml`, `native`) The reader backend used to read the mzML file.
+                Defaults to `pymzml`.
+
+        Raises:
+            MSdataError: For peak filters in lazy mode, or an invalid backend.
+        """
+
+        if lazy and spectrum_filter is not None and spectrum_filter.filters_peaks:
+            raise MSdataError("Peak filters are not supported by a lazy MZMLfile")
+
+        if backend not in self.backends:
+            raise MSdataError(f"Invalid mzML reader backend: {backend}")
+
+        self._mzml_file_path = mzml_file_path
+        self._spectrum_filter = spectrum_filter
+        self._backend = backend
+        self._run = self._open_reader()
+
+        self._lazy = lazy
+        self._cache_size = cache_size
+        self._spectrum_cache = OrderedDict()
+
+        if self._lazy:
+            obo_version = self._run.OT.version if self._backend == 'pymzml' else None
+            self._index = mzmlReader.MZMLindex(self._mzml_file_path, obo_version)
+            self._create_spectra_from_index()
+        else:
+            self._index = None
+            self._create_dfs()
+
+        self._run_id = self._run.info['run_id']
+        # self.spectrum_count = self._run.info['spectrum_count']
+        self._run_date = self._run.info['start_time']
+        self._ms_file_version = self._run.info['mzml_version']
+
+        self._set_summary_values()
+
+        del self._run
+
+    def __getstate__(self):
+        # A lazy MZMLfile loads all peaks, so saved data does not depend on the mzML file
+        if self._peak_store is None and self._peaks is None:
+            self._load_peak_store()
+
+        state = super().__getstate__()
+        state['_spectrum_cache'] = OrderedDict()
+        return state
+
+    @property
+    def lazy(self):
+        """Get a boolean indicating if peaks are decoded on demand."""
+
+        return self._lazy
+
+    @property
+    def backend(self):
+        """Get the name of the reader backend used to read the mzML file."""
+
+        return self._backend
+
+    @staticmethod
+    def _read_spectrum_headers(mzml_file_path: str, ms_lvl: Optional[int]) -> DF:
+        """Reads the values of all spectra (or of an MS level) of an mzML file from their headers."""
+
+        headers = pd.DataFrame(mzmlReader.MZMLindex(mzml_file_path).read_headers(),
+                               columns=['id', 'rt', 'tic', 'ms_lvl', 'base_peak_mz', 'base_peak_i'])
+
+        return headers if ms_lvl is None else headers[headers['ms_lvl'] == ms_lvl]
+
+    @staticmethod
+    def read_tic(mzml_file_path: str, ms_lvl: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Reads the total ion current (TIC) chromatogram of an mzML file, without decoding any peaks.
+
+        The TIC chromatogram stored in the mzML file is read if present (for all MS levels), skipping spectra.
+        Otherwise, the TIC of each spectrum is read from spectrum headers.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML data file.
+            ms_lvl: An optional MS level of the spectra included, defaults to all spectra.
+
+        Returns:
+            A tuple of the retention time and TIC arrays.
+        """
+
+        if ms_lvl is None:
+            chromatogram = mzmlReader.read_chromatogram(mzml_file_path, 'tic')
+
+            if chromatogram is not None:
+                return chromatogram
+
+        headers = MZMLfile._read_spectrum_headers(mzml_file_path, ms_lvl)
+
+        return headers['rt'].to_numpy(dtype=np.float64), headers['tic'].to_numpy(dtype=np.float64)
+
+    @staticmethod
+    def read_base_peak_chromatogram(mzml_file_path: str,
+                                    ms_lvl: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Reads the base peak chromatogram (BPC) of an mzML file from spectrum headers, without decoding any peaks.
+
+        Base peak values not recorded in spectrum headers are NaN, except that base peak intensities
+        are read from a BPC chromatogram stored in the mzML file (for all MS levels), if present.
+        A non-lazy `MZMLfile` computes all base peak values from the peaks of each spectrum.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML data file.
+            ms_lvl: An optional MS level of the spectra included, defaults to all spectra.
+
+        Returns:
+            A tuple of the retention time, base peak m/z, and base peak intensity arrays.
+        """
+
+        headers = MZMLfile._read_spectrum_headers(mzml_file_path, ms_lvl)
+        base_peak_i = headers['base_peak_i'].to_numpy(dtype=np.float64)
+
+        if ms_lvl is None and np.isnan(base_peak_i).all():
+            chromatogram = mzmlReader.read_chromatogram(mzml_file_path, 'bpc')
+
+            if chromatogram is not None and len(chromatogram[1]) == len(base_peak_i):
+                base_peak_i = chromatogram[1]
+
+        return (headers['rt'].to_numpy(dtype=np.float64),
+                headers['base_peak_mz'].to_numpy(dtype=np.float64),
+                base_peak_i)
 
-    _run_id: str
-    _run_date: str
-    _ms_file_version: str
+    def _open_reader(self):
+        """Opens a reader of the mzML file with the MZMLfile's backend.
 
-    _spectrum_count: int
-    _peak_count: int
-    _tic_sum: float
+        Returns:
+            A pymzml `Reader` or a `.NativeReader`.
+        """
 
-    _peaks: DF
-    _spectra: DF
+        if self._backend == 'native':
+            return mzmlReader.NativeReader(self._mzml_file_path)
 
-    def __init__(self):
-        """Initializes an instance of MSfile class.
+        return mzmlReader.open_pymzml(self._mzml_file_path)
 
-        No need to call this superclass initialization,
-        as subclasses provide values for all attributes initialized here.
+    @staticmethod
+    def _spectrum_values(spectrum):
+        """Extracts the values of a single spectrum in an mzML file.
+
+        Returns:
+            A tuple of spectrum ID, rt, TIC, MS level, filter string,
+            precursor values (see `.mzmlReader.precursor_values`), m/z array, and intensity array.
         """
 
-        self._run_id = None
-        self._run_date = None
-        self._ms_file_version = None
+        try:
+            tic = spectrum.TIC
+        except AttributeError:
+            logger.warning("missing TIC value in mzML file")
+            tic = None
 
-        self._spectrum_count = None
-        self._peak_count = None
-        self._tic_sum = None
+        return (spectrum.ID,
+                spectrum.scan_time_in_minutes(),
+                tic,
+                spectrum.ms_level,
+                spectrum.get('filter string'),
+                mzmlReader.precursor_values(spectrum.get),
+                spectrum.mz,
+                spectrum.i)
 
-        self._peaks = pd.DataFrame()
-        self._spectra = pd.DataFrame()
+    def _read_spectra(self, run) -> Iterator[tuple]:
+        """Reads the values of all spectra accepted by the spectrum filter.
 
-    @property
-    def run_id(self):
-        """Get the sample's run ID as specified from its MS data file."""
+        Spectra are tested before their peaks are accessed, so rejected spectra are never decoded.
 
-        return self._run_id
+        Args:
+            run: A reader of the mzML file (see `_open_reader`).
 
-    @property
-    def run_date(self):
-        """Get the date the sample was run as specified from its MS data file."""
+        Yields:
+            A tuple of spectrum values, as returned by `_spectrum_values`.
+        """
 
-        return self._run_date
+        spectrum_filter = self._spectrum_filter
 
-    @property
-    def ms_file_version(self):
-        """Get the data format version in which the sample was originally saved as specified from its ms file.
+        for spectrum in run:
+            if spectrum_filter is None:
+                yield self._spectrum_values(spectrum)
+                continue
 
-        Note: Currently, this is equivalent to mzML version number.
+            if not spectrum_filter.accepts(spectrum.ms_level, spectrum.scan_time_in_minutes()):
+                continue
+
+            *spectrum_values, mz_values, i_values = self._spectrum_values(spectrum)
+
+            if spectrum_filter.filters_peaks:
+                peak_mask = spectrum_filter.peak_mask(mz_values, i_values)
+                mz_values, i_values = mz_values[peak_mask], i_values[peak_mask]
+
+            yield (*spectrum_values, mz_values, i_values)
+
+    def _create_dfs(self):
+        """Creates the spectra dataframe and peak store for an mzML file.
+
+        Peak values and per spectrum values are accumulated into a `SpectraBuffer`,
+        and the spectra dataframe and `PeakStore` are built once after all spectra are read.
+        The base peak and m/z range of all spectra are then computed from the peak store at once.
+        The peaks dataframe is created from the peak store when first accessed.
+
+        This method sets the following properties:
+            * self._peak_store
+            * self._peaks
+            * self._spectra
         """
 
-        return self._ms_file_version
+        spectra_buffer = SpectraBuffer(self._run.info['spectrum_count'] or 1024)
 
-    @property
-    def spectrum_count(self):
-        """Get the number of MS spectra from a sample run.
+        for spectrum_values in self._read_spectra(self._run):
+            spectra_buffer.add(*spectrum_values)
 
-        This value is calculated from the number of spectra imported, rather than from MS file metadata.
+        self._peak_store = spectra_buffer.peak_store()
+        self._peaks = None
+        self._spectra = spectra_buffer.spectra_df(self._peak_store)
+
+    def _create_spectra_from_index(self):
+        """Creates the spectra dataframe of a lazy MZMLfile from spectrum headers, without decoding peaks.
+
+        The base peak and m/z range of each spectrum are as recorded in its header, and NaN if not recorded
+        (see `base_peak_chromatogram`).
+
+        This method sets the following properties:
+            * self._peak_store
+            * self._peaks
+            * self._spectra
         """
 
-        return self._spectrum_count
+        headers = pd.DataFrame(self._index.read_headers())
 
-    @property
-    def peak_count(self):
-        """Get the total number of MS peaks from all MS spectra in sample run."""
+        if self._spectrum_filter is not None:
+            spectrum_mask = self._spectrum_filter.spectrum_mask(headers['ms_lvl'].to_numpy(), headers['rt'].to_numpy())
+            headers = headers[spectrum_mask]
 
-        return self._peak_count
+        if headers['tic'].isna().any():
+            logger.warning("missing TIC value in mzML file")
 
-    @property
-    def tic_sum(self):
+        self._peak_store = None
+        self._peaks = None
+
+        self._spectra = pd.DataFrame({'rt': headers['rt'].to_numpy(dtype=np.float64),
+                                      'peak_count': headers['peak_count'].to_numpy(dtype=np.int64),
+                                      'tic': headers['tic'].to_numpy(dtype=np.float64),
+                                      'ms_lvl': headers['ms_lvl'].to_numpy(dtype=np.int64),
+                                      'filters': headers['filters'].tolist(),
+                                      'precursor_mz': headers['precursor_mz'].to_numpy(dtype=np.float64),
+                                      'precursor_charge': headers['precursor_charge'].to_numpy(dtype=np.int64),
+                                      'isolation_mz_min': headers['isolation_mz_min'].to_numpy(dtype=np.float64),
+                                      'isolation_mz_max': headers['isolation_mz_max'].to_numpy(dtype=np.float64),
+                                      'base_peak_mz': headers['base_peak_mz'].to_numpy(dtype=np.float64),
+                                      'base_peak_i': headers['base_peak_i'].to_numpy(dtype=np.float64),
+                                      'mz_min': headers['mz_min'].to_numpy(dtype=np.float64),
+                                      'mz_max': headers['mz_max'].to_numpy(dtype=np.float64)},
+                                     index=pd.Index(headers['id'].tolist()))
+
+    def _spectrum_arrays(self, spec_id) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the m/z and intensity arrays of a single spectrum.
+
+        A lazy MZMLfile decodes the spectrum from the mzML file, unless recently accessed.
         """
-        Get the total ion current sum of all spectra in sample run
+
+        if not self._lazy or self._peak_store is not None:
+            return super()._spectrum_arrays(spec_id)
+
+        if spec_id in self._spectrum_cache:
+            self._spectrum_cache.move_to_end(spec_id)
+            return self._spectrum_cache[spec_id]
+
+        *_, mz_values, i_values = self._spectrum_values(self._index.read_spectrum(spec_id, self._backend))
+        arrays = (mz_values.round(5), i_values)
+
+        self._spectrum_cache[spec_id] = arrays
+        if len(self._spectrum_cache) > self._cache_size:
+            self._spectrum_cache.popitem(last=False)
+
+        return arrays
+
+    def _load_peak_store(self):
+        """Decodes all spectra of a lazy MZMLfile into the peak store."""
+
+        logger.info(f"Decoding all spectra of lazy MZMLfile: {self._mzml_file_path}")
+
+        self._run = self._open_reader()
+        self._create_dfs()
+        del self._run
+
+        self._spectrum_cache.clear()
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[SpectrumBatch]:
+        """Iterates over all spectra in fixed size batches of NumPy arrays.
+
+        A lazy MZMLfile streams spectra from the mzML file, holding only a single batch in memory.
+        Spectra are decoded identically to a non-lazy MZMLfile.
+
+        Args:
+            batch_size: The number of spectra in each batch (the last batch may be smaller).
+
+        Yields:
+            A `SpectrumBatch` for each group of consecutive spectra.
         """
 
-        return self._tic_sum
+        if self._peak_store is not None or self._peaks is not None:
+            yield from super().iter_batches(batch_size)
+            return
 
-    @property
-    def peaks(self):
-        """Get a dataframe of all peaks in a MS file.
+        run = self._open_reader()
+        spectra_buffer = SpectraBuffer(batch_size)
 
-        Dataframe structure
-            | **First Index Level:**  spec_id
-            | **Second Index Level:**  peak_number
-            | **Columns:**  rt,  mz,  i
+        for spectrum_values in self._read_spectra(run):
+            spectra_buffer.add(*spectrum_values)
+
+            if len(spectra_buffer) == batch_size:
+                yield spectra_buffer.batch()
+                spectra_buffer = SpectraBuffer(batch_size)
+
+        if len(spectra_buffer) > 0:
+            yield spectra_buffer.batch()
+
+
+class MSAIRfile(MSfile):
+    """Class to access MS data stored in a columnar msAIr file.
+
+    The `spectra` dataframe is read when initialized,
+    while the `peak_store` arrays are memory-mapped from the file without copying or decompressing.
+    Peaks are only read from disk as they are accessed.
+    See `.msAIrFormat` for the file layout.
+
+    Spectra are stored in chunks of consecutive spectra, indexed by retention time range and MS levels.
+    A `SpectrumFilter` may be given to read only the chunks that may contain accepted spectra.
+    """
+
+    chunk_size: ClassVar[int] = 128
+    """The number of spectra in each chunk of a msAIr file written."""
+
+    def __init__(self,
+                 msAIr_file_path: str,
+                 spectrum_filter: Optional[SpectrumFilter] = None):
+        """Initializes an instance of MSAIRfile class.
+
+        Args:
+            msAIr_file_path: A string representation of the path to the msAIr file.
+                Path can be relative or absolute.
+            spectrum_filter: Filters spectra and peaks, reading only the chunks of spectra which may be accepted.
+
+        Raises:
+            MSAIRformatError: If the file is not a supported columnar msAIr file.
         """
 
-        return self._peaks
+        info, arrays, chunks = msAIrFormat.read(msAIr_file_path)
+
+        self._msAIr_file_path = msAIr_file_path
+        self._source_file_type = info['ms_file_type']
+
+        self._run_id = info['run_id']
+        self._run_date = info['run_date']
+        self._ms_file_version = info['ms_file_version']
+
+        self._spectrum_count = info['spectrum_count']
+        self._peak_count = info['peak_count']
+        self._tic_sum = info['tic_sum']
+
+        if info['spectrum_filter'] is not None:
+            self._spectrum_filter = SpectrumFilter(**{field: tuple(value) if isinstance(value, list) else value
+                                                      for field, value in info['spectrum_filter'].items()})
+
+        if spectrum_filter is None:
+            self._chunks = list(range(len(chunks)))
+        else:
+            self._chunks = [n for n, chunk in enumerate(chunks)
+                            if spectrum_filter.accepts_range(chunk['ms_lvls'], chunk['rt_min'], chunk['rt_max'])]
+
+        spectrum_ranges = None
+        if len(self._chunks) < len(chunks):
+            spectrum_ranges = self._merged_ranges([chunks[n]['rows']['spectra/spec_id'] for n in self._chunks])
+
+        self._spectra = pd.DataFrame({column: self._take_ranges(arrays['spectra/' + column], spectrum_ranges)
+                                      for column in info['spectra_columns']},
+                                     index=pd.Index(self._take_ranges(arrays['spectra/spec_id'], spectrum_ranges),
+                                                    name=info['spectra_index_name']))
+
+        if spectrum_ranges is None:
+            self._peak_store = PeakStore(arrays['peaks/spec_ids'], arrays['peaks/offsets'],
+                                         arrays['peaks/mz'], arrays['peaks/i'])
+        else:
+            offsets = arrays['peaks/offsets']
+            peak_ranges = [(offsets[start], offsets[stop]) for start, stop in spectrum_ranges]
+
+            self._peak_store = PeakStore.from_peak_counts(
+                self._take_ranges(arrays['peaks/spec_ids'], spectrum_ranges),
+                self._take_ranges(np.diff(offsets), spectrum_ranges),
+                self._take_ranges(arrays['peaks/mz'], peak_ranges),
+                self._take_ranges(arrays['peaks/i'], peak_ranges))
+
+        self._peaks = None
+
+        if spectrum_filter is not None:
+            self.apply_filter(spectrum_filter)
 
     @property
-    def spectra(self):
-        """Get a dataframe of all spectra in an MS file.
+    def source_file_type(self) -> str:
+        """Get the type of MS file (such as `MZMLfile`) the MS data was read from, before it was written as msAIr."""
 
-        Dataframe structure
-            | **Index:**  spec_id
-            | **Columns:**  rt,  peak_count,  tic,  ms_lvl,  filters
+        return self._source_file_type
+
+    @property
+    def chunks(self) -> List[int]:
+        """Get the positions of the chunks read from the msAIr file, in its chunk index."""
+
+        return self._chunks
+
+    @staticmethod
+    def _merged_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Merges sorted (start, stop) ranges which are adjacent."""
+
+        merged = []
+
+        for start, stop in ranges:
+            if merged and merged[-1][1] == start:
+                merged[-1] = (merged[-1][0], stop)
+            else:
+                merged.append((start, stop))
+
+        return merged
+
+    @staticmethod
+    def _take_ranges(array: np.ndarray, ranges: Optional[List[Tuple[int, int]]]) -> np.ndarray:
+        """Get the values of an array within (start, stop) ranges.
+
+        A single range is a view of the array, so memory-mapped data is not copied.
         """
 
-        return self._spectra
+        if ranges is None:
+            return array
 
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return array[start:stop]
 
-class MZMLfile(MSfile):
-    """Class to access MS data stored in an mzML file."""
+        return np.concatenate([array[start:stop] for start, stop in ranges]) if ranges else array[:0]
 
-    def __init__(self,
-                 mzml_file_path: str):
-        """Initializes an instance of MZMLfile class.
+    @staticmethod
+    def write(ms_file: MSfile, msAIr_file_path: str) -> str:
+        """Writes the MS data of any `MSfile` as a columnar msAIr file.
+
+        Spectra are indexed in chunks of `chunk_size` consecutive spectra.
 
         Args:
-            mzml_file_path: A string representation of the path to the mzML data file.
+            ms_file: The MS data to write.
+            msAIr_file_path: A string representation of the path to the msAIr file to write.
                 Path can be relative or absolute.
+
+        Returns:
+            The content hash of the file (the sha256 hash of its header) as a string, see `.msAIrFormat.verify`.
+
+        Raises:
+            MSdataError: If spectra and peaks are not stored in the same order.
         """
-        self._mzml_file_path = mzml_file_path
-        self._run = pymzml.run.Reader(self._mzml_file_path)
 
-        # self._peaks = pd.DataFrame()
-        # self._spectra = pd.DataFrame()
-        self._create_dfs()
+        return msAIrFormat.write_encoded(msAIr_file_path, MSAIRfile.encode(ms_file))
 
-        self._run_id = self._run.info['run_id']
-        # self.spectrum_count = self._run.info['spectrum_count']
-        self._run_date = self._run.info['start_time']
-        self._ms_file_version = self._run.info['mzml_version']
+    @staticmethod
+    def encode(ms_file: MSfile) -> msAIrFormat.EncodedFile:
+        """Encodes the MS data of any `MSfile` as the blocks of a columnar msAIr file, without hashing or writing.
+
+        Args:
+            ms_file: The MS data to encode.
 
-        self._spectrum_count = self.spectra.index.size
-        self._tic_sum = self.spectra['tic'].sum()       # Total number of MS peaks from all spectra
-        self._peak_count = self.peaks.index.size        # Total ion current sum of all spectra
+        Returns:
+            The encoded file (see `.msAIrFormat.hash_blocks` and `.msAIrFormat.write_encoded`).
 
-        del self._run
+        Raises:
+            MSdataError: If spectra and peaks are not stored in the same order.
+        """
 
-    def _create_spectrum_peaks_df(self, spectrum):
-        """Creates a dataframe of all the peaks for a single spectrum in an mzML file."""
+        peak_store = ms_file.peak_store
+        if peak_store is None:
+            peak_store = PeakStore.from_df(ms_file.peaks, ms_file.spectra.index)
+
+        spectra = ms_file.spectra
+        spectrum_filter = ms_file.spectrum_filter
+
+        if not np.array_equal(spectra.index.to_numpy(), peak_store.spec_ids):
+            raise MSdataError(f"Spectra and peaks of {ms_file.run_id} are not in the same order")
+
+        if spectrum_filter is not None:
+            spectrum_filter = {field: np.asarray(value).tolist() if value is not None else None
+                               for field, value in spectrum_filter._asdict().items()}
+
+        info = {'ms_file_type': ms_file.source_file_type,
+                'run_id': ms_file.run_id,
+                'run_date': ms_file.run_date,
+                'ms_file_version': ms_file.ms_file_version,
+                'spectrum_count': int(ms_file.spectrum_count),
+                'peak_count': int(ms_file.peak_count),
+                'tic_sum': float(ms_file.tic_sum),
+                'spectrum_filter': spectrum_filter,
+                'spectra_index_name': spectra.index.name,
+                'spectra_columns': spectra.columns.tolist()}
+
+        arrays = {'spectra/spec_id': spectra.index.to_numpy()}
+        arrays.update({'spectra/' + column: spectra[column].to_numpy() for column in spectra.columns})
+        arrays.update({'peaks/spec_ids': peak_store.spec_ids,
+                       'peaks/offsets': peak_store.offsets,
+                       'peaks/mz': peak_store.mz,
+                       'peaks/i': peak_store.i})
+
+        rt = spectra['rt'].to_numpy()
+        ms_lvl = spectra['ms_lvl'].to_numpy()
+        offsets = peak_store.offsets
+        spectrum_blocks = [name for name in arrays if name.startswith('spectra/')] + ['peaks/spec_ids']
+
+        chunks = []
+        for start in range(0, len(spectra), MSAIRfile.chunk_size):
+            stop = min(start + MSAIRfile.chunk_size, len(spectra))
+
+            rows = {name: [start, stop] for name in spectrum_blocks}
+            rows['peaks/offsets'] = [start, stop + 1]
+            rows['peaks/mz'] = rows['peaks/i'] = [int(offsets[start]), int(offsets[stop])]
+
+            chunks.append({'rt_min': float(rt[start:stop].min()),
+                           'rt_max': float(rt[start:stop].max()),
+                           'ms_lvls': np.unique(ms_lvl[start:stop]).tolist(),
+                           'rows': rows})
+
+        return msAIrFormat.encode(info, arrays, chunks)
+
+
+class MSAIRhandle(NamedTuple):
+    """A reference to MS data in a msAIr file, passed between processes in place of the MS data itself.
+
+    A worker process shares MS data by writing it to a msAIr file in a transport directory
+    (memory-backed shared memory, such as /dev/shm), and returning a handle.
+    The receiving process memory-maps the file as a `MSAIRfile`, so the MS data is neither pickled nor copied.
+    MS data already read from a msAIr file (such as a parse cache entry) is shared by reference to that file.
+    """
 
-        mz_values = spectrum.mz.round(5)
-        i_values = spectrum.i
-        rt = spectrum.scan_time_in_minutes()
-        peak_count = len(mz_values)
-        spectrum_id = [spectrum.ID]
-        peak_list = list(range(peak_count))
+    file_path: str
+    """A string representation of the path to the msAIr file."""
 
-        peak_index = pd.MultiIndex.from_product([spectrum_id, peak_list], names=['spec_id', 'peak_number'])
-        peaks = {'rt': rt,
-                 'mz': mz_values,
-                 'i': i_values}
-        spectrum_peaks = pd.DataFrame(peaks, index=peak_index)
+    spectrum_filter: Optional[SpectrumFilter] = None
+    """The filter applied to the MS data read from the msAIr file."""
 
-        return spectrum_peaks
+    temporary: bool = False
+    """A boolean indicating if the msAIr file is removed once opened."""
 
-    def _create_spectrum_df(self, spectrum):
-        """Creates a dataframe of all the spectra in an mzML file."""
+    @staticmethod
+    def share(ms_file: MSfile, transport_dir: str) -> 'MSAIRhandle':
+        """Get a handle to the MS data of a MS file, writing it to a temporary msAIr file if needed.
 
-        rt = spectrum.scan_time_in_minutes()
-        peak_count = len(spectrum.mz)
+        A `MSAIRfile` is shared by reference to its file, unless the file was since removed
+        (such as a temporary file shared by another process).
 
-        try:
-            tic = spectrum.TIC
-        except AttributeError:
-            logger.warning("missing TIC value in mzML file")
-            tic = None
+        Args:
+            ms_file: MS data, as initialized (and not since modified).
+            transport_dir: A string representation of the path to the directory of temporary msAIr files.
 
-        ms_lvl = spectrum.ms_level
-        filters = spectrum.get('filter string')
-        spectrum_id = [spectrum.ID]
+        Returns:
+            A handle to open the MS data in another process.
+        """
 
-        spec = {'rt': rt,
-                'peak_count': peak_count,
-                'tic': tic,
-                'ms_lvl': ms_lvl,
-                'filters': filters}
-        spectrum_df = pd.DataFrame(spec, index=spectrum_id)
+        if isinstance(ms_file, MSAIRfile) and os.path.exists(ms_file._msAIr_file_path):
+            return MSAIRhandle(ms_file._msAIr_file_path, ms_file.spectrum_filter)
 
-        return spectrum_df
+        temp_file, temp_path = tempfile.mkstemp(suffix='.msAIr', dir=transport_dir)
+        os.close(temp_file)
 
-    def _create_dfs(self):
-        """Creates spectra and peaks dataframes for an mzML file.
+        try:
+            MSAIRfile.write(ms_file, temp_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
 
-        This method sets the following properties:
-            * self._peaks
-            * self._spectra
+        return MSAIRhandle(temp_path, temporary=True)
+
+    def open(self) -> 'MSAIRfile':
+        """Opens the MS data of the handle as a `MSAIRfile`, removing a temporary msAIr file.
+
+        On POSIX systems, a removed file stays mapped in memory until the `MSAIRfile` is released.
         """
 
-        peaks_df_list = []
-        spectra_df_list = []
+        ms_file = MSAIRfile(self.file_path, self.spectrum_filter)
+
+        if self.temporary:
+            try:
+                os.remove(self.file_path)
+            except OSError:
+                # Mapped files can not be removed on Windows, so they are removed at exit
+                atexit.register(_remove_file, self.file_path)
+
+        return ms_file
+
+
+def _remove_file(file_path: str):
+    """Removes a file, if possible."""
+
+    try:
+        os.remove(file_path)
+    except OSError:
+        logger.warning(f"Unable to remove file: {file_path}")
+
+
+class ScanDelta(NamedTuple):
+    """The changes to the MS files of a `MSfileSet` since its last scan, by filename."""
 
-        for n, spectrum in enumerate(self._run):
-            spectrum_peaks_df = self._create_spectrum_peaks_df(spectrum)
-            peaks_df_list.append(spectrum_peaks_df)
+    added: List[str]
+    """Files added to the set."""
 
-            spectrum_df = self._create_spectrum_df(spectrum)
-            spectra_df_list.append(spectrum_df)
+    removed: List[str]
+    """Files removed from the set."""
 
-        self._peaks = pd.concat(peaks_df_list)
-        self._spectra = pd.concat(spectra_df_list)
+    modified: List[str]
+    """Files with a changed size or modification time."""
 
 
 class MSfileSet:
@@ -238,12 +1897,23 @@ class MSfileSet:
     without loading their entire contents into memory.
 
     By default, contents of sub directories will be recursively included.
+    The directory tree is scanned once for all extensions, and sub directories may be scanned by multiple threads.
     However, an error is raised if included filenames are duplicated.
     A Set can include any MSfile type (mzML, msAIr, or a mix).
     By default, any datafile matching these extensions will be included.
     An exclusive type may alternatively be specified.
+
+    Optionally, a header scan reads the run information of each file (without reading spectra),
+    adding the columns run_id, run_date, ms_file_version, and spectrum_count.
+    Files are scanned in parallel according to MP_SUPPORT.
+
+    A set may be refreshed, updating it with only the files added, removed, or modified since its last scan.
+    Saving a snapshot of the set allows a later process to refresh it, without rebuilding the set.
     """
 
+    header_columns: ClassVar[List[str]] = ['run_id', 'run_date', 'ms_file_version', 'spectrum_count']
+    """Columns added to the dataframe by a header scan."""
+
     mzML_exts: ClassVar[List[str]] = ['mzML', 'mzml', 'MZML']
     """File extensions considered to be mzML files."""
 
@@ -254,7 +1924,9 @@ class MSfileSet:
     def __init__(self,
                  dir_path: str,
                  data_type: str = 'all',
-                 recursive: bool = True):
+                 recursive: bool = True,
+                 scan_headers: bool = False,
+                 scan_workers: int = 1):
         """Initializes an instance of MSfileSet class.
 
         Args:
@@ -264,33 +1936,55 @@ class MSfileSet:
                 By default, all types are included.
             recursive: A boolean indicating if files in subdirectories are included in the set.
                 Defaults to ``True``.
+            scan_headers: A boolean indicating if the run information of each file is read.
+                Defaults to ``False``.
+            scan_workers: The number of threads scanning subdirectories for MS files,
+                which is faster on high latency (network) file systems. Defaults to 1 (no threads).
 
         Raises:
             MSfileSetInitError: For duplicated filenames.
         """
 
         self._dir_path = dir_path
+        self._recursive = recursive
+        self._scan_workers = scan_workers
 
         if data_type == 'all':
-            ext_list = self.mzML_exts + self.msAIr_exts
+            self._ext_list = self.mzML_exts + self.msAIr_exts
         elif data_type == 'mzML':
-            ext_list = self.mzML_exts
+            self._ext_list = self.mzML_exts
         elif data_type == 'msAIr':
-            ext_list = self.msAIr_exts
+            self._ext_list = self.msAIr_exts
         else:
             raise MSfileSetInitError(f"Invalid data_type: {data_type}")
 
-        if recursive:
-            self._file_iter = miscUtils.FileGrabber.multi_extensions(self._dir_path, *ext_list)
-        else:
-            self._file_iter = miscUtils.FileGrabber.multi_extensions(self._dir_path, *ext_list, recursive=False)
+        self._df, self._file_stats = self._scan()
+
+        if scan_headers:
+            self.scan_headers()
+
+    def __repr__(self):
+        return self._df.to_string()
+
+    def _scan(self) -> Tuple[DF, Dict[str, Tuple[int, int]]]:
+        """Scans the data directory for MS files.
+
+        Returns:
+            A tuple of the dataframe of MS files, and the (size, modification time in ns) of each file by path.
+
+        Raises:
+            MSfileSetInitError: For duplicated filenames.
+        """
+
+        # All extensions are matched in a single traversal, with file sizes from the stat cached while scanning
+        file_entries = miscUtils.FileGrabber.scan_extensions(self._dir_path, *self._ext_list,
+                                                             recursive=self._recursive, workers=self._scan_workers)
 
         def file_gen():
-            for datafile in self._file_iter:
-                file_size = miscUtils.Sizer.file_mb(datafile)
+            for entry in file_entries:
+                file_size = entry.stat().st_size * 0.000001
 
-                path_head, path_tail = os.path.split(datafile)
-                filename, file_ext = os.path.splitext(path_tail)
+                filename, file_ext = os.path.splitext(entry.name)
 
                 # Fix mixed cases extensions to have same file_type value
                 if file_ext.replace(".", "").casefold() == 'mzml':
@@ -298,21 +1992,99 @@ class MSfileSet:
                 elif file_ext.replace(".", "").casefold() == 'msair':
                     file_type = 'msAIr'
 
-                yield (filename, file_type, file_size, str(datafile))
+                yield (filename, file_type, file_size, entry.path)
 
         # Initial import into a dataframe with integer index
-        self._hf = pd.DataFrame(file_gen(), columns=['filename', 'file_type', 'file_size', 'path'])
+        hf = pd.DataFrame(file_gen(), columns=['filename', 'file_type', 'file_size', 'path'])
 
         # Test if any filenames are duplicated
-        duplicates = self._hf[self._hf.duplicated('filename', keep=False)]
+        duplicates = hf[hf.duplicated('filename', keep=False)]
         if duplicates.size > 0:
             raise MSfileSetInitError(f"Duplicated filenames:\n {duplicates.to_string()}")
 
-        else:
-            self._df = self._hf.set_index('filename', verify_integrity=True)
+        file_stats = {entry.path: (entry.stat().st_size, entry.stat().st_mtime_ns) for entry in file_entries}
 
-    def __repr__(self):
-        return self._df.to_string()
+        return hf.set_index('filename', verify_integrity=True), file_stats
+
+    def refresh(self) -> 'ScanDelta':
+        """Updates the set with the MS files added, removed, and modified since the last scan.
+
+        The data directory is scanned again (see `.FileGrabber.scan_extensions`),
+        and files are compared to the last scan by path, size, and modification time.
+        A file moved to another path is both removed and added.
+        If headers were scanned, only the headers of added and modified files are scanned.
+
+        Returns:
+            A `ScanDelta` of the filenames added, removed, and modified.
+
+        Raises:
+            MSfileSetInitError: For duplicated filenames.
+        """
+
+        scanned_df, file_stats = self._scan()
+        old_paths = self._df['path']
+        new_paths = scanned_df['path']
+
+        removed = [name for name, path in old_paths.items() if new_paths.get(name) != path]
+        added = [name for name, path in new_paths.items() if old_paths.get(name) != path]
+        modified = [name for name, path in new_paths.items()
+                    if old_paths.get(name) == path and file_stats[path] != self._file_stats.get(path)]
+
+        df = self._df.drop(index=removed)
+        changed_df = scanned_df.loc[added + modified]
+
+        if all(column in df.columns for column in self.header_columns):
+            changed_df = self._scan_header_rows(changed_df)
+
+        df.loc[modified, changed_df.columns] = changed_df.loc[modified]
+        df = pd.concat([df, changed_df.loc[added]])
+
+        if 'spectrum_count' in df.columns:
+            df['spectrum_count'] = df['spectrum_count'].astype('Int64')
+
+        self._df = df
+        self._file_stats = file_stats
+
+        delta = ScanDelta(added, removed, modified)
+        logger.info(f"Refreshed {self._dir_path}: {len(added)} added, {len(removed)} removed, "
+                    f"{len(modified)} modified")
+
+        return delta
+
+    def save_snapshot(self, file_path: str, compression=None) -> str:
+        """Saves the set, including the file stats of its last scan, for a later `refresh`.
+
+        Args:
+            file_path: A string representation of the path to the snapshot file.
+            compression: The `.Compression` settings, defaults to `.Saver.default_compression`.
+
+        Returns:
+            A sha256 hash of the snapshot file.
+        """
+
+        return miscUtils.Saver.save_obj(self, file_path, compression)
+
+    @staticmethod
+    def load_snapshot(file_path: str, test_hash: Optional[str] = None) -> 'MSfileSet':
+        """Loads a set saved by `save_snapshot`, without scanning the data directory.
+
+        Args:
+            file_path: A string representation of the path to the snapshot file.
+            test_hash: An optional sha256 hash to verify the snapshot file against.
+
+        Returns:
+            The saved `MSfileSet`. Use `refresh` to update it with changes since the snapshot.
+
+        Raises:
+            MSfileSetInitError: If the snapshot file fails hash verification.
+        """
+
+        ms_file_set, hash_result = miscUtils.Saver.load_obj(file_path, test_hash)
+
+        if hash_result is False:
+            raise MSfileSetInitError(f"Hash verification failed for snapshot: {file_path}")
+
+        return ms_file_set
 
     @property
     def df(self):
@@ -320,6 +2092,63 @@ class MSfileSet:
 
         Dataframe structure
             | **Index:**  name (from filename)
-            | **Columns:**  type,  size_MB,  path
+            | **Columns:**  type,  size_MB,  path,  (run_id,  run_date,  ms_file_version,  spectrum_count)
         """
         return self._df
+
+    @staticmethod
+    def _read_header(file_type: str, path: str) -> dict:
+        """Reads the run information of a single MS file.
+
+        Files that can not be read are logged, and given missing values.
+        """
+
+        try:
+            if file_type == 'mzML':
+                return mzmlReader.read_header(path)
+
+            if msAIrFormat.read_version(path) == msAIrFormat.FORMAT_VERSION:
+                info = msAIrFormat.read_info(path)
+                return {column: info[column] for column in MSfileSet.header_columns}
+
+            # Legacy msAIr files have no header, the full file must be loaded
+            logger.info(f"No header to scan in legacy msAIr file: {path}")
+
+        except Exception as err:
+            logger.warning(f"Unable to scan header of MS file: {path}, {err!r}")
+
+        return dict.fromkeys(MSfileSet.header_columns)
+
+    @staticmethod
+    def _scan_header_mpf(row):
+        """Multiprocessing function to read the run information of a single MS file (a row of a MSfileSet)."""
+
+        for column, value in MSfileSet._read_header(row['file_type'], row['path']).items():
+            row[column] = value
+
+        return row
+
+    @log_timer
+    def scan_headers(self):
+        """Reads the run information of all MS files in the set, without reading spectra.
+
+        Adds the columns run_id, run_date, ms_file_version, and spectrum_count to the dataframe.
+        Multi or single process according to MP_SUPPORT.
+        """
+
+        self._df = self._scan_header_rows(self._df)
+        self._df['spectrum_count'] = self._df['spectrum_count'].astype('Int64')
+
+    def _scan_header_rows(self, df: DF) -> DF:
+        """Reads the run information of the MS files in a dataframe (rows of a MSfileSet), adding header columns."""
+
+        df = df.reindex(columns=[*df.columns.drop(self.header_columns, errors='ignore'),
+                                 *self.header_columns]).astype({column: object for column in self.header_columns})
+
+        if msAI.MP_SUPPORT and df.shape[0] > 1:
+            return miscUtils.MultiTaskDF.parallelize_on_rows(df, self._scan_header_mpf)
+
+        if df.shape[0] == 0:
+            return df
+
+        return df.apply(self._scan_header_mpf, axis=1)
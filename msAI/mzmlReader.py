@@ -0,0 +1,828 @@
+"""msAI module for random access to the contents of mzML files.
+
+Features
+    * Reading the offset index of indexed mzML files (or scanning for offsets if not indexed)
+    * Reading spectrum values from their XML headers, without decoding binary data arrays
+    * Reading single spectra by byte offset
+    * Extracting the precursor m/z, charge, and isolation window of MSn spectra, as typed values
+    * A native reader backend, decoding binary data arrays directly into NumPy arrays
+    * Reading run information from the header and index list, without reading spectra
+    * Reading stored chromatograms (such as the TIC chromatogram), without reading spectra
+    * Opening pymzml readers in concurrent threads
+
+"""
+
+
+from msAI.errors import MZMLreaderError
+
+import re
+import mmap
+import zlib
+import base64
+import logging
+import threading
+from xml.etree import ElementTree
+from xml.sax.saxutils import unescape
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pymzml
+
+
+logger = logging.getLogger(__name__)
+"""Module logger."""
+
+
+_INDEX_LIST_OFFSET = re.compile(rb'<indexListOffset>\s*(\d+)\s*</indexListOffset>')
+_SPECTRUM_INDEX = re.compile(rb'<index\s+name="spectrum"\s*>(.*?)</index>', re.DOTALL)
+_INDEX_OFFSET = re.compile(rb'<offset\s+idRef="([^"]*)"[^>]*>\s*(\d+)\s*</offset>')
+_SPECTRUM_TAG = re.compile(rb'<spectrum\s[^>]*>')
+_ATTRIBUTE = re.compile(rb'([\w:]+)="([^"]*)"')
+_CV_PARAM = re.compile(rb'<cvParam\s[^>]*>')
+_CHROMATOGRAM_INDEX = re.compile(rb'<index\s+name="chromatogram"\s*>(.*?)</index>', re.DOTALL)
+_CHROMATOGRAM_TAG = re.compile(rb'<chromatogram\s[^>]*>')
+
+_XML_ENTITIES = {'&quot;': '"', '&apos;': "'"}
+
+PARSER_VERSION = 3
+"""Version of the MS data parsed from mzML files, incremented when parsed values change (invalidating cached data)."""
+
+_TAIL_SIZE = 4096
+"""Number of bytes at the end of an mzML file searched for the index list offset."""
+
+
+_OBO_LOCK = threading.Lock()
+"""Lock serializing the parsing of pymzml OBO translators."""
+
+
+def parse_obo(obo_version: str = None) -> pymzml.obo.OboTranslator:
+    """Get the pymzml OBO translator of a PSI-MS controlled vocabulary version, parsed in a thread safe way.
+
+    pymzml shares a translator between all readers of a version, and parses it on first use,
+    so readers in concurrent threads may see a partially parsed translator.
+
+    Args:
+        obo_version: The version of the PSI-MS controlled vocabulary, defaults to the latest version.
+
+    Returns:
+        The shared, parsed translator.
+    """
+
+    with _OBO_LOCK:
+        obo_translator = pymzml.obo.OboTranslator.from_cache(obo_version)
+
+        # Any lookup parses the translator
+        obo_translator['MS:1000521']
+
+    return obo_translator
+
+
+def open_pymzml(mzml_file_path: str) -> pymzml.run.Reader:
+    """Opens a pymzml `Reader` of an mzML file, with its OBO translator parsed, in a thread safe way.
+
+    Args:
+        mzml_file_path: A string representation of the path to the mzML file.
+
+    Returns:
+        A pymzml `Reader`.
+    """
+
+    with _OBO_LOCK:
+        reader = pymzml.run.Reader(mzml_file_path)
+        reader.OT['MS:1000521']
+
+    return reader
+
+
+def _xml_value(value: bytes) -> str:
+    """Decodes an XML attribute value."""
+
+    return unescape(value.decode('utf-8'), _XML_ENTITIES)
+
+
+def native_id(id_string: str):
+    """Get the native ID of a spectrum from its id attribute.
+
+    Matches the spectrum ID given by pymzml (the last number in the id attribute),
+    so spectra read by either method share the same IDs.
+
+    Args:
+        id_string: The id attribute of a spectrum element.
+
+    Returns:
+        The native ID as an int, if possible, otherwise as a string.
+    """
+
+    match = pymzml.regex_patterns.SPECTRUM_ID_PATTERN.search(id_string)
+
+    if match:
+        try:
+            return int(match.group(1))
+        except ValueError:
+            return match.group(1)
+
+    return id_string
+
+
+def scan_time_in_minutes(value: float, unit: str) -> float:
+    """Converts a scan time to minutes.
+
+    Conversion is identical to pymzml's `scan_time_in_minutes`.
+
+    Raises:
+        MZMLreaderError: For an unknown time unit.
+    """
+
+    unit = unit.lower()
+
+    if unit == 'millisecond':
+        return value / 1000.0 / 60.0
+    elif unit == 'second':
+        return value / 60.0
+    elif unit == 'minute':
+        return value
+    elif unit == 'hour':
+        return value * 60.0
+    else:
+        raise MZMLreaderError(f"Time unit '{unit}' unknown")
+
+
+PRECURSOR_ACCESSIONS = {'selected_ion_mz': 'MS:1000744',
+                        'charge': 'MS:1000041',
+                        'isolation_target_mz': 'MS:1000827',
+                        'isolation_lower_offset': 'MS:1000828',
+                        'isolation_upper_offset': 'MS:1000829'}
+"""Accessions of the cvParams of a spectrum's precursor."""
+
+
+def _first_float(value) -> float:
+    """Converts the first of a cvParam's values to a float, or NaN if it has no value."""
+
+    if isinstance(value, list):
+        value = value[0] if value else None
+
+    if value is None or value is True or value == '':
+        return np.nan
+
+    return float(value)
+
+
+def precursor_values(get_value: Callable[[str], Any]) -> Tuple[float, int, float, float]:
+    """Extracts the values of the (first) precursor of a spectrum.
+
+    The isolation window is centered on the precursor m/z if its target m/z is not recorded.
+
+    Args:
+        get_value: Gets the value of a spectrum's cvParam by accession, as pymzml's `Spectrum.get`.
+
+    Returns:
+        A tuple of precursor m/z, precursor charge, and the minimum and maximum m/z of the isolation window.
+        Values not recorded are NaN, and a charge of 0.
+    """
+
+    values = {name: _first_float(get_value(accession)) for name, accession in PRECURSOR_ACCESSIONS.items()}
+
+    precursor_mz = values['selected_ion_mz']
+    charge = values['charge']
+
+    target_mz = values['isolation_target_mz']
+    if np.isnan(target_mz):
+        target_mz = precursor_mz
+
+    return (precursor_mz,
+            0 if np.isnan(charge) else int(charge),
+            target_mz - values['isolation_lower_offset'],
+            target_mz + values['isolation_upper_offset'])
+
+
+class MZMLindex:
+    """Random access to the spectra of an mzML file through their byte offsets.
+
+    Offsets are read from the index list of an indexedmzML file.
+    For mzML files without an index, offsets are found by scanning the file for spectrum elements.
+    An instance holds no open file handles, so it can be pickled.
+    """
+
+    mzml_file_path: str
+    """A string representation of the path to the mzML file."""
+
+    spec_ids: List
+    """The native ID of each spectrum, in file order."""
+
+    offsets: np.ndarray
+    """The byte offset of each spectrum element, in file order."""
+
+    obo_version: str
+    """The version of the PSI-MS controlled vocabulary used to read spectra."""
+
+    def __init__(self,
+                 mzml_file_path: str,
+                 obo_version: str = None):
+        """Initializes an instance of MZMLindex class.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML data file.
+                Path can be relative or absolute.
+            obo_version: The version of the PSI-MS controlled vocabulary used by the mzML file.
+                Use the version found by a pymzml Reader of the file, to read spectra identically.
+        """
+
+        self.mzml_file_path = mzml_file_path
+        self.obo_version = obo_version
+
+        with open(self.mzml_file_path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+            id_strings, offsets = self._read_index(mm)
+
+            if id_strings is None:
+                logger.info(f"No spectrum offset index, scanning file: {self.mzml_file_path}")
+                id_strings, offsets = self._scan_offsets(mm)
+
+        self.spec_ids = [native_id(id_string) for id_string in id_strings]
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+        self._positions = None
+
+    def __len__(self):
+        return len(self.spec_ids)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_positions'] = None
+        return state
+
+    @staticmethod
+    def _read_index(mm):
+        """Reads spectrum ids and offsets from the index list of an indexedmzML file.
+
+        Returns:
+            A tuple of id strings and offsets, or (None, None) if the index is missing or invalid.
+        """
+
+        match = _INDEX_LIST_OFFSET.search(mm, max(0, len(mm) - _TAIL_SIZE))
+        if match is None:
+            return None, None
+
+        index_match = _SPECTRUM_INDEX.search(mm, int(match.group(1)))
+        if index_match is None:
+            return None, None
+
+        id_strings = []
+        offsets = []
+        for offset_match in _INDEX_OFFSET.finditer(index_match.group(1)):
+            id_strings.append(_xml_value(offset_match.group(1)))
+            offsets.append(int(offset_match.group(2)))
+
+        # Ensure the index agrees with the file contents
+        if offsets and mm[offsets[0]:offsets[0] + 9] != b'<spectrum':
+            logger.warning("Invalid spectrum offset index")
+            return None, None
+
+        return id_strings, offsets
+
+    @staticmethod
+    def _scan_offsets(mm):
+        """Finds spectrum ids and offsets by scanning an mzML file for spectrum elements."""
+
+        id_strings = []
+        offsets = []
+        for tag_match in _SPECTRUM_TAG.finditer(mm):
+            attributes = dict(_ATTRIBUTE.findall(tag_match.group(0)))
+            id_strings.append(_xml_value(attributes[b'id']))
+            offsets.append(tag_match.start())
+
+        return id_strings, offsets
+
+    def position(self, spec_id) -> int:
+        """Get the file order position of a spectrum.
+
+        Raises:
+            KeyError: If the spectrum ID is not in the index.
+        """
+
+        if self._positions is None:
+            self._positions = {spec_id: n for n, spec_id in enumerate(self.spec_ids)}
+
+        return self._positions[spec_id]
+
+    @staticmethod
+    def _parse_header(header: bytes) -> Dict:
+        """Parses spectrum values from the XML preceding a spectrum's binary data arrays."""
+
+        attributes = dict(_ATTRIBUTE.findall(_SPECTRUM_TAG.match(header).group(0)))
+
+        # First occurrence of each cvParam accession
+        params = {}
+        for param_match in _CV_PARAM.finditer(header):
+            param = dict(_ATTRIBUTE.findall(param_match.group(0)))
+            params.setdefault(param.get(b'accession'), param)
+
+        def value(accession, default=None):
+            param = params.get(accession)
+            return default if param is None else _xml_value(param.get(b'value', b''))
+
+        rt_param = params.get(b'MS:1000016')
+        if rt_param is None:
+            rt = None
+        else:
+            rt = scan_time_in_minutes(float(rt_param[b'value']), _xml_value(rt_param.get(b'unitName', b'unicorns')))
+
+        def float_value(accession):
+            param_value = value(accession)
+            return None if param_value is None else float(param_value)
+
+        ms_lvl = value(b'MS:1000511')
+        precursor_mz, precursor_charge, isolation_mz_min, isolation_mz_max = \
+            precursor_values(lambda accession: value(accession.encode()))
+
+        return {'id': native_id(_xml_value(attributes[b'id'])),
+                'rt': rt,
+                'peak_count': int(attributes.get(b'defaultArrayLength', 0)),
+                'tic': float_value(b'MS:1000285'),
+                'ms_lvl': None if ms_lvl is None else int(ms_lvl),
+                'filters': value(b'MS:1000512'),
+                'precursor_mz': precursor_mz,
+                'precursor_charge': precursor_charge,
+                'isolation_mz_min': isolation_mz_min,
+                'isolation_mz_max': isolation_mz_max,
+                'base_peak_mz': float_value(b'MS:1000504'),
+                'base_peak_i': float_value(b'MS:1000505'),
+                'mz_min': float_value(b'MS:1000528'),
+                'mz_max': float_value(b'MS:1000527')}
+
+    def read_headers(self) -> List[Dict]:
+        """Reads the values of all spectra from their XML headers, without reading their binary data arrays.
+
+        Returns:
+            A list with a dictionary of values for each spectrum (id, rt, peak_count, tic, ms_lvl, filters),
+            its precursor (precursor_mz, precursor_charge, isolation_mz_min, isolation_mz_max),
+            and the base peak and observed m/z range recorded by the mzML file, if any
+            (base_peak_mz, base_peak_i, mz_min, mz_max).
+        """
+
+        headers = []
+
+        with open(self.mzml_file_path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+            for offset in self.offsets.tolist():
+                end = mm.find(b'</spectrum>', offset)
+                header_end = mm.find(b'<binaryDataArrayList', offset, end)
+
+                headers.append(self._parse_header(mm[offset:end if header_end == -1 else header_end]))
+
+        return headers
+
+    def read_spectrum(self,
+                      spec_id,
+                      backend: str = 'pymzml'):
+        """Reads a single spectrum from the mzML file.
+
+        Args:
+            spec_id: The native ID of the spectrum.
+            backend: (`pymzml`, `native`) The reader backend used to create the spectrum.
+
+        Returns:
+            A pymzml spectrum, or a `NativeSpectrum`.
+
+        Raises:
+            KeyError: If the spectrum ID is not in the index.
+        """
+
+        offset = int(self.offsets[self.position(spec_id)])
+
+        with open(self.mzml_file_path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+            end = mm.find(b'</spectrum>', offset) + len(b'</spectrum>')
+            element = ElementTree.fromstring(mm[offset:end])
+
+        if backend == 'native':
+            return NativeSpectrum(element)
+
+        parse_obo(self.obo_version)
+        return pymzml.spec.Spectrum(element, obo_version=self.obo_version)
+
+
+_BINARY_DTYPES = {'MS:1000521': np.float32,
+                  'MS:1000523': np.float64,
+                  'MS:1000519': np.int32,
+                  'MS:1000522': np.int64}
+"""NumPy dtypes of binary data array types (32/64-bit float, 32/64-bit integer) by accession."""
+
+_ARRAY_NAMES = {'MS:1000514': 'mz',
+                'MS:1000515': 'i',
+                'MS:1000595': 'time'}
+"""Names of binary data arrays (m/z, intensity, time) by accession."""
+
+_ZLIB = 'MS:1000574'
+_NO_COMPRESSION = 'MS:1000576'
+
+
+def _local_name(tag: str) -> str:
+    """Get the tag name of an XML element without its namespace."""
+
+    return tag.rpartition('}')[2]
+
+
+def _param_value(values: List[str]):
+    """Converts the values of cvParams sharing an accession, as done by pymzml's `Spectrum.get`.
+
+    Values are converted to floats if possible, a single value is returned as is,
+    and an empty value is returned as ``True``.
+    """
+
+    converted = []
+    for value in values:
+        try:
+            converted.append(float(value))
+        except ValueError:
+            converted.append(value)
+
+    if len(converted) == 0:
+        return None
+    elif len(converted) == 1:
+        value = converted[0]
+        return True if value == "" else value
+    else:
+        return converted
+
+
+def decode_binary(text: str,
+                  dtype,
+                  compression: str) -> np.ndarray:
+    """Decodes a base64 encoded (and optionally zlib compressed) binary data array into a NumPy array.
+
+    Args:
+        text: The base64 encoded text of the binary element.
+        dtype: The NumPy dtype of the array values.
+        compression: The accession of the compression type.
+
+    Returns:
+        The decoded array. An empty float64 array is returned if there is no data, as done by pymzml.
+
+    Raises:
+        MZMLreaderError: For unsupported compression types (such as MS-Numpress).
+    """
+
+    data = base64.b64decode(text) if text else b''
+
+    if len(data) == 0:
+        return np.array([])
+
+    if compression == _ZLIB:
+        data = zlib.decompress(data)
+    elif compression != _NO_COMPRESSION:
+        raise MZMLreaderError(f"Unsupported binary data compression: {compression}")
+
+    return np.frombuffer(data, dtype)
+
+
+def _binary_data_array(element: ElementTree.Element) -> Tuple[Optional[str], Tuple, Optional[str]]:
+    """Reads the encoded data and encoding parameters of a binary data array element.
+
+    Returns:
+        A tuple of the array name (``None`` if not a known array type),
+        the arguments to `decode_binary` (text, dtype, compression), and the unit name of the array, if any.
+    """
+
+    array_name = None
+    dtype = None
+    compression = None
+    text = None
+    unit = None
+
+    for child in element:
+        name = _local_name(child.tag)
+
+        if name == 'cvParam':
+            accession = child.get('accession')
+
+            if accession in _ARRAY_NAMES:
+                array_name = _ARRAY_NAMES[accession]
+                unit = child.get('unitName')
+            elif accession in _BINARY_DTYPES:
+                dtype = _BINARY_DTYPES[accession]
+            elif accession == _ZLIB or accession == _NO_COMPRESSION:
+                compression = accession
+            elif 'compression' in child.get('name', ''):
+                compression = child.get('name')
+
+        elif name == 'binary':
+            text = child.text
+
+    return array_name, (text, dtype, compression), unit
+
+
+class NativeSpectrum:
+    """A spectrum read by the native reader backend.
+
+    Values are extracted from the spectrum's XML element when created, so the element can be cleared.
+    Binary data arrays are decoded when `mz` or `i` are first accessed.
+    Provides the subset of the pymzml `Spectrum` interface used by msAI, returning identical values.
+    """
+
+    def __init__(self, element: ElementTree.Element):
+        """Initializes an instance of NativeSpectrum class.
+
+        Args:
+            element: The XML element of the spectrum.
+        """
+
+        self.ID = native_id(element.get('id'))
+
+        self._ms_level = None
+        self._scan_time = None
+        self._tic = None
+        self._params = {}
+        self._arrays = {}
+        self._decoded = {}
+
+        for child in element:
+            # TIC is only read from the spectrum's own cvParams
+            if _local_name(child.tag) == 'cvParam' and child.get('accession') == 'MS:1000285':
+                self._tic = child.get('value')
+                break
+
+        for sub_element in element.iter():
+            name = _local_name(sub_element.tag)
+
+            if name == 'cvParam':
+                accession = sub_element.get('accession')
+                self._params.setdefault(accession, []).append(sub_element.get('value', ''))
+
+                if accession == 'MS:1000511' and self._ms_level is None:
+                    self._ms_level = int(sub_element.get('value'))
+                elif accession == 'MS:1000016' and self._scan_time is None:
+                    self._scan_time = (float(sub_element.get('value')), sub_element.get('unitName', 'unicorns'))
+
+            elif name == 'binaryDataArray':
+                self._read_binary_data_array(sub_element)
+
+    def _read_binary_data_array(self, element: ElementTree.Element):
+        """Stores the encoded data and encoding parameters of a binary data array."""
+
+        array_name, encoded, unit = _binary_data_array(element)
+
+        if array_name is not None:
+            self._arrays[array_name] = encoded
+
+    def _array(self, array_name: str) -> np.ndarray:
+        """Get a decoded binary data array."""
+
+        if array_name not in self._decoded:
+            if array_name in self._arrays:
+                self._decoded[array_name] = decode_binary(*self._arrays[array_name])
+            else:
+                self._decoded[array_name] = np.array([])
+
+        return self._decoded[array_name]
+
+    @property
+    def mz(self) -> np.ndarray:
+        """Get the m/z values of the spectrum."""
+
+        return self._array('mz')
+
+    @property
+    def i(self) -> np.ndarray:
+        """Get the intensity values of the spectrum."""
+
+        return self._array('i')
+
+    @property
+    def ms_level(self):
+        """Get the MS level of the spectrum."""
+
+        return self._ms_level
+
+    @property
+    def TIC(self) -> float:
+        """Get the total ion current of the spectrum.
+
+        Raises:
+            AttributeError: If the spectrum has no TIC value (as raised by pymzml).
+        """
+
+        if self._tic is None:
+            raise AttributeError("Spectrum has no TIC value")
+
+        return float(self._tic)
+
+    def scan_time_in_minutes(self) -> float:
+        """Get the retention time of the spectrum in minutes."""
+
+        return scan_time_in_minutes(*self._scan_time)
+
+    def get(self, name: str, default=None):
+        """Get the value of a cvParam by accession, or by one of the names used by msAI.
+
+        Values are returned as done by pymzml's `Spectrum.get`.
+        """
+
+        accession = _PARAM_ACCESSIONS.get(name, name)
+        value = _param_value(self._params.get(accession, []))
+
+        return default if value is None else value
+
+
+_PARAM_ACCESSIONS = {'filter string': 'MS:1000512'}
+"""Accessions of cvParams accessed by name through `NativeSpectrum.get`."""
+
+
+class NativeReader:
+    """A reader of mzML files that decodes binary data arrays directly into NumPy arrays.
+
+    The mzML file is parsed incrementally, and each spectrum's XML element is cleared once read,
+    so memory use does not grow with the file size.
+    Iterating a NativeReader yields `NativeSpectrum` instances, matching the values of a pymzml `Reader`.
+    """
+
+    info: Dict
+    """Run information (run_id, start_time, mzml_version, spectrum_count), as given by a pymzml `Reader`."""
+
+    def __init__(self, mzml_file_path: str):
+        """Initializes an instance of NativeReader class.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML data file.
+                Path can be relative or absolute.
+        """
+
+        self.mzml_file_path = mzml_file_path
+        self.info = {'run_id': None,
+                     'start_time': None,
+                     'spectrum_count': None}
+
+        # Only the run header is read here
+        for event, element in ElementTree.iterparse(self.mzml_file_path, events=('start',)):
+            if self._read_header_element(element):
+                break
+
+    def _read_header_element(self, element: ElementTree.Element) -> bool:
+        """Reads run information from the start of a header element.
+
+        Returns:
+            A boolean indicating if the end of the header (spectrumList) has been reached.
+        """
+
+        name = _local_name(element.tag)
+
+        if name == 'mzML':
+            version = element.get('version')
+            if version:
+                self.info['mzml_version'] = version
+            else:
+                schema_location = element.get('{http://www.w3.org/2001/XMLSchema-instance}schemaLocation')
+                self.info['mzml_version'] = re.search(r"[0-9]*\.[0-9]*\.[0-9]*", schema_location).group()
+
+        elif name == 'run':
+            self.info['run_id'] = element.get('id')
+            self.info['start_time'] = element.get('startTimeStamp')
+
+        elif name == 'spectrumList':
+            count = element.get('count')
+            self.info['spectrum_count'] = int(count) if count else None
+            return True
+
+        return False
+
+    def __iter__(self) -> Iterator[NativeSpectrum]:
+        spectrum_list = None
+
+        for event, element in ElementTree.iterparse(self.mzml_file_path, events=('start', 'end')):
+            if event == 'start':
+                if spectrum_list is None and _local_name(element.tag) == 'spectrumList':
+                    spectrum_list = element
+                continue
+
+            name = _local_name(element.tag)
+
+            if name == 'spectrum':
+                spectrum = NativeSpectrum(element)
+
+                # Release the element, as all values are held by the spectrum
+                element.clear()
+                spectrum_list.remove(element)
+
+                yield spectrum
+
+            elif name == 'spectrumList':
+                break
+
+
+def read_header(mzml_file_path: str) -> Dict:
+    """Reads the run information of an mzML file, without reading any spectra.
+
+    Only the run header and the index list at the end of the file are read.
+    Values match those of an `.MZMLfile` created from the same file.
+
+    Args:
+        mzml_file_path: A string representation of the path to the mzML data file.
+            Path can be relative or absolute.
+
+    Returns:
+        A dictionary of run_id, run_date, ms_file_version, and spectrum_count.
+        The spectrum count is taken from the index list if present, otherwise from the spectrumList count.
+    """
+
+    info = NativeReader(mzml_file_path).info
+    spectrum_count = info['spectrum_count']
+
+    with open(mzml_file_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+        id_strings, offsets = MZMLindex._read_index(mm)
+
+    if id_strings is not None:
+        spectrum_count = len(id_strings)
+
+    return {'run_id': info['run_id'],
+            'run_date': info['start_time'],
+            'ms_file_version': info['mzml_version'],
+            'spectrum_count': spectrum_count}
+
+
+CHROMATOGRAM_TYPES = {'tic': 'MS:1000235',
+                      'bpc': 'MS:1000628'}
+"""Accessions of chromatogram types (total ion current, base peak) by name."""
+
+
+def _chromatogram_offsets(mm) -> List[int]:
+    """Get the byte offsets of all chromatogram elements in an mzML file.
+
+    Offsets are read from the index list of an indexedmzML file, otherwise the chromatogram list
+    (following the spectrum list) is scanned from its start.
+    """
+
+    match = _INDEX_LIST_OFFSET.search(mm, max(0, len(mm) - _TAIL_SIZE))
+
+    if match is not None:
+        index_match = _CHROMATOGRAM_INDEX.search(mm, int(match.group(1)))
+
+        if index_match is not None:
+            offsets = [int(offset_match.group(2)) for offset_match in _INDEX_OFFSET.finditer(index_match.group(1))]
+
+            # Ensure the index agrees with the file contents
+            if all(mm[offset:offset + 13] == b'<chromatogram' for offset in offsets):
+                return offsets
+
+            logger.warning("Invalid chromatogram offset index")
+
+    list_start = mm.rfind(b'<chromatogramList')
+    if list_start == -1:
+        return []
+
+    return [tag_match.start() for tag_match in _CHROMATOGRAM_TAG.finditer(mm, list_start)]
+
+
+def read_chromatogram(mzml_file_path: str,
+                      chromatogram_type: str = 'tic') -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Reads a chromatogram stored in an mzML file (such as the TIC chromatogram), without reading any spectra.
+
+    Only the chromatogram list at the end of the file is read, found through the index list if present.
+
+    Args:
+        mzml_file_path: A string representation of the path to the mzML data file.
+            Path can be relative or absolute.
+        chromatogram_type: (`tic`, `bpc`) The type of chromatogram.
+
+    Returns:
+        A tuple of the retention time (in minutes) and intensity arrays of the chromatogram,
+        or ``None`` if the mzML file has no chromatogram of the type.
+
+    Raises:
+        MZMLreaderError: For an invalid chromatogram type, or unsupported binary data compression.
+    """
+
+    if chromatogram_type not in CHROMATOGRAM_TYPES:
+        raise MZMLreaderError(f"Invalid chromatogram type: {chromatogram_type}")
+
+    accession = CHROMATOGRAM_TYPES[chromatogram_type]
+
+    with open(mzml_file_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+        for offset in _chromatogram_offsets(mm):
+            end = mm.find(b'</chromatogram>', offset) + len(b'</chromatogram>')
+            element = ElementTree.fromstring(mm[offset:end])
+
+            if not any(_local_name(child.tag) == 'cvParam' and child.get('accession') == accession
+                       for child in element):
+                continue
+
+            arrays = {}
+            for sub_element in element.iter():
+                if _local_name(sub_element.tag) == 'binaryDataArray':
+                    array_name, encoded, unit = _binary_data_array(sub_element)
+                    arrays[array_name] = (decode_binary(*encoded), unit)
+
+            time_values, time_unit = arrays.get('time', (np.array([]), 'minute'))
+            i_values, i_unit = arrays.get('i', (np.array([]), None))
+
+            rt = scan_time_in_minutes(time_values.astype(np.float64), time_unit or 'minute')
+
+            return rt, i_values.astype(np.float64)
+
+    return None
@@ -0,0 +1,229 @@
+"""msAI module for caching the parsed MS data of mzML files on disk.
+
+Features
+    * Storing parsed mzML files as columnar msAIr files, keyed by absolute path, size, mtime, and parser version
+    * Reading cached MS data with zero copies (and only the chunks accepted by a `.SpectrumFilter`)
+    * Bounding the cache size, evicting the least recently used entries
+
+"""
+
+
+import msAI.msData as msData
+import msAI.msAIrFormat as msAIrFormat
+import msAI.mzmlReader as mzmlReader
+from msAI.errors import MSAIRformatError
+from msAI.miscUtils import Saver
+
+import os
+import json
+import hashlib
+import logging
+from typing import Optional
+
+import pymzml
+
+
+logger = logging.getLogger(__name__)
+"""Module logger."""
+
+
+class ParseCache:
+    """On-disk cache of parsed mzML files, stored as columnar msAIr files.
+
+    A cache entry is keyed by the absolute path, size, and modification time of an mzML file,
+    and by the version of the parsed results, so a changed mzML file or parser is parsed again.
+    Reading a cached entry memory-maps its msAIr file, skipping XML parsing entirely.
+
+    The cache size is bounded, evicting the least recently used entries once it is exceeded.
+    Entries are written to a temporary file and renamed, so concurrent processes never read a partial entry.
+    """
+
+    cache_ext: str = '.msAIr'
+    """File extension of cache entries."""
+
+    def __init__(self,
+                 cache_dir: str,
+                 max_size_mb: float):
+        """Initializes an instance of ParseCache class.
+
+        Args:
+            cache_dir: A string representation of the path to the cache directory, created if needed.
+            max_size_mb: The maximum total size in MB of all cache entries.
+        """
+
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+
+    def __repr__(self):
+        return f"ParseCache({self.cache_dir!r}, {self.max_size_mb})"
+
+    @staticmethod
+    def key(mzml_file_path: str) -> str:
+        """Get the cache key of an mzML file.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML file.
+
+        Returns:
+            A sha256 hash of the absolute path, size, modification time, and parser version as a string.
+        """
+
+        file_stat = os.stat(mzml_file_path)
+
+        key_values = {'path': os.path.abspath(mzml_file_path),
+                      'size': file_stat.st_size,
+                      'mtime_ns': file_stat.st_mtime_ns,
+                      'parser_version': mzmlReader.PARSER_VERSION,
+                      'pymzml_version': pymzml.__version__,
+                      'msAIr_version': msAIrFormat.FORMAT_VERSION}
+
+        return hashlib.sha256(json.dumps(key_values, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def entry_path(self, mzml_file_path: str) -> str:
+        """Get the path of the cache entry of an mzML file."""
+
+        return os.path.join(self.cache_dir, self.key(mzml_file_path) + self.cache_ext)
+
+    def load(self,
+             mzml_file_path: str,
+             spectrum_filter: Optional[msData.SpectrumFilter] = None) -> Optional[msData.MSAIRfile]:
+        """Loads the cached MS data of an mzML file, if any.
+
+        Unreadable entries are removed.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML file.
+            spectrum_filter: Filters spectra and peaks, reading only the chunks of spectra which may be accepted.
+
+        Returns:
+            The cached MS data as a `.MSAIRfile`, or ``None`` if not cached.
+        """
+
+        entry_path = self.entry_path(mzml_file_path)
+
+        try:
+            ms_file = msData.MSAIRfile(entry_path, spectrum_filter)
+
+        except FileNotFoundError:
+            return None
+
+        except (MSAIRformatError, ValueError, KeyError) as err:
+            logger.warning(f"Removing unreadable parse cache entry: {entry_path}, {err!r}")
+            self._remove(entry_path)
+            return None
+
+        # Modification time marks the last use of an entry, for LRU eviction
+        os.utime(entry_path)
+
+        return ms_file
+
+    def store(self,
+              ms_file: msData.MSfile,
+              mzml_file_path: str) -> Optional[str]:
+        """Stores the parsed MS data of an mzML file in the cache, then evicts entries if the cache is full.
+
+        Failures to write are logged, as the cache is optional.
+
+        Args:
+            ms_file: The MS data parsed from the mzML file.
+            mzml_file_path: A string representation of the path to the mzML file.
+
+        Returns:
+            The path of the cache entry, or ``None`` if it could not be written.
+        """
+
+        entry_path = self.entry_path(mzml_file_path)
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            with Saver.replacing(entry_path) as temp_path:
+                msData.MSAIRfile.write(ms_file, temp_path)
+
+        except OSError as err:
+            logger.warning(f"Unable to write parse cache entry for {mzml_file_path}: {err!r}")
+            return None
+
+        self.evict()
+
+        return entry_path
+
+    def read_mzml(self,
+                  mzml_file_path: str,
+                  spectrum_filter: Optional[msData.SpectrumFilter] = None,
+                  backend: str = 'pymzml') -> msData.MSfile:
+        """Reads the MS data of an mzML file from the cache, parsing and caching it if not cached.
+
+        The full mzML file is parsed and cached, so later reads may use any `spectrum_filter`.
+
+        Args:
+            mzml_file_path: A string representation of the path to the mzML file.
+            spectrum_filter: Filters spectra and peaks of the MS data returned.
+            backend: (`pymzml`, `native`) The reader backend used to parse the mzML file.
+
+        Returns:
+            The MS data, as a `.MSAIRfile` if cached.
+        """
+
+        ms_file = self.load(mzml_file_path, spectrum_filter)
+
+        if ms_file is not None:
+            logger.info(f"Parse cache hit for: {mzml_file_path}")
+            return ms_file
+
+        ms_file = msData.MZMLfile(mzml_file_path, backend=backend)
+
+        if self.store(ms_file, mzml_file_path) is not None:
+            cached_ms_file = self.load(mzml_file_path, spectrum_filter)
+
+            if cached_ms_file is not None:
+                return cached_ms_file
+
+        if spectrum_filter is not None:
+            ms_file.apply_filter(spectrum_filter)
+
+        return ms_file
+
+    def size_mb(self) -> float:
+        """Get the total size in MB of all cache entries."""
+
+        return sum(entry.stat().st_size for entry in self._entries()) / 1e6
+
+    def _entries(self):
+        """Get the cache entries as `os.DirEntry` objects."""
+
+        if not os.path.isdir(self.cache_dir):
+            return []
+
+        return [entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith(self.cache_ext)]
+
+    def evict(self):
+        """Removes the least recently used cache entries, until the cache is within its maximum size."""
+
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        cache_size = sum(entry.stat().st_size for entry in entries)
+        max_size = self.max_size_mb * 1e6
+
+        for entry in entries:
+            if cache_size <= max_size:
+                break
+
+            logger.info(f"Evicting parse cache entry: {entry.path}")
+            cache_size -= entry.stat().st_size
+            self._remove(entry.path)
+
+    def clear(self):
+        """Removes all cache entries."""
+
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path: str):
+        """Removes a file, ignoring files already removed (such as by another process)."""
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -6,25 +6,36 @@ Features
     * Pairing of MS data and sample metadata
     * Extraction of sample metadata from csv files
     * Saving / loading data (serialization, compression, checksum)
+    * Incremental, resumable saving of MS data, skipping runs with a current .msAIr file
+    * Limiting the memory used by MS data, releasing the least recently used
+    * Extracting ion chromatograms (XICs) and their areas from all samples in parallel
 
 Todo
     * init_ms mp logging calls
-    * Create a msFile subclass form msAIr files - and move loading to that class
 
 """
 
 
 import msAI
 import msAI.msData as msData
-from msAI.errors import SampleRunMSinitError
+import msAI.msAIrFormat as msAIrFormat
+from msAI.errors import SampleRunError, SampleRunMSinitError, MSAIRformatError, MSdataError
 from msAI.miscUtils import Saver, MultiTaskDF
+from msAI.parseCache import ParseCache
 from msAI.miscDecos import log_timer
 from msAI.types import Series
 
 import logging
 import os
+import json
+import hashlib
+import copy
+import multiprocessing
+from collections import OrderedDict
 from functools import partial
+from typing import Iterator, NamedTuple, Optional
 
+import numpy as np
 import pandas as pd
 
 
@@ -32,6 +43,22 @@ logger = logging.getLogger(__name__)
 """Module logger."""
 
 
+class BatchXIC(NamedTuple):
+    """Ion chromatograms (XICs) of target ions extracted from all samples of a `SampleSet`, on a common rt grid."""
+
+    samples: pd.Index
+    """The samples, as indexed in the SampleSet."""
+
+    targets: pd.Index
+    """The target ions, as indexed in the target table."""
+
+    rt: np.ndarray
+    """The retention times of the common grid."""
+
+    intensities: np.ndarray
+    """The intensity of each target ion at each retention time (shape: samples x targets x rt)."""
+
+
 class SampleSet:
     """Class to create a dataframe of a set of SampleRuns created from a MSfileSet and paired with 0 or more SampleMetadata.
 
@@ -43,34 +70,50 @@ class SampleSet:
 
     SampleRun objects are created for each MS file when the SampleSet is created,
     but MS data is not initialized until called.
+    With a memory budget (see `MemoryBudget`), MS data is initialized as each SampleRun is accessed,
+    and the MS data of the least recently used SampleRuns is released to stay within budget.
     """
 
     @log_timer
-    def __init__(self, ms_file_set, *sample_metadata, metadata_inner_merge=False, init_ms=False):
+    def __init__(self, ms_file_set, *sample_metadata, metadata_inner_merge=False, init_ms=False,
+                 memory_budget_mb=None):
         self._ms_file_set = ms_file_set
         self._metadata_tuple = sample_metadata
+        self._metadata_inner_merge = metadata_inner_merge
+        self._memory_budget = None
+
+        self._df = self._create_samples(self._ms_file_set.df)
 
-        self._df = self._ms_file_set.df
+        if memory_budget_mb is not None:
+            self.set_memory_budget(memory_budget_mb)
+
+        if init_ms:
+            self.init_all_ms()
+
+    def __repr__(self):
+        return self.df.to_string()
+
+    def _create_samples(self, file_df):
+        """Creates a dataframe of SampleRuns paired with sample metadata, from a dataframe of MS files."""
+
+        # A shallow copy, so the MSfileSet dataframe is not given a run column
+        df = file_df.copy(deep=False)
 
         # Create a dataframe of sample files paired with sample metadata
         for metadata in self._metadata_tuple:
-            if metadata_inner_merge:
-                self._df = pd.concat([self._df, metadata.df], axis=1, join='inner')
+            if self._metadata_inner_merge:
+                df = pd.concat([df, metadata.df], axis=1, join='inner')
             else:
-                self._df = pd.merge(self._df, metadata.df, how='left', left_index=True, right_index=True)
+                df = pd.merge(df, metadata.df, how='left', left_index=True, right_index=True)
 
         # Create SampleRuns for the samples in the set
-        self._create_sampleruns()
+        df = self._create_sampleruns(df)
 
         # Apply metadata to SampleRuns for samples in the set with metadata
         for metadata in self._metadata_tuple:
-            self._df.apply(lambda row: self._set_run_metadata(row.name, row['run'], metadata), axis=1)
-
-        if init_ms:
-            self.init_all_ms()
+            df.apply(lambda row: self._set_run_metadata(row.name, row['run'], metadata), axis=1)
 
-    def __repr__(self):
-        return self.df.to_string()
+        return df
 
     @staticmethod
     def _set_run_metadata(sample_name, run, metadata):
@@ -87,22 +130,26 @@ class SampleSet:
             dir_path, file = os.path.split(metadata.file_path)
             logger.warning(f"Missing metadata from: {file}, for MS file: {sample_name}")
 
-    def _create_sampleruns(self):
-        """Creates of SampleRuns for all samples in the SampleSet.
+    def _create_sampleruns(self, df):
+        """Creates of SampleRuns for all samples in a dataframe of the SampleSet.
 
         Multi or single process according to MP_SUPPORT.
         """
 
+        if df.shape[0] == 0:
+            return df.assign(run=pd.Series(dtype=object))
+
         if msAI.MP_SUPPORT:
-            self._create_sampleruns_mp()
+            return self._create_sampleruns_mp(df)
         else:
-            self._create_sampleruns_sp()
+            return self._create_sampleruns_sp(df)
 
     @log_timer
-    def _create_sampleruns_sp(self):
-        """Single-process creation of SampleRuns for all samples in the SampleSet."""
+    def _create_sampleruns_sp(self, df):
+        """Single-process creation of SampleRuns for all samples in a dataframe of the SampleSet."""
 
-        self._df['run'] = self._df.apply(lambda row: SampleRun(row['path']), axis=1)
+        df['run'] = df.apply(lambda row: SampleRun(row['path']), axis=1)
+        return df
 
     @staticmethod
     def _create_samplerun_mpf(row):
@@ -112,48 +159,86 @@ class SampleSet:
         return row
 
     @log_timer
-    def _create_sampleruns_mp(self):
-        """Multiprocess creation of SampleRuns for all samples in the SampleSet."""
+    def _create_sampleruns_mp(self, df):
+        """Multiprocess creation of SampleRuns for all samples in a dataframe of the SampleSet."""
 
-        self._df = MultiTaskDF.parallelize_on_rows(self._df, self._create_samplerun_mpf)
+        return MultiTaskDF.parallelize_on_rows(df, self._create_samplerun_mpf)
 
     @log_timer
-    def _init_all_ms_sp(self):
-        """Single-process initialization of MS data for all samples in the SampleSet."""
+    def _init_all_ms_sp(self, spectrum_filter=None, mzml_backend='pymzml', names=None, use_cache=False):
+        """Single-process initialization of MS data for all (or the named) samples in the SampleSet."""
 
-        self._df['run'].apply(SampleRun.init_ms)
+        runs = self._df['run'] if names is None else self._df.loc[names, 'run']
+        runs.apply(SampleRun.init_ms, spectrum_filter=spectrum_filter, mzml_backend=mzml_backend, use_cache=use_cache)
 
     @staticmethod
-    def _init_ms_mpf(row):
-        """Multiprocessing function to initialize the MS data of a single SampleRun (a row of a SampleSet)."""
+    def _init_ms_mpf(spectrum_filter, mzml_backend, use_cache, row):
+        """Multiprocessing function to initialize the MS data of a single SampleRun (a row of a SampleSet).
+
+        In a worker process, MS data is returned as a `.MSAIRhandle` (if MS_TRANSPORT_DIR is set),
+        rather than pickled.
+        """
+
+        row['run'].init_ms(spectrum_filter, mzml_backend, use_cache)
+
+        if msAI.MS_TRANSPORT_DIR is not None and multiprocessing.parent_process() is not None:
+            row['run']._share_ms(msAI.MS_TRANSPORT_DIR)
 
-        row['run'].init_ms()
         return row
 
     @log_timer
-    def _init_all_ms_mp(self):
-        """Multiprocess initialization of MS data for all samples in the SampleSet."""
+    def _init_all_ms_mp(self, spectrum_filter=None, mzml_backend='pymzml', names=None, use_cache=False):
+        """Multiprocess initialization of MS data for all (or the named) samples in the SampleSet."""
+
+        init_ms_mpf = partial(self._init_ms_mpf, spectrum_filter, mzml_backend, use_cache)
 
-        self._df = MultiTaskDF.parallelize_on_rows(self._df, self._init_ms_mpf)
+        if names is None:
+            self._df = MultiTaskDF.parallelize_on_rows(self._df, init_ms_mpf, cost='file_size')
+        elif len(names) > 0:
+            init_df = MultiTaskDF.parallelize_on_rows(self._df.loc[names], init_ms_mpf, cost='file_size')
+            self._df.loc[names, 'run'] = init_df['run']
+
+        # Open MS data shared by worker processes
+        runs = self._df['run'] if names is None else self._df.loc[names, 'run']
+        for run in runs:
+            run._open_shared_ms()
+
+    @staticmethod
+    def _save_ms(dir_path, msAIr_version, compression, incremental, row):
+        """Saves the MS data of a single SampleRun (a row of a SampleSet), returning the hash of its msAIr file."""
+
+        if incremental:
+            return row['run'].save_incremental(dir_path, row.name, msAIr_version, compression)
+
+        return row['run'].save(dir_path, row.name, msAIr_version, compression)
 
     @log_timer
-    def _save_all_ms_sp(self, dir_path):
+    def _save_all_ms_sp(self, dir_path, msAIr_version=msAIrFormat.FORMAT_VERSION, compression=None,
+                        incremental=False):
         """Single-process save of MS data for all samples in the SampleSet."""
 
-        self._df['msAIr_hash'] = self._df.apply(lambda row: row['run'].save(dir_path, row.name), axis=1)
+        self._df['msAIr_hash'] = self._df.apply(
+            partial(self._save_ms, dir_path, msAIr_version, compression, incremental), axis=1)
 
     @staticmethod
-    def _save_ms_mpf(dir_path, row):
-        """Multiprocessing function to save the MS data of a single SampleRun (a row of a SampleSet)."""
+    def _save_ms_mpf(dir_path, msAIr_version, compression, incremental, row):
+        """Multiprocessing function to save the MS data of a single SampleRun (a row of a SampleSet).
 
-        row['msAIr_hash'] = row['run'].save(dir_path, row.name)
-        return row
+        Only the hash is returned, rather than the SampleRun and its MS data.
+        """
+
+        return pd.Series({'msAIr_hash': SampleSet._save_ms(dir_path, msAIr_version, compression, incremental, row)},
+                         name=row.name)
 
     @log_timer
-    def _save_all_ms_mp(self, dir_path):
+    def _save_all_ms_mp(self, dir_path, msAIr_version=msAIrFormat.FORMAT_VERSION, compression=None,
+                        incremental=False):
         """Multiprocess save of MS data for all samples in the SampleSet."""
 
-        self._df = MultiTaskDF.parallelize_on_rows(self._df, partial(self._save_ms_mpf, dir_path))
+        saved_df = MultiTaskDF.parallelize_on_rows(self._df, partial(self._save_ms_mpf, dir_path,
+                                                                     msAIr_version, compression, incremental),
+                                                   cost='file_size')
+        self._df['msAIr_hash'] = saved_df['msAIr_hash']
 
     @property
     def df(self):
@@ -165,29 +250,244 @@ class SampleSet:
 
         return self._df
 
-    def init_all_ms(self):
+    def init_all_ms(self, spectrum_filter=None, mzml_backend='pymzml', use_cache=False):
         """Initializes MS data for all samples in the SampleSet.
 
         Multi or single process according to MP_SUPPORT.
+
+        Args:
+            spectrum_filter: An optional `.SpectrumFilter` to initialize only a subset of each sample's MS data.
+            mzml_backend: (`pymzml`, `native`) The reader backend used to read .mzML files.
+            use_cache: A boolean indicating if .mzML files are read through the parse cache, if enabled
+                (see `SampleRun.init_ms`).
+
+        With multiprocessing, the MS data of each SampleRun may be a `.MSAIRfile`, rather than a `.MZMLfile`
+        (see `SampleRun.ms`).
         """
 
-        if msAI.MP_SUPPORT:
-            self._init_all_ms_mp()
+        if self._memory_budget is not None:
+            # MS data is initialized as each SampleRun is accessed
+            for run in self._df['run']:
+                run._release_ms()
+                run._load_args = (spectrum_filter, mzml_backend, use_cache)
+
+            logger.info(f"MS data will be initialized on access, within {self._memory_budget}")
+
+        elif msAI.MP_SUPPORT:
+            self._init_all_ms_mp(spectrum_filter, mzml_backend, use_cache=use_cache)
         else:
-            self._init_all_ms_sp()
+            self._init_all_ms_sp(spectrum_filter, mzml_backend, use_cache=use_cache)
+
+    @property
+    def memory_budget(self):
+        """Get the `MemoryBudget` limiting the MS data of the SampleSet held in memory, if any."""
+
+        return self._memory_budget
+
+    def set_memory_budget(self, max_mb=None):
+        """Sets a memory budget, limiting the total memory size of MS data of all samples in the SampleSet.
+
+        MS data already initialized is added to the budget (releasing the least recently used, if over budget).
+        With a budget set, `init_all_ms` sets how MS data is initialized, which is then done as each sample is accessed.
+
+        Args:
+            max_mb: The maximum total memory size in MB of MS data, or ``None`` to remove the budget.
+        """
+
+        self._memory_budget = None if max_mb is None else MemoryBudget(max_mb)
+
+        for run in self._df['run']:
+            self._set_run_budget(run)
+
+    def _set_run_budget(self, run):
+        """Sets the memory budget of a SampleRun, adding any initialized MS data to it."""
+
+        run._budget = self._memory_budget
+
+        if self._memory_budget is not None and run._ms is not None:
+            self._memory_budget.add(run)
+
+    def refresh(self, init_ms=False, spectrum_filter=None, mzml_backend='pymzml', use_cache=False):
+        """Updates the SampleSet with the MS files added, removed, and modified since its MSfileSet was last scanned.
+
+        The MSfileSet is refreshed (see `.MSfileSet.refresh`), then SampleRuns are
+        created (and paired with metadata) for added files only, and removed for removed files.
+        Modified files have their file information updated, and any initialized MS data released
+        (MS data initialized before is initialized again when next accessed).
+
+        Args:
+            init_ms: A boolean indicating if MS data is initialized for added and modified samples.
+            spectrum_filter: An optional `.SpectrumFilter` to initialize only a subset of each sample's MS data.
+            mzml_backend: (`pymzml`, `native`) The reader backend used to read .mzML files.
+            use_cache: A boolean indicating if .mzML files are read through the parse cache, if enabled.
+
+        Returns:
+            The `.ScanDelta` of the refreshed MSfileSet.
+        """
+
+        delta = self._ms_file_set.refresh()
+        file_df = self._ms_file_set.df
+
+        removed = [name for name in delta.removed if name in self._df.index]
+        for run in self._df.loc[removed, 'run']:
+            run._release_ms()
+
+        self._df = self._df.drop(index=removed)
+
+        modified = [name for name in delta.modified if name in self._df.index]
+        self._df.loc[modified, file_df.columns] = file_df.loc[modified]
+
+        for run in self._df.loc[modified, 'run']:
+            run._release_ms()
+
+        added_df = self._create_samples(file_df.loc[delta.added])
+        for run in added_df['run']:
+            self._set_run_budget(run)
+
+        self._df = pd.concat([self._df, added_df])
+
+        if init_ms:
+            names = modified + list(added_df.index)
 
-    def save_all_ms(self, dir_path):
+            if self._memory_budget is not None:
+                for run in self._df.loc[names, 'run']:
+                    run._load_args = (spectrum_filter, mzml_backend, use_cache)
+
+            elif msAI.MP_SUPPORT:
+                self._init_all_ms_mp(spectrum_filter, mzml_backend, names, use_cache)
+            else:
+                self._init_all_ms_sp(spectrum_filter, mzml_backend, names, use_cache)
+
+        return delta
+
+    def save_all_ms(self, dir_path, msAIr_version=msAIrFormat.FORMAT_VERSION, compression=None, incremental=False):
         """Saves MS data for all samples in the set as .msAIr files (in dir_path) and add hash value to metadata (msAIr_hash).
 
         Multi or single process according to MP_SUPPORT.
+
+        An incremental save (see `SampleRun.save_incremental`) skips runs with a current .msAIr file in dir_path,
+        and records each run as it is saved, so an interrupted save resumes where it stopped when repeated.
+        MS data is initialized only for the runs saved, and the failure of a run is logged (with a hash of ``None``)
+        without stopping the save of other runs.
+
+        Args:
+            dir_path: The directory to save .msAIr files in.
+            msAIr_version: (1, 2) The msAIr format version to save, see `SampleRun.save`.
+            compression: The `.Compression` settings of legacy msAIr files,
+                defaults to `.Saver.default_compression`.
+            incremental: A boolean indicating if runs with a current .msAIr file are skipped.
+        """
+
+        if msAI.MP_SUPPORT:
+            self._save_all_ms_mp(dir_path, msAIr_version, compression, incremental)
+        else:
+            self._save_all_ms_sp(dir_path, msAIr_version, compression, incremental)
+
+    @staticmethod
+    def _target_arrays(targets, tolerance):
+        """Get the m/z, tolerance, and rt ranges of a target table as arrays (see `xic_areas`)."""
+
+        mz = targets['mz'].to_numpy(dtype=np.float64)
+
+        if 'tolerance' in targets:
+            tolerance = targets['tolerance'].to_numpy(dtype=np.float64)
+
+        rt_range = None
+        if 'rt_min' in targets or 'rt_max' in targets:
+            rt_min = targets['rt_min'].to_numpy(dtype=np.float64) if 'rt_min' in targets else np.full(len(mz), -np.inf)
+            rt_max = targets['rt_max'].to_numpy(dtype=np.float64) if 'rt_max' in targets else np.full(len(mz), np.inf)
+            rt_range = np.column_stack([np.nan_to_num(rt_min, nan=-np.inf), np.nan_to_num(rt_max, nan=np.inf)])
+
+        return mz, tolerance, rt_range
+
+    @staticmethod
+    def _extract_xics_mpf(target_arrays, tolerance_unit, agg, rt_grid, row):
+        """Multiprocessing function to extract XICs from a single SampleRun (a row of a SampleSet).
+
+        Only the peak areas (or the XICs on `rt_grid`) are returned, rather than the SampleRun and its MS data.
         """
 
+        mz, tolerance, rt_range = target_arrays
+        rt, intensities = row['run'].xics(mz, tolerance, tolerance_unit, rt_range, agg)
+
+        if rt_grid is None:
+            # Trapezoidal integration over retention time
+            result = ((intensities[:, 1:] + intensities[:, :-1]) * np.diff(rt)).sum(axis=1) * 0.5
+        else:
+            result = _interp_rows(rt_grid, rt, intensities)
+
+        return pd.Series({'xic_result': result}, name=row.name)
+
+    def _extract_all_xics(self, targets, tolerance, tolerance_unit, agg, rt_grid):
+        """Extracts XICs of a target table from all samples, returning the stacked result of each sample."""
+
+        target_arrays = self._target_arrays(targets, tolerance)
+        extract_xics_mpf = partial(self._extract_xics_mpf, target_arrays, tolerance_unit, agg, rt_grid)
+
         if msAI.MP_SUPPORT:
-            self._save_all_ms_mp(dir_path)
+            # Runs are passed without MS data read from msAIr files, which workers map from the same file
+            #   * Other MS data in memory is pickled with its run
+            task_df = self._df[['file_size']].assign(run=[run._shared_copy() for run in self._df['run']])
+            result_df = MultiTaskDF.parallelize_on_rows(task_df, extract_xics_mpf, cost='file_size')
         else:
-            self._save_all_ms_sp(dir_path)
+            result_df = self._df.apply(extract_xics_mpf, axis=1)
+
+        result_shape = (len(targets),) if rt_grid is None else (len(targets), len(rt_grid))
+        if len(result_df) == 0:
+            return np.empty((0,) + result_shape)
+
+        return np.stack(result_df['xic_result'].to_list())
+
+    @log_timer
+    def xic_areas(self, targets, tolerance=10.0, tolerance_unit='ppm', agg='sum'):
+        """Extracts the ion chromatograms (XICs) of target ions from all samples, returning the area of each.
+
+        XICs are extracted from the MS1 spectra of each sample (see `.MSfile.xics`) and integrated over retention time.
+        With `MP_SUPPORT`, samples are extracted by worker processes, which initialize MS data that is not
+        in memory and map MS data read from msAIr files, returning only the areas.
+        Other MS data in memory (such as initialized from mzML) is pickled whole to its worker,
+        so to extract next to the data, release it or save it as msAIr files first.
+        MS data not in memory is released once extracted.
+
+        Args:
+            targets: A dataframe of target ions, indexed by target, with columns: mz,
+                and optionally tolerance, rt_min, and rt_max (missing values of rt_min and rt_max are unbounded).
+            tolerance: The m/z tolerance of all target ions, if `targets` has no tolerance column.
+            tolerance_unit: (`ppm`, `Da`) The unit of m/z tolerance.
+            agg: (`sum`, `max`) How intensities of peaks in a target's m/z window are combined within each spectrum.
+
+        Returns:
+            A dataframe of the XIC area of each target ion (columns) in each sample (index).
+        """
 
-    def save_metadata(self, dir_path, filename):
+        areas = self._extract_all_xics(targets, tolerance, tolerance_unit, agg, None)
+
+        return pd.DataFrame(areas, index=self._df.index, columns=targets.index)
+
+    @log_timer
+    def extract_xics(self, targets, rt_grid, tolerance=10.0, tolerance_unit='ppm', agg='sum'):
+        """Extracts the ion chromatograms (XICs) of target ions from all samples, on a common rt grid.
+
+        XICs of each sample are linearly interpolated onto `rt_grid` (0 outside the rt of its MS1 spectra).
+        Samples are extracted as by `xic_areas`, returning only the interpolated XICs.
+
+        Args:
+            targets: A dataframe of target ions, as passed to `xic_areas`.
+            rt_grid: The retention times of the common grid.
+            tolerance: The m/z tolerance of all target ions, if `targets` has no tolerance column.
+            tolerance_unit: (`ppm`, `Da`) The unit of m/z tolerance.
+            agg: (`sum`, `max`) How intensities of peaks in a target's m/z window are combined within each spectrum.
+
+        Returns:
+            The XICs of all samples, as a `BatchXIC`.
+        """
+
+        rt_grid = np.asarray(rt_grid, dtype=np.float64)
+        intensities = self._extract_all_xics(targets, tolerance, tolerance_unit, agg, rt_grid)
+
+        return BatchXIC(self._df.index, targets.index, rt_grid, intensities)
+
+    def save_metadata(self, dir_path, filename, compression=None):
         """Saves all metadata for a SampleSet as a .msAIm file.
 
         This enables faster loading when recreating a sample set,
@@ -196,18 +496,120 @@ class SampleSet:
         Contents will include all metadata passed at SampleSet creation + msAIr hash values (if created).
         MSfile data and SampleRuns are not included, as data paths may change.
 
-        Data is serialized with pickle and compressed via bzip2.
+        Data is serialized with pickle and compressed according to `compression`
+        (a `.Compression`, defaults to `.Saver.default_compression`).
         A sha256 hash is returned.
         """
 
         metadata = self._df.drop(columns=['file_type', 'file_size', 'path', 'run'])
 
         full_filename = (dir_path + "/" + filename + ".msAIm")
-        msAIm_hash = Saver.save_obj(metadata, full_filename)
+        msAIm_hash = Saver.save_obj(metadata, full_filename, compression)
 
         return msAIm_hash
 
 
+def _interp_rows(x, xp, fp):
+    """Linearly interpolates each row of `fp` (sampled at `xp`, increasing) at `x`, with 0 outside of `xp`."""
+
+    if len(xp) == 0:
+        return np.zeros((len(fp), len(x)))
+
+    right = np.clip(np.searchsorted(xp, x, side='right'), 1, len(xp) - 1) if len(xp) > 1 else np.zeros(len(x), int)
+    left = np.maximum(right - 1, 0)
+
+    span = xp[right] - xp[left]
+    weight = np.divide(x - xp[left], span, out=np.zeros(len(x)), where=span > 0)
+
+    values = fp[:, left] * (1 - weight) + fp[:, right] * weight
+    values[:, (x < xp[0]) | (x > xp[-1])] = 0
+
+    return values
+
+
+class MemoryBudget:
+    """Limits the total memory size of the MS data of SampleRuns, releasing the least recently used.
+
+    SampleRuns with a memory budget initialize MS data when first accessed (see `SampleRun.ms`),
+    and are added to the budget. Once the total memory size of all MS data exceeds the budget,
+    MS data of the least recently accessed SampleRuns is released, to be initialized again if accessed later.
+    With the parse cache enabled (see `.set_parse_cache`) and used, released MS data is read again from the cache.
+
+    Memory sizes are measured by `.MSfile.memory_mb`, when MS data is added, and measured again before releasing,
+    as the memory size of MS data changes as it is used (such as by creating its peaks dataframe).
+    Released MS data is only freed once no other references to it are held.
+    """
+
+    def __init__(self, max_mb: float):
+        """Initializes an instance of MemoryBudget class.
+
+        Args:
+            max_mb: The maximum total memory size in MB of MS data.
+        """
+
+        self.max_mb = max_mb
+
+        # SampleRuns with MS data in memory by id, in order of last access
+        self._runs = OrderedDict()
+        self._sizes_mb = {}
+
+    def __repr__(self):
+        return f"MemoryBudget({self.max_mb}), {len(self._runs)} runs using {self.used_mb:.1f} MB"
+
+    @property
+    def used_mb(self) -> float:
+        """Get the total memory size in MB of MS data in the budget, as last measured."""
+
+        return sum(self._sizes_mb.values())
+
+    @property
+    def run_count(self) -> int:
+        """Get the number of SampleRuns with MS data in the budget."""
+
+        return len(self._runs)
+
+    def touch(self, run: 'SampleRun'):
+        """Marks a SampleRun as the most recently accessed."""
+
+        if id(run) in self._runs:
+            self._runs.move_to_end(id(run))
+
+    def add(self, run: 'SampleRun'):
+        """Adds a SampleRun with initialized MS data, then releases MS data until within budget."""
+
+        self._runs[id(run)] = run
+        self._runs.move_to_end(id(run))
+        self._sizes_mb[id(run)] = run._ms.memory_mb()
+
+        self._release(keep=run)
+
+    def remove(self, run: 'SampleRun'):
+        """Removes a SampleRun, whose MS data was released."""
+
+        self._runs.pop(id(run), None)
+        self._sizes_mb.pop(id(run), None)
+
+    def _release(self, keep: 'SampleRun'):
+        """Releases the MS data of the least recently accessed SampleRuns (other than `keep`) until within budget."""
+
+        for run_id, run in list(self._runs.items()):
+            if run._ms is None:
+                self.remove(run)
+            else:
+                self._sizes_mb[run_id] = run._ms.memory_mb()
+
+        while self.used_mb > self.max_mb and len(self._runs) > 1:
+            run_id, run = next(iter(self._runs.items()))
+            if run is keep:
+                break
+
+            logger.debug(f"Releasing MS data of {run.file_path} ({self._sizes_mb[run_id]:.1f} MB)")
+            run._release_ms()
+
+        if self.used_mb > self.max_mb:
+            logger.warning(f"MS data of {keep.file_path} alone exceeds memory budget of {self.max_mb} MB")
+
+
 class SampleRun:
     """Holds data from a MS analysis run of a sample and any additional metadata.
 
@@ -232,6 +634,15 @@ class SampleRun:
     _metadata: Series = None
     """The metadata as a `.Series`."""
 
+    _load_args: tuple = None
+    """The arguments MS data was last initialized with, to initialize it again once released."""
+
+    _budget: 'MemoryBudget' = None
+    """The memory budget limiting MS data held in memory, if any."""
+
+    save_record_ext: str = '.json'
+    """Extension appended to the filename of a .msAIr file for the record of its incremental save."""
+
     def __init__(self, file_path):
         """Initializes an instance of SampleRun class.
 
@@ -244,12 +655,43 @@ class SampleRun:
         # self._ms = msData.MSfile()
         # self._metadata = None
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # A memory budget is local to a process
+        state.pop('_budget', None)
+
+        return state
+
     @property
     def ms(self):
-        """Access to MS data of a sample run."""
+        """Access to MS data of a sample run.
+
+        MS data that was initialized and later released (such as evicted by a `MemoryBudget`)
+        is initialized again on access, with the same arguments.
+
+        The type of MS data depends on how it was initialized. MS data initialized by a worker process
+        (by `SampleSet.init_all_ms` with MP_SUPPORT, if MS_TRANSPORT_DIR is set) is a `.MSAIRfile`
+        memory-mapping a temporary msAIr file, rather than the `.MZMLfile` initialized by `init_ms`.
+        Both provide the `.MSfile` interface, with the same spectra and peaks.
+        """
+
+        if self._ms is None and self._load_args is not None:
+            self.init_ms(*self._load_args)
+
+        elif self._budget is not None and self._ms is not None:
+            self._budget.touch(self)
 
         return self._ms
 
+    def _release_ms(self):
+        """Releases the MS data from memory, removing it from the memory budget, if any."""
+
+        self._ms = None
+
+        if self._budget is not None:
+            self._budget.remove(self)
+
     @property
     def metadata(self):
         """Access to sample metadata."""
@@ -262,6 +704,8 @@ class SampleRun:
 
         This value was generated when the SampleRun was saved,
         and re-associated from SampleSet metadata.
+        For a columnar msAIr file, it is the content hash of the file (the sha256 hash of its header),
+        which differs from a sha256 hash of the whole file.
         """
 
         if hasattr(self._metadata, 'msAIr_hash'):
@@ -269,40 +713,303 @@ class SampleRun:
         else:
             return None
 
-    def save(self, dir_path, filename):
+    def save(self, dir_path, filename, msAIr_version=msAIrFormat.FORMAT_VERSION, compression=None):
         """Save a SampleRun ms data as a msAIr file for fast loading later.
 
-        Data is serialized with pickle and compressed via bzip2.
-        A sha256 hash is returned.
+        By default, data is saved in the columnar msAIr format (version 2), which is memory-mapped when loaded.
+        The hash of a columnar msAIr file is its content hash (the sha256 hash of its header, which holds the hashes
+        of all its data), not a sha256 hash of the whole file (see `.msAIrFormat.verify`).
+        Legacy msAIr files (version 1) are serialized with pickle and compressed according to `compression`,
+        and their hash is the sha256 hash of the file.
+
+        Args:
+            dir_path: The directory to save the .msAIr file in.
+            filename: The filename, without extension.
+            msAIr_version: (1, 2) The msAIr format version to save.
+            compression: The `.Compression` settings of a legacy msAIr file,
+                defaults to `.Saver.default_compression`.
+
+        Raises:
+            SampleRunError: For an unsupported msAIr format version.
+        """
+
+        full_filename = (dir_path + "/" + filename + ".msAIr")
+
+        if msAIr_version not in (msAIrFormat.FORMAT_VERSION, msAIrFormat.LEGACY_VERSION):
+            raise SampleRunError(f"Unsupported msAIr format version: {msAIr_version}")
+
+        # Write to a temporary file and rename, so an interrupted save never leaves a partial .msAIr file
+        with Saver.replacing(full_filename) as temp_path:
+            if msAIr_version == msAIrFormat.FORMAT_VERSION:
+                msAIr_hash = msData.MSAIRfile.write(self.ms, temp_path)
+            else:
+                msAIr_hash = Saver.save_obj(self.ms, temp_path, compression)
+
+        return msAIr_hash
+
+    def source_fingerprint(self, msAIr_version=msAIrFormat.FORMAT_VERSION) -> str:
+        """Get a fingerprint of the source of the MS data saved by the SampleRun.
+
+        A saved .msAIr file is current while the fingerprint of its source is unchanged.
+
+        Args:
+            msAIr_version: The msAIr format version saved.
+
+        Returns:
+            A sha256 hash of the absolute path, size, and modification time of the MS file,
+            the spectrum filter of initialized MS data, and the msAIr format version as a string.
+        """
+
+        file_stat = os.stat(self.file_path)
+        spectrum_filter = None if self._ms is None else self._ms.spectrum_filter
+
+        source_values = {'path': os.path.abspath(self.file_path),
+                         'size': file_stat.st_size,
+                         'mtime_ns': file_stat.st_mtime_ns,
+                         'spectrum_filter': None if spectrum_filter is None else repr(tuple(spectrum_filter)),
+                         'msAIr_version': msAIr_version}
+
+        return hashlib.sha256(json.dumps(source_values, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _saved_msAIr_hash(self, full_filename, msAIr_version) -> Optional[str]:
+        """Get the hash of a current .msAIr file saved by an incremental save, if any.
+
+        A .msAIr file is current if it matches the hash in its save record (and the SampleRun's msAIr_hash, if any),
+        and the source fingerprint in its save record is unchanged.
+        """
+
+        try:
+            with open(full_filename + self.save_record_ext) as record_file:
+                save_record = json.load(record_file)
+        except (OSError, ValueError):
+            return None
+
+        msAIr_hash = save_record.get('msAIr_hash')
+
+        if save_record.get('source') != self.source_fingerprint(msAIr_version):
+            return None
+
+        if isinstance(self.msAIr_hash, str) and self.msAIr_hash != msAIr_hash:
+            return None
+
+        try:
+            if msAIr_version == msAIrFormat.FORMAT_VERSION:
+                # The header, and all blocks and chunks against their hashes in the header, are verified
+                verified = msAIrFormat.verify(full_filename, msAIr_hash)
+            else:
+                verified = Saver.verify_hash(full_filename, msAIr_hash)
+        except (OSError, MSAIRformatError):
+            return None
+
+        return msAIr_hash if verified else None
+
+    def save_incremental(self, dir_path, filename, msAIr_version=msAIrFormat.FORMAT_VERSION,
+                         compression=None) -> Optional[str]:
+        """Save a SampleRun ms data as a msAIr file, unless a current msAIr file was already saved.
+
+        After the .msAIr file is saved (see `save`), a save record of its hash and source fingerprint
+        (see `source_fingerprint`) is written alongside it.
+        Later incremental saves skip the SampleRun while its .msAIr file and source are unchanged,
+        so an interrupted save of many SampleRuns resumes where it stopped.
+
+        MS data is initialized for the save if needed, and released afterwards.
+        Failures are logged, returning ``None``, so the SampleRun is saved again by the next incremental save.
+
+        Args:
+            dir_path: The directory to save the .msAIr file in.
+            filename: The filename, without extension.
+            msAIr_version: (1, 2) The msAIr format version to save.
+            compression: The `.Compression` settings of a legacy msAIr file,
+                defaults to `.Saver.default_compression`.
+
+        Returns:
+            The hash of the .msAIr file (see `save`), or ``None`` if it could not be saved.
         """
 
         full_filename = (dir_path + "/" + filename + ".msAIr")
-        msAIr_hash = Saver.save_obj(self._ms, full_filename)
+
+        try:
+            msAIr_hash = self._saved_msAIr_hash(full_filename, msAIr_version)
+
+            if msAIr_hash is not None:
+                logger.info(f"Skipping save of current msAIr file: {full_filename}")
+                return msAIr_hash
+
+            release_ms = self._ms is None
+            load_args = self._load_args
+            if release_ms:
+                self.init_ms(*(load_args or ()))
+
+            try:
+                source = self.source_fingerprint(msAIr_version)
+                msAIr_hash = self.save(dir_path, filename, msAIr_version, compression)
+            finally:
+                if release_ms:
+                    self._release_ms()
+                    self._load_args = load_args
+
+            record_path = full_filename + self.save_record_ext
+
+            with Saver.replacing(record_path) as temp_path, open(temp_path, 'w') as record_file:
+                json.dump({'msAIr_hash': msAIr_hash, 'source': source}, record_file)
+
+        except Exception as err:
+            logger.error(f"Unable to save msAIr file: {full_filename}, {err!r}")
+            return None
 
         return msAIr_hash
 
-    def init_ms(self):
+    def _load_msAIr(self, spectrum_filter=None):
+        """Loads MS data from the SampleRun's .msAIr file, testing it against a sha256 hash, if provided.
+
+        The format version is detected from the file.
+        Columnar msAIr files only read (and verify) the chunks of spectra which may be accepted by `spectrum_filter`.
+        """
+
+        if msAIrFormat.read_version(self.file_path) == msAIrFormat.LEGACY_VERSION:
+            ms_data, hash_result = Saver.load_obj(self.file_path, self.msAIr_hash)
+
+            if spectrum_filter is not None:
+                ms_data.apply_filter(spectrum_filter)
+
+        else:
+            ms_data = msData.MSAIRfile(self.file_path, spectrum_filter)
+
+            if self.msAIr_hash is None:
+                hash_result = None
+            else:
+                hash_result = msAIrFormat.verify(self.file_path, self.msAIr_hash, ms_data.chunks)
+
+        if hash_result is None:
+            logger.info(f"No hash value for file: {self.file_path}")
+
+        elif hash_result is False:
+            logger.warning(f"Hash verification failed for file: {self.file_path}")
+
+        return ms_data
+
+    def init_ms(self, spectrum_filter=None, mzml_backend='pymzml', use_cache=False):
         """Initialize MS data at the SampleRun's set file_path from a .mzML or .msAIr file.
 
-        For a .msAIr file, it is first tested against a sha256 hash, if provided.
-        Data is decompressed via bzip2 and deserialized with pickle.
+        For a .msAIr file, it is tested against a sha256 hash, if provided.
+        Columnar msAIr files are memory-mapped as a `.MSAIRfile`,
+        while legacy msAIr files are decompressed (by the codec recorded in the file) and deserialized with pickle.
+
+        Args:
+            spectrum_filter: An optional `.SpectrumFilter` to initialize only a subset of the MS data.
+                Filters are applied as a .mzML file is read, or after a legacy .msAIr file is loaded.
+                Only the chunks of a columnar .msAIr file overlapping the filter's
+                retention time range and MS levels are read and verified.
+            mzml_backend: (`pymzml`, `native`) The reader backend used to read a .mzML file.
+            use_cache: A boolean indicating if a .mzML file is read through the parse cache, if enabled
+                (see `.set_parse_cache`). Cached MS data is read as a `.MSAIRfile` (rather than a `.MZMLfile`),
+                skipping XML parsing of unchanged .mzML files. On a cache miss, the whole .mzML file is parsed
+                and cached, so that later reads may use any `spectrum_filter`.
         """
 
         name, ext = os.path.splitext(self.file_path)
 
         if ext.casefold() == '.mzml':
-            ms_data = msData.MZMLfile(self.file_path)
+            if use_cache and msAI.PARSE_CACHE_DIR is not None:
+                parse_cache = ParseCache(msAI.PARSE_CACHE_DIR, msAI.PARSE_CACHE_SIZE_MB)
+                ms_data = parse_cache.read_mzml(self.file_path, spectrum_filter, mzml_backend)
+            else:
+                ms_data = msData.MZMLfile(self.file_path, spectrum_filter=spectrum_filter, backend=mzml_backend)
+
             self._ms = ms_data
 
         elif ext.casefold() == '.msair':
-            ms_data, hash_result = Saver.load_obj(self.file_path, self.msAIr_hash)
-            self._ms = ms_data
+            self._ms = self._load_msAIr(spectrum_filter)
+
+        else:
+            raise SampleRunMSinitError(f"Invalid file type/extension: {self.file_path}")
+
+        self._load_args = (spectrum_filter, mzml_backend, use_cache)
 
-            if hash_result is None:
-                logger.info(f"No hash value for file: {self.file_path}")
+        if self._budget is not None:
+            self._budget.add(self)
 
-            elif hash_result is False:
-                logger.warning(f"Hash verification failed for file: {self.file_path}")
+    def _share_ms(self, transport_dir):
+        """Replaces initialized MS data with a `.MSAIRhandle`, to be passed to another process without pickling.
+
+        MS data is kept if it can not be shared.
+        """
+
+        try:
+            self._ms = msData.MSAIRhandle.share(self._ms, transport_dir)
+        except (OSError, MSdataError) as err:
+            logger.warning(f"Unable to share MS data of {self.file_path}, it will be pickled: {err!r}")
+
+    def _shared_copy(self):
+        """Get a copy of the SampleRun to pass to a worker process,
+        with MS data read from a msAIr file replaced by a `.MSAIRhandle` (opened by `_open_shared_ms`).
+
+        Other MS data in memory (such as initialized from mzML) is pickled whole with the copy,
+        as is MS data that can not be shared (see `_share_ms`).
+        """
+
+        run = copy.copy(self)
+
+        if isinstance(self._ms, msData.MSAIRfile):
+            run._share_ms(msAI.MS_TRANSPORT_DIR)
+
+        return run
+
+    def xics(self, mz, tolerance=10.0, tolerance_unit='ppm', rt_range=None, agg='sum'):
+        """Extracts the ion chromatograms (XICs) of target ions from the MS1 spectra of the SampleRun.
+
+        MS data not in memory is initialized, then released once extracted. See `.MSfile.xics` for details.
+
+        Returns:
+            A tuple of the retention time of each MS1 spectrum,
+            and an array of intensities (shape: targets x MS1 spectra).
+        """
+
+        self._open_shared_ms()
+
+        release_ms = self._ms is None
+        load_args = self._load_args
+
+        if self.ms is None:
+            self.init_ms()
+
+        try:
+            return self.ms.xics(mz, tolerance, tolerance_unit, rt_range, agg)
+        finally:
+            if release_ms:
+                self._release_ms()
+                self._load_args = load_args
+
+    def _open_shared_ms(self):
+        """Opens MS data shared by another process as a `.MSAIRhandle`."""
+
+        if isinstance(self._ms, msData.MSAIRhandle):
+            self._ms = self._ms.open()
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[msData.SpectrumBatch]:
+        """Iterates over the SampleRun's MS data in fixed size batches of spectra, without initializing it.
+
+        Initialized MS data is iterated directly.
+        Otherwise, a .mzML file is streamed through a lazy `.MZMLfile`,
+        and a .msAIr file is loaded only for the duration of the iteration.
+
+        Args:
+            batch_size: The number of spectra in each batch (the last batch may be smaller).
+
+        Returns:
+            An iterator of `.SpectrumBatch`.
+        """
+
+        if self._ms is not None:
+            return self._ms.iter_batches(batch_size)
+
+        name, ext = os.path.splitext(self.file_path)
+
+        if ext.casefold() == '.mzml':
+            return msData.MZMLfile(self.file_path, lazy=True).iter_batches(batch_size)
+
+        elif ext.casefold() == '.msair':
+            return self._load_msAIr().iter_batches(batch_size)
 
         else:
             raise SampleRunMSinitError(f"Invalid file type/extension: {self.file_path}")
@@ -7,6 +7,8 @@ config
 """
 
 
+import msAI
+
 import pytest
 from collections import namedtuple
 
@@ -19,7 +21,8 @@ MSfile_attributes = ['_run_id',
                      '_peak_count',
                      '_tic_sum',
                      '_peaks',
-                     '_spectra']
+                     '_spectra',
+                     '_peak_store']
 
 # Add a failing test for an attribute
 # MSfile_fail_test_attribute = pytest.param("_stuff", marks=pytest.mark.xfail(strict=True))
@@ -34,7 +37,8 @@ MSfile_properties = ['run_id',
                      'peak_count',
                      'tic_sum',
                      'peaks',
-                     'spectra']
+                     'spectra',
+                     'peak_store']
 
 # Add a failing test for a property
 # MSfile_fail_test_property = pytest.param("stuff", marks=pytest.mark.xfail(strict=True))
@@ -76,3 +80,20 @@ TestMSpeak = namedtuple('TestMSpeak', ['run_id',
 
 MSfileKey = namedtuple('MSfileKey', MSfile_test_properties)
 
+
+# Disable the parse cache in all tests, so tests never write to the user cache directory
+#   * Tests of the parse cache set a temporary PARSE_CACHE_DIR
+@pytest.fixture(autouse=True)
+def no_parse_cache(monkeypatch):
+    monkeypatch.setattr(msAI, 'PARSE_CACHE_DIR', None)
+
+
+# Run a test with msAI.EXECUTOR (and MP_SUPPORT) configured for each executor kind, shutting it down after the test
+#   * Select executor kinds with @pytest.mark.parametrize("executor", [...], indirect=True)
+@pytest.fixture(params=['serial', 'fork'])
+def executor(request, monkeypatch):
+    monkeypatch.setattr(msAI, 'MP_SUPPORT', request.param != 'serial')
+    monkeypatch.setattr(msAI, 'EXECUTOR', msAI.miscUtils.Executor(request.param, workers=2))
+
+    with msAI.EXECUTOR:
+        yield msAI.EXECUTOR
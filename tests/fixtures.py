@@ -8,9 +8,11 @@ fixtures
 
 
 import msAI.msData as msData
+from msAI.samples import SampleSet
 from tests import key
 
 import pytest
+import numpy as np
 
 
 def get_spectrum_test_id(spectrum):
@@ -50,3 +52,14 @@ def spectrum(request):
 def peak(request):
     return request.param
 
+
+@pytest.fixture()
+def peak_store():
+    # Spectra s1 and s3 with peaks, and s2 without peaks
+    return msData.PeakStore.from_peak_counts(np.array(['s1', 's2', 's3']), np.array([2, 0, 1]),
+                                             np.array([100.0, 200.0, 300.0]), np.array([1.0, 2.0, 3.0]))
+
+
+@pytest.fixture()
+def sample_set():
+    return SampleSet(msData.MSfileSet(key.mzml_files_list[0].rsplit('/', 1)[0], data_type='mzML'))
@@ -5,8 +5,164 @@ test_miscUtils
 """
 
 
+from tests.config import executor
+
+import msAI
 import msAI.miscUtils
 
+import os
+import stat
+import pathlib
+
 import pytest
+import numpy as np
+import pandas as pd
+
+
+class TestFileGrabber:
+    @pytest.mark.parametrize("workers", [1, 4])
+    @pytest.mark.parametrize("recursive", [True, False])
+    def test_scan_matches_extensions(self, workers, recursive, tmp_path):
+        for sub_dir in ('', 'a', 'a/b', 'c'):
+            (tmp_path / sub_dir).mkdir(parents=True, exist_ok=True)
+
+            for filename in ('x.mzML', 'x.msAIr', 'x.txt', 'x.msAIr.json'):
+                (tmp_path / sub_dir / (sub_dir.replace('/', '') + filename)).write_bytes(b'0' * 10)
+
+        entries = msAI.miscUtils.FileGrabber.scan_extensions(str(tmp_path), 'mzML', 'msAIr',
+                                                             recursive=recursive, workers=workers)
+        found = [pathlib.Path(entry.path).relative_to(tmp_path).as_posix() for entry in entries]
+
+        if recursive:
+            assert found == ['a/ax.msAIr', 'a/ax.mzML', 'a/b/abx.msAIr', 'a/b/abx.mzML',
+                             'c/cx.msAIr', 'c/cx.mzML', 'x.msAIr', 'x.mzML']
+        else:
+            assert found == ['x.msAIr', 'x.mzML']
+
+        assert all(entry.stat().st_size == 10 for entry in entries)
+
+
+class TestExecutor:
+    @pytest.mark.parametrize("kind", msAI.miscUtils.Executor.kinds)
+    def test_executor_maps_in_order(self, kind):
+        with msAI.miscUtils.Executor(kind, workers=2) as executor:
+            for _ in range(2):
+                assert executor.map(abs, range(0, -20, -1), chunksize=3) == list(range(20))
+
+    def test_restarted_pool_shuts_down_once_at_exit(self, monkeypatch):
+        exit_funcs = []
+        monkeypatch.setattr(msAI.miscUtils.atexit, 'register', exit_funcs.append)
+
+        executor = msAI.miscUtils.Executor('thread', workers=2)
+        for _ in range(3):
+            with executor:
+                executor.map(abs, range(4))
+
+        assert exit_funcs == [executor.shutdown]
+
+
+def _double_row(row):
+    row['value'] = row['value'] * 2
+    return row
+
+
+class TestMultiTaskDF:
+    @pytest.mark.parametrize("executor", ['serial', 'thread', 'fork'], indirect=True)
+    def test_rows_keep_order(self, executor):
+        df = pd.DataFrame({'value': np.arange(10), 'file_size': np.arange(10) % 4}, index=list('abcdefghij'))
+
+        for cost in (None, 'file_size'):
+            df_out = msAI.miscUtils.MultiTaskDF.parallelize_on_rows(df, _double_row, cost=cost)
+
+            pd.testing.assert_frame_equal(df_out, df.assign(value=df['value'] * 2))
+            assert msAI.miscUtils.MultiTaskDF.last_worker_busy['rows'].sum() == df.shape[0]
+
+
+def _inverse(value):
+    return 1 / value
+
+
+class TestPipeline:
+    def test_pipeline_passes_items_through_stages(self):
+        pipeline = msAI.miscUtils.Pipeline(msAI.miscUtils.PipelineStage('abs', abs, workers=2),
+                                           msAI.miscUtils.PipelineStage('inverse', _inverse, workers=3))
+
+        results = {result.item: result for result in pipeline.run(range(0, -10, -1))}
+
+        assert sorted(results) == list(range(-9, 1))
+        assert isinstance(results[0].error, ZeroDivisionError)
+        assert all(results[item].value == 1 / -item for item in range(-1, -10, -1))
+        assert msAI.miscUtils.Pipeline.last_stage_busy['items'].tolist() == [10, 10]
+
+    def test_pipeline_stops_when_closed(self):
+        pipeline = msAI.miscUtils.Pipeline(msAI.miscUtils.PipelineStage('abs', abs))
+
+        results = pipeline.run(range(-1000, 0))
+        next(results)
+        results.close()
+
+        assert msAI.miscUtils.Pipeline.last_stage_busy.loc['abs', 'items'] < 1000
+
+
+class TestArrayBuffer:
+    def test_array_buffer_grows(self):
+        buffer = msAI.miscUtils.ArrayBuffer(capacity=2)
+        buffer.extend(np.arange(5, dtype=np.float32))
+        buffer.append(5)
+
+        assert np.array_equal(buffer.to_array(), np.arange(6))
+
+    def test_array_buffer_upcasts(self):
+        buffer = msAI.miscUtils.ArrayBuffer()
+        buffer.extend(np.ones(3, dtype=np.float32))
+        buffer.extend(np.ones(3, dtype=np.float64))
+
+        assert buffer.to_array().dtype == np.float64
+
+
+class TestSaver:
+    @pytest.mark.parametrize("compression", [msAI.miscUtils.Compression('none'),
+                                             msAI.miscUtils.Compression('zlib', 1, block_size=1024),
+                                             msAI.miscUtils.Compression('lzma', workers=2, block_size=1024),
+                                             msAI.miscUtils.Compression('bz2', workers=2, block_size=1024)])
+    def test_saved_obj_loads(self, compression, tmp_path):
+        obj = {'values': np.arange(10000), 'name': 'test'}
+        file = str(tmp_path / "obj.msAIm")
+
+        saved_hash = msAI.miscUtils.Saver.save_obj(obj, file, compression)
+        loaded_obj, hash_verified = msAI.miscUtils.Saver.load_obj(file, saved_hash)
+
+        assert saved_hash == msAI.miscUtils.Saver.get_hash(file)
+        assert hash_verified
+        assert np.array_equal(loaded_obj['values'], obj['values'])
+        assert loaded_obj['name'] == obj['name']
+
+    def test_replacing_file_has_umask_permissions(self, tmp_path):
+        file = tmp_path / "obj.msAIm"
+        umask = os.umask(0o022)
+
+        try:
+            with msAI.miscUtils.Saver.replacing(str(file)) as temp_path:
+                msAI.miscUtils.Saver.save_obj({'name': 'test'}, temp_path)
+
+            with pytest.raises(ValueError):
+                with msAI.miscUtils.Saver.replacing(str(tmp_path / "failed.msAIm")):
+                    raise ValueError
+        finally:
+            os.umask(umask)
+
+        assert stat.S_IMODE(file.stat().st_mode) == 0o644
+        assert [path.name for path in tmp_path.iterdir()] == ["obj.msAIm"]
+
+    def test_failed_write_cancels_pending_blocks(self, tmp_path):
+        compression = msAI.miscUtils.Compression('lzma', workers=2, block_size=1024)
 
+        with open(tmp_path / "obj.msAIm", 'wb') as file:
+            with pytest.raises(ValueError):
+                with msAI.miscUtils.CompressedBlockWriter(file, compression) as writer:
+                    writer.write(bytes(16 * 1024))
+                    pending = list(writer._pending)
+                    raise ValueError
 
+        assert pending and writer._executor._shutdown
+        assert all(future.done() for future in pending)
@@ -8,10 +8,18 @@ test_msData
 """
 
 
-from tests import config
-from tests.fixtures import MSfile_interface, MZMLfile, spectrum, peak
+from tests import config, key
+from tests.fixtures import MSfile_interface, MZMLfile, spectrum, peak, peak_store
+from tests.config import no_parse_cache
+
+import msAI.msData as msData
+import msAI.msAIrFormat as msAIrFormat
+
+import shutil
 
 import pytest
+import numpy as np
+import pandas.testing
 
 
 class TestMSfile:
@@ -88,3 +96,263 @@ class TestPeak:
 
         assert evaluated_value == key_value
 
+
+class TestPeakStore:
+    def test_from_peak_counts_slices_spectra(self, peak_store):
+
+        assert len(peak_store) == 3
+        assert peak_store.peak_count == 3
+        assert np.array_equal(peak_store.offsets, [0, 2, 2, 3])
+        assert np.array_equal(peak_store.peak_counts, [2, 0, 1])
+
+    def test_position_finds_spectra(self, peak_store):
+
+        assert [peak_store.position(spec_id) for spec_id in ('s1', 's2', 's3')] == [0, 1, 2]
+
+        with pytest.raises(KeyError):
+            peak_store.position('s4')
+
+    def test_spectrum_slices_peaks(self, peak_store):
+
+        assert np.array_equal(peak_store.spectrum('s1')[0], [100.0, 200.0])
+        assert np.array_equal(peak_store.spectrum('s3')[1], [3.0])
+        assert peak_store.spectrum('s2')[0].size == 0 and peak_store.spectrum('s2')[1].size == 0
+
+    def test_to_df_skips_spectra_without_peaks(self, peak_store):
+        peaks = peak_store.to_df(np.array([1.0, 2.0, 3.0]))
+
+        assert list(peaks.index) == [('s1', 0), ('s1', 1), ('s3', 0)]
+        assert list(peaks.index.names) == ['spec_id', 'peak_number']
+        assert np.array_equal(peaks['rt'], [1.0, 1.0, 3.0])
+        assert np.array_equal(peaks['mz'], [100.0, 200.0, 300.0])
+        assert np.array_equal(peaks['i'], [1.0, 2.0, 3.0])
+
+    def test_from_df_keeps_spectra_without_peaks(self, peak_store):
+        peaks = peak_store.to_df(np.array([1.0, 2.0, 3.0]))
+        df_peak_store = msData.PeakStore.from_df(peaks, peak_store.spec_ids)
+
+        assert np.array_equal(df_peak_store.spec_ids, peak_store.spec_ids)
+        assert np.array_equal(df_peak_store.offsets, peak_store.offsets)
+        assert df_peak_store.spectrum('s2')[0].size == 0
+
+        with pytest.raises(msData.MSdataError):
+            msData.PeakStore.from_df(peaks, peak_store.spec_ids[::-1])
+
+
+class TestNativeBackend:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_native_backend_matches_pymzml(self, mzml_file):
+        pymzml_file = msData.MZMLfile(mzml_file)
+        native_file = msData.MZMLfile(mzml_file, backend='native')
+
+        for MZMLfile_test_property in config.MSfile_test_properties:
+            assert getattr(native_file, MZMLfile_test_property) == getattr(pymzml_file, MZMLfile_test_property)
+
+        pandas.testing.assert_frame_equal(native_file.spectra, pymzml_file.spectra, check_exact=True)
+        pandas.testing.assert_frame_equal(native_file.peaks, pymzml_file.peaks, check_exact=True)
+
+
+class TestMSAIRfile:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_msAIr_file_matches_mzml(self, mzml_file, tmp_path):
+        mzml_ms_file = msData.MZMLfile(mzml_file)
+        msAIr_file_path = str(tmp_path / "run.msAIr")
+
+        msData.MSAIRfile.write(mzml_ms_file, msAIr_file_path)
+        msAIr_ms_file = msData.MSAIRfile(msAIr_file_path)
+
+        for MZMLfile_test_property in config.MSfile_test_properties:
+            assert getattr(msAIr_ms_file, MZMLfile_test_property) == getattr(mzml_ms_file, MZMLfile_test_property)
+
+        pandas.testing.assert_frame_equal(msAIr_ms_file.spectra, mzml_ms_file.spectra, check_exact=True)
+        pandas.testing.assert_frame_equal(msAIr_ms_file.peaks, mzml_ms_file.peaks, check_exact=True)
+
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_msAIr_file_reads_filtered_chunks(self, mzml_file, tmp_path):
+        spectrum_filter = msData.SpectrumFilter(rt_range=(1.0, 2.0))
+        mzml_ms_file = msData.MZMLfile(mzml_file, spectrum_filter=spectrum_filter)
+        msAIr_file_path = str(tmp_path / "run.msAIr")
+
+        msAIr_hash = msData.MSAIRfile.write(msData.MZMLfile(mzml_file), msAIr_file_path)
+        msAIr_ms_file = msData.MSAIRfile(msAIr_file_path, spectrum_filter)
+
+        assert msAIrFormat.verify(msAIr_file_path, msAIr_hash, msAIr_ms_file.chunks)
+        pandas.testing.assert_frame_equal(msAIr_ms_file.spectra, mzml_ms_file.spectra, check_exact=True)
+        pandas.testing.assert_frame_equal(msAIr_ms_file.peaks, mzml_ms_file.peaks, check_exact=True)
+
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_msAIr_file_verifies_padding(self, mzml_file, tmp_path):
+        msAIr_file_path = str(tmp_path / "run.msAIr")
+        msAIr_hash = msData.MSAIRfile.write(msData.MZMLfile(mzml_file), msAIr_file_path)
+
+        with open(msAIr_file_path, 'r+b') as msAIr_file:
+            header, data_start, _ = msAIrFormat._read_header(msAIr_file)
+            block_ends = [msAIr_file.tell()] + [data_start + spec['offset'] + spec['nbytes']
+                                                for spec in header['blocks'].values()]
+            block_starts = {data_start + spec['offset'] for spec in header['blocks'].values()}
+            padding_start = min(position for position in block_ends if position not in block_starts)
+
+        assert msAIrFormat.verify(msAIr_file_path, msAIr_hash)
+
+        with open(msAIr_file_path, 'r+b') as msAIr_file:
+            msAIr_file.seek(padding_start)
+            msAIr_file.write(b'\xff')
+
+        assert msAIrFormat.verify(msAIr_file_path, msAIr_hash, chunk_numbers=[0])
+        assert not msAIrFormat.verify(msAIr_file_path, msAIr_hash)
+
+        with open(msAIr_file_path, 'r+b') as msAIr_file:
+            msAIr_file.seek(padding_start)
+            msAIr_file.write(b'\x00')
+            msAIr_file.seek(0, 2)
+            msAIr_file.write(b'\x00')
+
+        assert not msAIrFormat.verify(msAIr_file_path, msAIr_hash)
+
+
+class TestXIC:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_xics_match_peak_masks(self, mzml_file):
+        ms_file = msData.MZMLfile(mzml_file)
+        ms1_ids = ms_file.spectra.index[ms_file.spectra['ms_lvl'] == 1]
+        ms1_peaks = ms_file.peaks.loc[ms1_ids]
+
+        target_mz = ms1_peaks['mz'].to_numpy()[::max(len(ms1_peaks) // 20, 1)]
+        rt, intensities = ms_file.xics(target_mz, tolerance=10.0, tolerance_unit='ppm', rt_range=(1.0, 10.0))
+
+        assert np.array_equal(rt, ms_file.spectra.loc[ms1_ids, 'rt'].to_numpy())
+
+        for mz, target_intensities in zip(target_mz, intensities):
+            in_window = ((ms1_peaks['mz'] - mz).abs() <= mz * 0.00001) & ms1_peaks['rt'].between(1.0, 10.0)
+            expected = ms1_peaks.loc[in_window, 'i'].groupby(level='spec_id').sum().reindex(ms1_ids, fill_value=0)
+
+            assert np.allclose(target_intensities, expected.to_numpy())
+
+
+class TestChromatograms:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_base_peaks_match_peaks(self, mzml_file):
+        ms_file = msData.MZMLfile(mzml_file)
+        peaks = ms_file.peaks.groupby(level='spec_id')
+        spectra = ms_file.spectra.loc[peaks.size().index]
+
+        assert np.allclose(spectra['base_peak_i'], peaks['i'].max())
+        assert np.allclose(spectra['base_peak_mz'], ms_file.peaks.loc[peaks['i'].idxmax(), 'mz'])
+        assert np.allclose(spectra['mz_min'], peaks['mz'].min())
+        assert np.allclose(spectra['mz_max'], peaks['mz'].max())
+
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_read_tic_matches_spectra(self, mzml_file):
+        ms_file = msData.MZMLfile(mzml_file)
+        rt, tic = msData.MZMLfile.read_tic(mzml_file)
+
+        assert np.allclose(rt, ms_file.spectra['rt'])
+        assert np.allclose(tic, ms_file.spectra['tic'], rtol=1e-5)
+
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_lazy_chromatograms_match_eager(self, mzml_file, monkeypatch):
+        ms_file = msData.MZMLfile(mzml_file)
+        lazy_ms_file = msData.MZMLfile(mzml_file, lazy=True)
+        summary_columns = ['base_peak_mz', 'base_peak_i', 'mz_min', 'mz_max']
+
+        # Base peaks and m/z ranges not recorded in spectrum headers are NaN, without decoding peaks
+        pandas.testing.assert_frame_equal(lazy_ms_file.spectra.drop(columns=summary_columns),
+                                          ms_file.spectra.drop(columns=summary_columns))
+        recorded = lazy_ms_file.spectra[summary_columns].notna()
+        assert np.allclose(lazy_ms_file.spectra[summary_columns][recorded], ms_file.spectra[summary_columns][recorded],
+                           equal_nan=True)
+
+        decoded_ids = []
+        spectrum_arrays = lazy_ms_file._spectrum_arrays
+
+        def counted_spectrum_arrays(spec_id):
+            decoded_ids.append(spec_id)
+            return spectrum_arrays(spec_id)
+
+        monkeypatch.setattr(lazy_ms_file, '_spectrum_arrays', counted_spectrum_arrays)
+
+        # Unrecorded base peaks are computed from the peaks of only the spectra included
+        for lazy_values, values in zip(lazy_ms_file.base_peak_chromatogram(ms_lvl=1),
+                                       ms_file.base_peak_chromatogram(ms_lvl=1)):
+            assert np.allclose(lazy_values, values, equal_nan=True)
+
+        ms1_ids = ms_file.spectra.index[ms_file.spectra['ms_lvl'] == 1]
+        assert set(decoded_ids) <= set(ms1_ids)
+
+
+class TestPrecursorIndex:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_matches_precursor_masks(self, mzml_file):
+        ms_file = msData.MZMLfile(mzml_file)
+        msn_spectra = ms_file.spectra[ms_file.spectra['ms_lvl'] > 1].dropna(subset=['precursor_mz'])
+
+        target_mz = msn_spectra['precursor_mz'].to_numpy()[::max(len(msn_spectra) // 20, 1)]
+        matches = ms_file.match_precursors(target_mz, tolerance=10.0, tolerance_unit='ppm', rt_range=(1.0, 10.0))
+
+        for n, mz in enumerate(target_mz):
+            in_window = ((msn_spectra['precursor_mz'] - mz).abs() <= mz * 0.00001) & msn_spectra['rt'].between(1.0, 10.0)
+
+            assert matches.index[matches['precursor'] == n].tolist() == msn_spectra.index[in_window].tolist()
+
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_lazy_precursors_match(self, mzml_file):
+        columns = ['precursor_mz', 'precursor_charge', 'isolation_mz_min', 'isolation_mz_max']
+
+        pandas.testing.assert_frame_equal(msData.MZMLfile(mzml_file, lazy=True).spectra[columns],
+                                          msData.MZMLfile(mzml_file).spectra[columns])
+
+
+class TestMSfileSet:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_header_scan_matches_key(self, mzml_file):
+        ms_file_set = msData.MSfileSet(mzml_file.rsplit('/', 1)[0], data_type='mzML', scan_headers=True)
+        run_id = mzml_file.rsplit('/', 1)[1].split('.')[0]
+        file_key = getattr(key, f'{run_id}_key')
+
+        for header_column in msData.MSfileSet.header_columns:
+            assert ms_file_set.df.loc[run_id, header_column] == getattr(file_key, header_column)
+
+    def test_refresh_reports_changes(self, tmp_path):
+        for mzml_file in key.mzml_files_list[:2]:
+            shutil.copy(mzml_file, tmp_path)
+
+        ms_file_set = msData.MSfileSet(str(tmp_path), scan_headers=True)
+        ms_file_set.save_snapshot(str(tmp_path / 'snapshot.msAIm'))
+
+        run_ids = [mzml_file.rsplit('/', 1)[1].split('.')[0] for mzml_file in key.mzml_files_list]
+        shutil.copy(key.mzml_files_list[2], tmp_path)
+        (tmp_path / f'{run_ids[0]}.mzML').unlink()
+        with open(tmp_path / f'{run_ids[1]}.mzML', 'a') as mzml_file:
+            mzml_file.write('\n')
+
+        for refreshed_set in (ms_file_set, msData.MSfileSet.load_snapshot(str(tmp_path / 'snapshot.msAIm'))):
+            assert refreshed_set.refresh() == msData.ScanDelta([run_ids[2]], [run_ids[0]], [run_ids[1]])
+            assert refreshed_set.df.loc[run_ids[2], 'run_id'] == run_ids[2]
+            assert sorted(refreshed_set.df.index) == sorted(run_ids[1:])
+            assert refreshed_set.refresh() == msData.ScanDelta([], [], [])
+
+
+class TestLazyMZMLfile:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_lazy_init_decodes_no_peaks(self, mzml_file, monkeypatch):
+        ms_file = msData.MZMLfile(mzml_file)
+        spec_id = ms_file.spectra.index[len(ms_file.spectra) // 2]
+        spectrum_peaks = ms_file.spectrum_peaks(spec_id)
+
+        decoded_ids = []
+        spectrum_arrays = msData.MZMLfile._spectrum_arrays
+
+        def counted_spectrum_arrays(ms_file, spec_id):
+            decoded_ids.append(spec_id)
+            return spectrum_arrays(ms_file, spec_id)
+
+        monkeypatch.setattr(msData.MZMLfile, '_spectrum_arrays', counted_spectrum_arrays)
+
+        lazy_ms_file = msData.MZMLfile(mzml_file, lazy=True)
+        lazy_ms_file.tic_chromatogram()
+
+        assert decoded_ids == []
+        assert lazy_ms_file._peak_store is None
+
+        pandas.testing.assert_frame_equal(lazy_ms_file.spectrum_peaks(spec_id), spectrum_peaks)
+        assert decoded_ids == [spec_id]
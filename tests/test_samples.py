@@ -1,13 +1,215 @@
-
 """"
 test_samples
 
 """
 
 
-from msAI.samples import SampleRun, SampleSet
+from tests import key
+from tests.config import no_parse_cache, executor
+from tests.fixtures import sample_set
 
+import msAI
+import msAI.msAIrFormat as msAIrFormat
+from msAI.msData import MSAIRfile, MZMLfile, MSfileSet
+from msAI.samples import SampleRun
+from msAI.miscUtils import Pipeline
+from msAI.conversion import ConversionPipeline
+from msAI.features import FeatureMatrixBuilder
 
 import pytest
+import numpy as np
+import pandas as pd
+import pandas.testing
+
+
+class TestParseCache:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_cached_ms_matches_parsed(self, mzml_file, tmp_path, monkeypatch):
+        monkeypatch.setattr(msAI, 'PARSE_CACHE_DIR', str(tmp_path))
+
+        parsed_run = SampleRun(mzml_file)
+        parsed_run.init_ms(use_cache=False)
+
+        for _ in range(2):
+            cached_run = SampleRun(mzml_file)
+            cached_run.init_ms(use_cache=True)
+
+            pandas.testing.assert_frame_equal(cached_run.ms.spectra, parsed_run.ms.spectra, check_exact=True)
+            pandas.testing.assert_frame_equal(cached_run.ms.peaks, parsed_run.ms.peaks, check_exact=True)
+
+
+class TestSaveIncremental:
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_resumes_unsaved_runs(self, mzml_file, tmp_path):
+        saved_run = SampleRun(mzml_file)
+        msAIr_hash = saved_run.save_incremental(str(tmp_path), 'run')
+
+        assert saved_run.ms is None
+        assert saved_run.save_incremental(str(tmp_path), 'run') == msAIr_hash
+
+        (tmp_path / ('run.msAIr' + SampleRun.save_record_ext)).unlink()
+        assert SampleRun(mzml_file).save_incremental(str(tmp_path), 'run') == msAIr_hash
+
+        parsed_run = SampleRun(mzml_file)
+        parsed_run.init_ms(use_cache=False)
+
+        loaded_run = SampleRun(str(tmp_path / 'run.msAIr'))
+        loaded_run.init_ms()
+
+        pandas.testing.assert_frame_equal(loaded_run.ms.peaks, parsed_run.ms.peaks, check_exact=True)
+
+    @pytest.mark.parametrize("mzml_file", key.mzml_files_list)
+    def test_saves_run_with_corrupted_chunks(self, mzml_file, tmp_path):
+        msAIr_hash = SampleRun(mzml_file).save_incremental(str(tmp_path), 'run')
+
+        with open(tmp_path / 'run.msAIr', 'r+b') as msAIr_file:
+            header, data_start, _ = msAIrFormat._read_header(msAIr_file)
+            msAIr_file.seek(data_start + header['blocks']['peaks/i']['offset'])
+            peak_byte = msAIr_file.read(1)
+            msAIr_file.seek(-1, 1)
+            msAIr_file.write(bytes([peak_byte[0] ^ 0xFF]))
+
+        assert not msAIrFormat.verify(str(tmp_path / 'run.msAIr'), msAIr_hash)
+        assert SampleRun(mzml_file).save_incremental(str(tmp_path), 'run') == msAIr_hash
+        assert msAIrFormat.verify(str(tmp_path / 'run.msAIr'), msAIr_hash)
+
+
+class TestMSTransport:
+    @pytest.mark.parametrize("executor", ['fork'], indirect=True)
+    def test_shared_ms_matches_parsed(self, executor, sample_set, tmp_path, monkeypatch):
+        monkeypatch.setattr(msAI, 'MS_TRANSPORT_DIR', str(tmp_path))
+
+        sample_set.init_all_ms()
+
+        assert list(tmp_path.iterdir()) == []
+
+        for mzml_file in key.mzml_files_list:
+            parsed_run = SampleRun(mzml_file)
+            parsed_run.init_ms(use_cache=False)
+
+            shared_ms = sample_set.df.loc[mzml_file.rsplit('/', 1)[1].split('.')[0], 'run'].ms
+            assert isinstance(shared_ms, MSAIRfile)
+            pandas.testing.assert_frame_equal(shared_ms.peaks, parsed_run.ms.peaks, check_exact=True)
+
+    def test_shared_copy_keeps_unshared_ms(self, tmp_path, monkeypatch):
+        def share_failed(ms_file, transport_dir):
+            raise OSError("No space left on device")
+
+        mzml_run = SampleRun(key.mzml_files_list[0])
+        mzml_run.init_ms()
+        mzml_run.save(str(tmp_path), 'run')
+
+        msAIr_run = SampleRun(str(tmp_path / 'run.msAIr'))
+        msAIr_run.init_ms()
+
+        monkeypatch.setattr(msAI.msData.MSAIRhandle, 'share', staticmethod(share_failed))
+        shared_run = msAIr_run._shared_copy()
+
+        assert shared_run._ms is msAIr_run._ms
+
+
+class TestMemoryBudget:
+    @pytest.mark.parametrize("executor", ['serial'], indirect=True)
+    def test_releases_least_recently_used(self, executor, sample_set):
+        sample_set.init_all_ms()
+        runs = list(sample_set.df['run'])
+
+        run_mb = max(run.ms.memory_mb() for run in runs)
+        sample_set.set_memory_budget(run_mb * 1.5)
+
+        for run in runs:
+            run.ms.spectra
+            assert sample_set.memory_budget.used_mb <= run_mb * 1.5
+
+        assert sample_set.memory_budget.run_count < len(runs)
+        assert runs[0]._ms is None and runs[-1]._ms is not None
+
+        parsed_run = SampleRun(key.mzml_files_list[0])
+        parsed_run.init_ms()
+        released_ms = sample_set.df.loc[key.mzml_files_list[0].rsplit('/', 1)[1].split('.')[0], 'run'].ms
+        pandas.testing.assert_frame_equal(released_ms.peaks, parsed_run.ms.peaks, check_exact=True)
+
+
+class TestConversionPipeline:
+    def test_converted_matches_saved(self, executor, tmp_path):
+        ms_file_set = MSfileSet(key.mzml_files_list[0].rsplit('/', 1)[0], data_type='mzML')
+        converted_df = ConversionPipeline(hash_workers=2).convert(ms_file_set, str(tmp_path / 'converted'))
+
+        # Process workers convert runs whole, returning only the content hash
+        stages = ['parse', 'encode', 'hash', 'write'] if executor.is_serial else ['convert']
+        assert Pipeline.last_stage_busy.index.tolist() == stages
+
+        for name, row in ms_file_set.df.iterrows():
+            saved_run = SampleRun(str(row['path']))
+            saved_run.init_ms()
+
+            assert saved_run.save(str(tmp_path), name) == converted_df.loc[name, 'msAIr_hash']
+
+
+class TestBatchXIC:
+    def test_xic_areas_match_runs(self, executor, sample_set):
+        first_run = SampleRun(key.mzml_files_list[0])
+        first_run.init_ms()
+        targets = pd.DataFrame({'mz': first_run.ms.peaks['mz'].to_numpy()[::1000][:20], 'rt_max': 10.0})
+
+        areas = sample_set.xic_areas(targets, tolerance=0.01, tolerance_unit='Da')
+        batch_xic = sample_set.extract_xics(targets, np.linspace(0.0, 10.0, 50), tolerance=0.01, tolerance_unit='Da')
+
+        assert areas.shape == (len(sample_set.df), len(targets))
+        assert batch_xic.intensities.shape == (len(sample_set.df), len(targets), 50)
+        assert all(run._ms is None for run in sample_set.df['run'])
+
+        for name, run in sample_set.df['run'].items():
+            rt, intensities = run.xics(targets['mz'], 0.01, 'Da', (-np.inf, 10.0))
+
+            assert np.allclose(areas.loc[name], ((intensities[:, 1:] + intensities[:, :-1]) * np.diff(rt)).sum(axis=1) / 2)
+
+    @pytest.mark.parametrize("executor", ['fork'], indirect=True)
+    def test_xic_areas_pickle_mzml_runs(self, executor, sample_set):
+        # MS data initialized from mzML in this process is pickled to the workers
+        for run in sample_set.df['run']:
+            run.init_ms()
+        targets = pd.DataFrame({'mz': sample_set.df['run'].iloc[0].ms.peaks['mz'].to_numpy()[::1000][:20], 'rt_max': 10.0})
+
+        areas = sample_set.xic_areas(targets, tolerance=0.01, tolerance_unit='Da')
+
+        for name, run in sample_set.df['run'].items():
+            assert isinstance(run._ms, MZMLfile)
+
+            rt, intensities = run.xics(targets['mz'], 0.01, 'Da', (-np.inf, 10.0))
+
+            assert np.allclose(areas.loc[name], ((intensities[:, 1:] + intensities[:, :-1]) * np.diff(rt)).sum(axis=1) / 2)
+
+
+class TestFeatureMatrix:
+    def test_features_match_binned_peaks(self, executor, sample_set, tmp_path):
+        builder = FeatureMatrixBuilder(mz_range=(100.0, 1000.0), mz_bin_width=0.5)
+
+        dense = builder.build(sample_set, file_path=str(tmp_path / 'features.npy'))
+        sparse = builder.build(sample_set, sparse=True)
+
+        assert dense.values.shape == (len(sample_set.df), builder.feature_count)
+        assert np.array_equal(sparse.values.to_dense(), dense.values)
+        assert np.array_equal(np.load(tmp_path / 'features.npy'), dense.values)
+
+        for position, run in enumerate(sample_set.df['run']):
+            run.init_ms()
+            ms1_ids = run.ms.spectra.index[run.ms.spectra['ms_lvl'] == 1]
+            peaks = run.ms.peaks.loc[ms1_ids]
+            peaks = peaks[(peaks['mz'] >= 100.0) & (peaks['mz'] < 1000.0)]
+
+            expected = np.bincount(((peaks['mz'] - 100.0) // 0.5).astype(int), weights=peaks['i'],
+                                   minlength=builder.feature_count)
+
+            assert np.allclose(dense.values[position], expected, rtol=1e-6)
 
+    @pytest.mark.parametrize("executor", ['serial'], indirect=True)
+    def test_rt_binned_features_to_df(self, executor, sample_set):
+        builder = FeatureMatrixBuilder(mz_range=(100.0, 1000.0), mz_bin_width=10.0, rt_range=(0.0, 10.0), rt_bin_width=2.0)
+        feature_matrix = builder.build(sample_set)
+        feature_df = feature_matrix.to_df()
 
+        assert list(feature_df.index) == list(sample_set.df.index)
+        assert list(feature_df.columns[:len(feature_matrix.metadata.columns)]) == list(feature_matrix.metadata.columns)
+        assert list(feature_df.columns[len(feature_matrix.metadata.columns):]) == list(feature_matrix.features)
+        assert np.array_equal(feature_df[list(feature_matrix.features)].to_numpy(), feature_matrix.values)